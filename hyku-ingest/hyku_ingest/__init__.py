@@ -1,2 +1,19 @@
-from .create_sheet import *
-from .split_sheet import *
\ No newline at end of file
+# The subpackages are only imported when one of their names is first used, so the ingest command does not load
+# every subcommand's dependencies just to start
+_LAZY_NAMES = {
+  'CreateSheet': 'create_sheet',
+  'IngestError': 'create_sheet',
+  'detect_options': 'create_sheet',
+  'run_batch': 'create_sheet',
+  'split_sheet': 'split_sheet',
+}
+
+__all__ = list(_LAZY_NAMES)
+
+def __getattr__(name):
+  if name in _LAZY_NAMES:
+    from importlib import import_module
+    value = getattr(import_module(f'.{_LAZY_NAMES[name]}', __name__), name)
+    globals()[name] = value
+    return value
+  raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
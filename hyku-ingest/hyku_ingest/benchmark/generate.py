@@ -0,0 +1,76 @@
+import csv
+import random
+
+REQUIRED_COLUMNS = ['source_identifier', 'model', 'visibility', 'remote_files', 'parents', 'file_identifier', 'title', 'sequence', 'abstract', 'rdf_type']
+
+# The work models generated for each create_sheet mode, the plain mode cannot have books or compound objects since those need -a
+MODE_MODELS = {
+  'plain': ['Image', 'Image', 'Pdf', 'Generic', 'Audio', 'Video'],
+  'attachments': ['Book', 'Book', 'CompoundObject', 'Image', 'Pdf'],
+  'audio_visual': ['Audio', 'Video'],
+}
+
+# File identifier endings for each work model
+MODEL_FILES = {
+  'Image': ['.jp2', '_i.tif', '.jpg'],
+  'Pdf': ['.pdf'],
+  'Generic': ['.tif', '_p.tif'],
+  'Audio': ['.mp3', '_i.wav'],
+  'Video': ['.mp4', '_i.mov'],
+  'Book': ['.pdf'],
+  'CompoundObject': ['.jp2'],
+}
+
+# File identifier endings for book page attachments, paired with the end of the page's source_identifier
+PAGE_FILES = [('_i.tif', ''), ('.jp2', ''), ('_ocr.txt', '_ocr.txt'), ('_hocr.html', '_hocr.html')]
+
+WORDS = ['Knoxville', 'Tennessee', 'river', 'photograph', 'letter', 'map', 'county', 'farm', 'railroad', 'mountain', 'church', 'school', 'portrait']
+
+def generate_sheet(output_file, rows, mode='plain', extra_columns=0, pages_per_work=(4, 24), pages_first=0.1, seed=0):
+  """Writes a synthetic metadata sheet that looks like the ones catalogers hand to create_sheet.
+
+  Args:
+      output_file (str): The filename of the sheet to write.
+      rows (int): The number of rows to write, not counting the header. The last work may be cut short to hit this exactly.
+      mode (str, optional): Which create_sheet mode the sheet is for, 'plain', 'attachments' or 'audio_visual'. Defaults to 'plain'.
+      extra_columns (int, optional): Number of extra descriptive metadata columns, to make the sheet as wide as real exports. Defaults to 0.
+      pages_per_work (tuple, optional): The smallest and largest number of page attachments for books and compound objects. Defaults to (4, 24).
+      pages_first (float, optional): Fraction of books whose pages are listed before the book itself. Defaults to 0.1.
+      seed (int, optional): Seed for the random generator so the same sheet can be generated again. Defaults to 0.
+
+  Returns:
+      dict: Counts of the rows written for each model.
+  """
+  rng = random.Random(seed)
+  fieldnames = REQUIRED_COLUMNS + [f"extra_{n}" for n in range(extra_columns)]
+  models = MODE_MODELS[mode]
+  counts = {}
+  written = 0
+  work_number = 0
+  with open(output_file, mode='w', newline='', encoding='utf-8') as outfile:
+    writer = csv.writer(outfile)
+    writer.writerow(fieldnames)
+    while written < rows:
+      model = rng.choice(models)
+      source_identifier = f"synthetic_{work_number:08d}"
+      work_number += 1
+      work = [
+        source_identifier, model, 'open', '', '', source_identifier + rng.choice(MODEL_FILES[model]),
+        ' '.join(rng.choices(WORDS, k=4)), '', ' '.join(rng.choices(WORDS, k=20)), '',
+      ]
+      work.extend(rng.choice(WORDS) for _ in range(extra_columns))
+      group = [work]
+      if mode == 'attachments' and model in ('Book', 'CompoundObject'):
+        pages = []
+        for sequence in range(1, rng.randint(*pages_per_work) + 1):
+          file_ending, source_ending = rng.choice(PAGE_FILES)
+          page_identifier = f"{source_identifier}_{sequence:04d}"
+          page = [page_identifier + source_ending, 'Attachment', 'open', '', source_identifier, page_identifier + file_ending, '', str(sequence), '', '']
+          page.extend('' for _ in range(extra_columns))
+          pages.append(page)
+        group = pages + group if rng.random() < pages_first else group + pages
+      for row in group[:rows - written]:
+        writer.writerow(row)
+        counts[row[1]] = counts.get(row[1], 0) + 1
+        written += 1
+  return counts
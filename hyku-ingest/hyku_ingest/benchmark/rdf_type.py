@@ -0,0 +1,150 @@
+import random
+import time
+from functools import lru_cache
+
+from hyku_ingest.create_sheet.rdf_type import RDF_TYPE_MAP, work_rdf_type, attachment_rdf_type
+
+# ======== Reference implementations ================
+# These are the substring chains the row builders used before rdf_type.py, kept here to check the classifier against
+
+def legacy_work_rdf_type(work):
+  """The rdf_type chain formerly used by verify_work_row and create_attachment_row."""
+  if work['model'].lower() == 'pdf':
+    return RDF_TYPE_MAP['PDF']
+  elif "_i." in work['file_identifier']:
+    return RDF_TYPE_MAP['Intermediate'] 
+  elif "_p." in work['file_identifier']:
+    return RDF_TYPE_MAP['Preservation']
+  elif "_transcript." in work['file_identifier']:
+    return RDF_TYPE_MAP['Transcript']
+  elif "_ocr." in work['file_identifier']:
+    return RDF_TYPE_MAP['OCR']
+  elif "_hocr." in work['file_identifier']:
+    return RDF_TYPE_MAP['HOCR']
+  elif ".jpg" in work['file_identifier'] or ".mp3" in work['file_identifier'] or ".jp2" in work["file_identifier"]:
+    return RDF_TYPE_MAP['Access']
+  else:
+    return ""
+
+def legacy_attachment_rdf_type(attachment):
+  """The rdf_type chain formerly used by verify_attachment_row and add_title_to_book_page."""
+  if "_hocr." in attachment['source_identifier']:
+    return RDF_TYPE_MAP['HOCR']
+  elif "_ocr." in attachment['source_identifier']:
+    return RDF_TYPE_MAP['OCR']
+  elif "_i." in attachment['file_identifier']:
+    return RDF_TYPE_MAP['Intermediate'] 
+  elif "_p." in attachment['file_identifier']:
+    return RDF_TYPE_MAP['Preservation']
+  elif "_transcript." in attachment['file_identifier']:
+    return RDF_TYPE_MAP['Transcript']
+  elif ".jpg" in attachment['file_identifier'] or ".mp3" in attachment['file_identifier'] or ".jp2" in attachment["file_identifier"]:
+    return RDF_TYPE_MAP['Access']
+  else:
+    return ""
+
+# ======== Identifier generation ================
+SUFFIXES = ['', '', '_i', '_p', '_transcript', '_ocr', '_hocr', '_x', '_hocr_i']
+EXTENSIONS = ['.tif', '.jpg', '.jp2', '.mp3', '.mp4', '.pdf', '.txt', '.xml', '.html', '.jpg.tif', '_i.tif.xml', '']
+MODELS = ['Image', 'Pdf', 'Book', 'Audio', 'Video', 'CompoundObject', 'Attachment']
+
+def generate_rows(count, seed=0):
+  """Builds rows with a realistic mix of file_identifiers, mostly unique with one dot, plus the odd identifier with zero or several dots.
+
+  Args:
+      count (int): Number of rows to generate.
+      seed (int, optional): Seed for the random generator so runs are repeatable. Defaults to 0.
+
+  Returns:
+      list: Dictionaries with model, source_identifier and file_identifier keys.
+  """
+  rng = random.Random(seed)
+  rows = []
+  for n in range(count):
+    name = f"collection{n % 97}_{n}{rng.choice(SUFFIXES)}"
+    rows.append({
+      'model': rng.choice(MODELS),
+      'source_identifier': name + rng.choice(['', '', '_ocr.txt', '_hocr.html']),
+      'file_identifier': name + rng.choice(EXTENSIONS),
+    })
+  return rows
+
+# ======== Benchmark ================
+def check_classifications(rows):
+  """Compares the classifier with the reference chains on every row.
+
+  Args:
+      rows (list): Rows from generate_rows.
+
+  Returns:
+      int: The number of rows where either classification differs.
+  """
+  mismatches = 0
+  for row in rows:
+    if work_rdf_type(row['model'], row['file_identifier']) != legacy_work_rdf_type(row):
+      mismatches += 1
+    elif attachment_rdf_type(row['source_identifier'], row['file_identifier']) != legacy_attachment_rdf_type(row):
+      mismatches += 1
+  return mismatches
+
+def best_of(repeats, func, rows):
+  """Runs func on the rows repeats times and returns the fastest time in seconds."""
+  times = []
+  for _ in range(repeats):
+    start = time.perf_counter()
+    func(rows)
+    times.append(time.perf_counter() - start)
+  return min(times)
+
+def run_legacy_work(rows):
+  for row in rows:
+    legacy_work_rdf_type(row)
+
+def run_work(rows):
+  for row in rows:
+    work_rdf_type(row['model'], row['file_identifier'])
+
+def run_cached_work(rows):
+  # an lru_cache in front of the classifier, measured to show what caching identifiers would cost or save
+  cached = lru_cache(maxsize=65536)(work_rdf_type)
+  for row in rows:
+    cached(row['model'], row['file_identifier'])
+
+def run_legacy_attachment(rows):
+  for row in rows:
+    legacy_attachment_rdf_type(row)
+
+def run_attachment(rows):
+  for row in rows:
+    attachment_rdf_type(row['source_identifier'], row['file_identifier'])
+
+def benchmark_rdf_type(count=1_000_000, seed=0, repeats=3):
+  """Times the classifier against the reference chains on count generated identifiers.
+  Unique identifiers are what real sheets contain, the repeated set cycles through 1000 identifiers to show the best case for a cache.
+
+  Args:
+      count (int, optional): Number of identifiers to classify. Defaults to 1,000,000.
+      seed (int, optional): Seed for the random generator. Defaults to 0.
+      repeats (int, optional): Number of times each timing is run, the fastest is kept. Defaults to 3.
+
+  Returns:
+      dict: Timings in seconds for each implementation and the number of mismatched classifications.
+  """
+  rows = generate_rows(count, seed)
+  repeated_rows = rows[:1000] * max(count // 1000, 1)
+  return {
+    'identifiers': count,
+    'mismatches': check_classifications(rows),
+    'legacy_work_seconds': best_of(repeats, run_legacy_work, rows),
+    'work_seconds': best_of(repeats, run_work, rows),
+    'cached_work_seconds': best_of(repeats, run_cached_work, rows),
+    'legacy_attachment_seconds': best_of(repeats, run_legacy_attachment, rows),
+    'attachment_seconds': best_of(repeats, run_attachment, rows),
+    'repeated_legacy_work_seconds': best_of(repeats, run_legacy_work, repeated_rows),
+    'repeated_work_seconds': best_of(repeats, run_work, repeated_rows),
+    'repeated_cached_work_seconds': best_of(repeats, run_cached_work, repeated_rows),
+  }
+
+if __name__ == "__main__":
+  for key, value in benchmark_rdf_type().items():
+    print(f"{key}: {value}")
@@ -0,0 +1,249 @@
+import csv
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from importlib.metadata import version, PackageNotFoundError
+
+from .generate import generate_sheet
+from .rdf_type import benchmark_rdf_type
+
+# Each create_sheet case is (name, generator mode, attachments_given, audio_visual, extra ingest_main options)
+CREATE_SHEET_CASES = [
+  ('create_sheet', 'plain', False, False, {}),
+  ('create_sheet_attachments', 'attachments', True, False, {}),
+  ('create_sheet_audio_visual', 'audio_visual', False, True, {}),
+  # every row written as it is generated through the default file buffer, to measure the block writer against
+  ('create_sheet_row_writes', 'plain', False, False, {'write_block': 1, 'write_buffer': -1}),
+]
+
+def count_rows(filename):
+  """Counts the rows of a CSV file, not counting the header."""
+  with open(filename, mode='r', newline='', encoding='utf-8') as infile:
+    return sum(1 for _ in csv.reader(infile)) - 1
+
+def peak_rss_kb():
+  """Returns the peak resident memory of this process and any finished child processes, such as create_sheet workers, in kilobytes.
+  The resource module is Unix only, so on Windows this returns None and memory is not compared.
+  """
+  try:
+    import resource
+  except ImportError:
+    return None
+  peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+  if sys.platform == 'darwin': # macOS reports bytes instead of kilobytes
+    peak //= 1024
+  return peak
+
+def _run_case(case, input_file, output_file, options, results):
+  """Runs one case inside a fresh process so its wall time and peak memory are not affected by the other cases.
+  Anything the case prints is discarded, including from worker processes.
+  """
+  devnull = os.open(os.devnull, os.O_WRONLY)
+  os.dup2(devnull, 1)
+  try:
+    start = time.perf_counter()
+    if case == 'split_sheet':
+      from hyku_ingest.split_sheet import split_sheet
+      split_sheet(input_file, output_file, output_file + 'empty.csv', options['chunk_size'])
+    else:
+      from hyku_ingest.create_sheet import CreateSheet
+      CreateSheet().ingest_main(input_file, output_file, options['attachments_given'], False, options['audio_visual'], options['workers'], **options['extra'])
+    results.put({'wall_seconds': time.perf_counter() - start, 'peak_rss_kb': peak_rss_kb()})
+  except SystemExit as e:
+    results.put({'error': f"exited with status {e.code}"})
+
+def run_case(case, input_file, output_file, options):
+  """Runs a benchmark case in a separate process and collects its measurements.
+
+  Args:
+      case (str): 'split_sheet', or the name of any create_sheet case.
+      input_file (str): The input sheet for the case.
+      output_file (str): The output sheet, or the output prefix for split_sheet.
+      options (dict): The options for the case, see run_benchmarks.
+
+  Returns:
+      dict: wall_seconds and peak_rss_kb for the case, peak_rss_kb is None where memory cannot be measured, or error if it failed.
+  """
+  context = multiprocessing.get_context('spawn')
+  results = context.Queue()
+  process = context.Process(target=_run_case, args=(case, input_file, output_file, options, results))
+  process.start()
+  process.join()
+  if results.empty():
+    return {'error': f"process exited with status {process.exitcode}"}
+  return results.get()
+
+def run_benchmarks(rows=100000, extra_columns=20, workers=1, chunk_size=10000, seed=0, work_dir=None, verbose=False):
+  """Generates a synthetic sheet for each create_sheet mode and measures create_sheet on it, then measures split_sheet on the -a output.
+
+  Args:
+      rows (int, optional): Number of input rows in each generated sheet. Defaults to 100000.
+      extra_columns (int, optional): Number of extra metadata columns in each generated sheet. Defaults to 20.
+      workers (int, optional): The --workers option passed to create_sheet. Defaults to 1.
+      chunk_size (int, optional): The number of rows per file for split_sheet. Defaults to 10000.
+      seed (int, optional): Seed for the sheet generator. Defaults to 0.
+      work_dir (str, optional): Directory to create the temporary sheets in, the system temp directory if not given. Defaults to None.
+      verbose (bool, optional): Option to print each result as it is measured. Defaults to False.
+
+  Returns:
+      dict: The run settings, environment, and a result for each case with rows/sec, peak RSS, wall time and bytes read and written.
+  """
+  try:
+    package_version = version('hyku-ingest')
+  except PackageNotFoundError:
+    package_version = 'unknown'
+  results = {
+    'version': package_version,
+    'python': platform.python_version(),
+    'platform': platform.platform(),
+    'timestamp': datetime.now(timezone.utc).isoformat(),
+    'settings': {'rows': rows, 'extra_columns': extra_columns, 'workers': workers, 'chunk_size': chunk_size, 'seed': seed},
+    'cases': {},
+  }
+  with tempfile.TemporaryDirectory(dir=work_dir) as tmp:
+    split_input = None
+    for name, mode, attachments_given, audio_visual, extra in CREATE_SHEET_CASES:
+      input_file = os.path.join(tmp, f"{name}_input.csv")
+      output_file = os.path.join(tmp, f"{name}_output.csv")
+      models = generate_sheet(input_file, rows, mode, extra_columns, seed=seed)
+      options = {'attachments_given': attachments_given, 'audio_visual': audio_visual, 'workers': workers, 'extra': extra}
+      result = run_case(name, input_file, output_file, options)
+      result['input_models'] = models
+      add_throughput(result, input_file, output_file, rows)
+      results['cases'][name] = result
+      if attachments_given:
+        split_input = output_file
+      if verbose:
+        print(f"{name}: {result}")
+
+    # split_sheet runs on a finished ingest sheet, the output of the -a case has all of the attachment and fileset rows
+    if split_input and os.path.exists(split_input):
+      prefix = os.path.join(tmp, 'split_')
+      result = run_case('split_sheet', split_input, prefix, {'chunk_size': chunk_size})
+      add_throughput(result, split_input, None, count_rows(split_input))
+      result['bytes_written'] = sum(os.path.getsize(os.path.join(tmp, f)) for f in os.listdir(tmp) if f.startswith('split_'))
+      results['cases']['split_sheet'] = result
+      if verbose:
+        print(f"split_sheet: {result}")
+
+    results['cold_start'] = measure_cold_start(tmp)
+    if verbose:
+      print(f"cold_start: {results['cold_start']}")
+
+  results['rdf_type'] = benchmark_rdf_type(rows, seed)
+  return results
+
+def measure_cold_start(work_dir, runs=10):
+  """Times the ingest command starting in a fresh process, the way automation runs it once for every small sheet, and the same job sent to a warm ingest serve process.
+  The fastest of the runs is kept for each, as it is the least affected by whatever else the machine is doing.
+
+  Args:
+      work_dir (str): Directory for the small generated sheet.
+      runs (int, optional): Number of times to run each command. Defaults to 10.
+
+  Returns:
+      dict: help_ms for ingest --help, create_sheet_ms for create_sheet on a 20 row sheet, and serve_ms for that job on a warm serve process, or error if a command failed.
+  """
+  input_file = os.path.join(work_dir, 'cold_start_input.csv')
+  output_file = os.path.join(work_dir, 'cold_start_output.csv')
+  generate_sheet(input_file, 20, 'plain', 5)
+  create_sheet_argv = ['create_sheet', '-i', input_file, '-o', output_file]
+  # runs the same hyku_ingest as this process, whether or not it is installed
+  package_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+  env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [package_root, os.environ.get('PYTHONPATH')])))
+  command = [sys.executable, '-m', 'hyku_ingest.ingest']
+
+  def fastest_ms(argv):
+    times = []
+    for _ in range(runs):
+      start = time.perf_counter()
+      finished = subprocess.run(command + argv, capture_output=True, cwd=work_dir, env=env)
+      times.append(time.perf_counter() - start)
+      if finished.returncode != 0:
+        raise RuntimeError(f"ingest {argv[0]} exited with status {finished.returncode}")
+    return min(times) * 1000
+
+  try:
+    result = {'help_ms': fastest_ms(['--help']), 'create_sheet_ms': fastest_ms(create_sheet_argv)}
+  except RuntimeError as e:
+    return {'error': str(e)}
+  with subprocess.Popen(command + ['serve'], stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, cwd=work_dir, env=env) as server:
+    times = []
+    for job_id in range(runs):
+      start = time.perf_counter()
+      server.stdin.write(json.dumps({'id': job_id, 'argv': create_sheet_argv}) + '\n')
+      server.stdin.flush()
+      line = server.stdout.readline()
+      times.append(time.perf_counter() - start)
+      status = json.loads(line)['status'] if line else None
+      if status != 0:
+        result['error'] = f"ingest serve job exited with status {status}" if line else "ingest serve exited"
+        break
+    server.stdin.close()
+  if 'error' not in result:
+    result['serve_ms'] = min(times) * 1000
+  return result
+
+def add_throughput(result, input_file, output_file, rows):
+  """Adds the row count, rows/sec and bytes read and written to a case result, if the case did not fail."""
+  if 'error' in result:
+    return
+  result['input_rows'] = rows
+  result['rows_per_second'] = rows / result['wall_seconds'] if result['wall_seconds'] else 0
+  result['bytes_read'] = os.path.getsize(input_file)
+  if output_file:
+    result['output_rows'] = count_rows(output_file)
+    result['bytes_written'] = os.path.getsize(output_file)
+
+def compare_results(current, previous, threshold=0.1):
+  """Compares two benchmark results and lists the cases that got slower or use more memory by more than threshold, and any rdf_type mismatches.
+
+  Args:
+      current (dict): Results from run_benchmarks.
+      previous (dict): Earlier results from run_benchmarks, usually loaded from the JSON of the last release.
+      threshold (float, optional): The fraction a measurement can get worse by before it is reported. Defaults to 0.1.
+
+  Returns:
+      list: A message for each regression, empty if there are none.
+  """
+  regressions = []
+  for name, result in current['cases'].items():
+    before = previous.get('cases', {}).get(name)
+    if not before or 'error' in before:
+      continue
+    if 'error' in result:
+      regressions.append(f"{name}: failed with {result['error']}")
+      continue
+    if result['rows_per_second'] < before['rows_per_second'] * (1 - threshold):
+      regressions.append(f"{name}: {result['rows_per_second']:.0f} rows/sec, was {before['rows_per_second']:.0f}")
+    if result.get('peak_rss_kb') is not None and before.get('peak_rss_kb') is not None and result['peak_rss_kb'] > before['peak_rss_kb'] * (1 + threshold):
+      regressions.append(f"{name}: peak RSS {result['peak_rss_kb']} KB, was {before['peak_rss_kb']} KB")
+  # the classifier must give the same rdf_type as the substring chains it replaced, whatever the earlier results were
+  mismatches = current.get('rdf_type', {}).get('mismatches', 0)
+  if mismatches:
+    regressions.append(f"rdf_type: {mismatches} identifiers classified differently from the reference chains")
+  cold_start = current.get('cold_start', {})
+  before = previous.get('cold_start', {})
+  if 'error' in cold_start:
+    regressions.append(f"cold_start: failed with {cold_start['error']}")
+  elif before and 'error' not in before:
+    for measurement in ['help_ms', 'create_sheet_ms']:
+      if measurement in before and cold_start[measurement] > before[measurement] * (1 + threshold):
+        regressions.append(f"cold_start {measurement}: {cold_start[measurement]:.1f} ms, was {before[measurement]:.1f} ms")
+  return regressions
+
+def save_results(results, output_file):
+  """Writes benchmark results to a JSON file."""
+  with open(output_file, mode='w', encoding='utf-8') as outfile:
+    json.dump(results, outfile, indent=2)
+
+def load_results(input_file):
+  """Reads benchmark results from a JSON file written by save_results."""
+  with open(input_file, mode='r', encoding='utf-8') as infile:
+    return json.load(infile)
@@ -1,3 +1,11 @@
-from .create_sheet import CreateSheet
+from .create_sheet import CreateSheet, IngestError
+from .detect import detect_options
 
-__all__ = [ "CreateSheet" ]
\ No newline at end of file
+__all__ = [ "CreateSheet", "IngestError", "detect_options", "run_batch" ]
+
+def __getattr__(name):
+  # batches need multiprocessing, which is only imported once a batch is run
+  if name == 'run_batch':
+    from .batch import run_batch
+    return run_batch
+  raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
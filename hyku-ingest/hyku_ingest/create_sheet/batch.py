@@ -0,0 +1,97 @@
+import io
+import os
+import time
+from contextlib import redirect_stdout
+from multiprocessing import Pool
+
+from .create_sheet import CreateSheet, IngestError
+from .detect import detect_options
+from ..compressed import COMPRESSED_SUFFIXES
+
+# Input sheets of a batch, compressed ones are read and their output sheets written with the same compression
+SHEET_SUFFIXES = ('.csv',) + tuple('.csv' + suffix for suffix in COMPRESSED_SUFFIXES)
+
+def batch_jobs(input_dir, output_dir):
+  """Lists the sheets to create in a batch, every .csv, .csv.gz or .csv.zst file in input_dir with an output file of the same name in output_dir.
+
+  Args:
+      input_dir (str): The directory of input sheets.
+      output_dir (str): The directory to write the output sheets to.
+
+  Returns:
+      list: The input and output filename of each sheet, sorted by input filename.
+  """
+  return [(os.path.join(input_dir, name), os.path.join(output_dir, name))
+          for name in sorted(os.listdir(input_dir))
+          if name.lower().endswith(SHEET_SUFFIXES) and os.path.isfile(os.path.join(input_dir, name))]
+
+def run_batch_job(job):
+  """Creates one output sheet of a batch, with the options detected from its input sheet. Runs in a worker process of run_batch.
+  Everything create_sheet prints is collected and returned rather than printed, so the output of sheets running at the same time is not mixed together.
+
+  Args:
+      job (tuple): The input filename, output filename and verbose option.
+
+  Returns:
+      dict: The input file, the options used, the number of input rows, wall_seconds, the printed output, and error if the sheet failed.
+  """
+  input_file, output_file, verbose = job
+  result = {'input_file': input_file, 'output_file': output_file}
+  printed = io.StringIO()
+  start = time.perf_counter()
+  try:
+    with redirect_stdout(printed):
+      attachments_given, audio_visual, model_counts = detect_options(input_file)
+      result.update({'attachments_given': attachments_given, 'audio_visual': audio_visual, 'rows': sum(model_counts.values())})
+      CreateSheet().ingest_main(input_file, output_file, attachments_given, verbose, audio_visual)
+  except IngestError as e:
+    result['error'] = str(e)
+  except SystemExit as e: # create_sheet prints what went wrong before exiting
+    result['error'] = f"exited with status {e.code}"
+  except Exception as e: # any other failure, such as a sheet that is not UTF-8, only fails this sheet so the rest of the batch still runs
+    result['error'] = f"{type(e).__name__}: {e}"
+  result['wall_seconds'] = time.perf_counter() - start
+  result['printed'] = printed.getvalue()
+  return result
+
+def run_batch(input_dir, output_dir, workers=None, verbose=False):
+  """Creates an output sheet for every input sheet in a directory, several sheets at a time across a pool of processes.
+  The options for each sheet are detected from its model column with detect_options, instead of being given.
+  Each sheet's printed output and a throughput line are printed as the sheet finishes.
+
+  Args:
+      input_dir (str): The directory of input sheets, every .csv file in it is processed, compressed ones included.
+      output_dir (str): The directory to write the output sheets to, with the same filenames. It is created if it does not exist.
+      workers (int, optional): Number of sheets to process at the same time, the number of CPUs if not given. Defaults to None.
+      verbose (bool, optional): Option to print out extra debug information. Defaults to False.
+
+  Returns:
+      list: The result of each sheet from run_batch_job, in the order they finished.
+  """
+  os.makedirs(output_dir, exist_ok=True)
+  jobs = [(input_file, output_file, verbose) for input_file, output_file in batch_jobs(input_dir, output_dir)]
+  if not jobs:
+    print(f"No .csv, .csv.gz or .csv.zst files found in {input_dir}")
+    return []
+  results = []
+  start = time.perf_counter()
+  with Pool(min(workers or os.cpu_count() or 1, len(jobs))) as pool:
+    for result in pool.imap_unordered(run_batch_job, jobs):
+      results.append(result)
+      if result['printed']:
+        print(result['printed'], end='')
+      print(batch_result_line(result))
+  wall_seconds = time.perf_counter() - start
+  rows = sum(result.get('rows', 0) for result in results if 'error' not in result)
+  failed = sum(1 for result in results if 'error' in result)
+  print(f"Batch finished: {len(results) - failed} of {len(results)} sheets created, {rows} rows in {wall_seconds:.1f}s, {rows / wall_seconds if wall_seconds else 0:.0f} rows/sec")
+  return results
+
+def batch_result_line(result):
+  """Builds the summary line for one sheet of a batch, with its options and throughput or its error."""
+  name = os.path.basename(result['input_file'])
+  if 'error' in result:
+    return f"{name}: FAILED, {result['error']}"
+  options = [flag for flag, given in (('-a', result['attachments_given']), ('--audio_visual', result['audio_visual'])) if given]
+  rows_per_second = result['rows'] / result['wall_seconds'] if result['wall_seconds'] else 0
+  return f"{name}: {result['rows']} rows in {result['wall_seconds']:.1f}s, {rows_per_second:.0f} rows/sec, options: {' '.join(options) or 'none'}"
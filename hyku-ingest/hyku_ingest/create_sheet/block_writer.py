@@ -0,0 +1,32 @@
+class BlockWriter:
+  """A csv writer wrapper that collects rows and writes them in blocks with writerows, instead of one writerow call per generated row.
+  The csv module formats rows the same either way, so the output is byte-identical. Anything holding on to output positions,
+  like a checkpoint, must call flush first so every row given so far has reached the file.
+  """
+
+  def __init__(self, writer, block_rows):
+    """
+    Args:
+        writer (csv.writer): The writer to write the blocks of rows with.
+        block_rows (int): Number of rows to collect before writing them.
+    """
+    self.writer = writer
+    self.block_rows = block_rows
+    self.rows = []
+
+  def writerow(self, row):
+    rows = self.rows
+    rows.append(row)
+    if len(rows) >= self.block_rows:
+      self.flush()
+
+  def writerows(self, rows):
+    self.rows.extend(rows)
+    if len(self.rows) >= self.block_rows:
+      self.flush()
+
+  def flush(self):
+    """Writes every collected row."""
+    if self.rows:
+      self.writer.writerows(self.rows)
+      self.rows = []
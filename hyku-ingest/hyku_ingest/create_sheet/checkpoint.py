@@ -0,0 +1,151 @@
+import hashlib
+import json
+import os
+
+class Checkpoint:
+  """Periodically records how far create_sheet has got through a sheet, so a failed run can be resumed instead of started over.
+  The checkpoint is a small JSON file next to the output file holding the input position, the number of rows processed, the output position,
+  and a hash of the input up to that position. A resumed run only trusts the checkpoint if that part of the input is unchanged,
+  so fixing a bad row after the checkpoint and resuming is fine.
+  """
+
+  def __init__(self, checkpoint_file, input_file, infile, outfile, every, options, state=None, writer=None):
+    """
+    Args:
+        checkpoint_file (str): The filename of the checkpoint.
+        input_file (str): The filename of the input file.
+        infile (file): The open input file, read with readline so its position can be told.
+        outfile (file): The open output file.
+        every (int): Number of input rows between checkpoints.
+        options (dict): The create_sheet options that must match for a run to be resumed.
+        state (dict, optional): A verified checkpoint from load, to continue counting and hashing from. Defaults to None.
+        writer (BlockWriter, optional): The buffered output writer, flushed before each checkpoint so the output position covers every processed row. Defaults to None.
+    """
+    self.checkpoint_file = checkpoint_file
+    self.infile = infile
+    self.outfile = outfile
+    self.writer = writer
+    self.every = every
+    self.options = options
+    self.rows_read = 0
+    self.saved_rows = 0
+    # a second handle on the input for hashing what has been read so far, the text handle's position is only used to seek
+    self.raw = open(input_file, mode='rb')
+    self.hasher = hashlib.blake2b()
+    self.hashed_offset = 0
+    if state:
+      self.rows_read = self.saved_rows = state['rows_processed']
+      self.hash_to(state['input_offset'])
+
+  @staticmethod
+  def checkpoint_file_for(output_file):
+    """Returns the checkpoint filename used for an output file."""
+    return output_file + '.checkpoint'
+
+  def hash_to(self, offset):
+    """Adds the input bytes up to offset to the running hash."""
+    while self.hashed_offset < offset:
+      data = self.raw.read(min(offset - self.hashed_offset, 1 << 20))
+      if not data:
+        break
+      self.hasher.update(data)
+      self.hashed_offset += len(data)
+
+  def row_done(self):
+    """Counts one processed input row and saves a checkpoint if enough rows have been processed since the last one.
+    Only call this once every output row for the input row has been written.
+    """
+    self.rows_read += 1
+    if self.rows_read - self.saved_rows >= self.every:
+      self.save(self.infile.tell(), self.rows_read)
+
+  def position(self, rows):
+    """Counts rows as read and returns the current input position, for saving once those rows have been written.
+
+    Args:
+        rows (int): Number of rows read since the last call.
+
+    Returns:
+        tuple: The input position and the number of rows read up to it.
+    """
+    self.rows_read += rows
+    return self.infile.tell(), self.rows_read
+
+  def reached(self, position):
+    """Saves a checkpoint at a position from position if enough rows have been processed since the last one.
+    Only call this once every output row for the rows before the position has been written.
+
+    Args:
+        position (tuple): A position returned by position.
+    """
+    input_offset, rows_processed = position
+    if rows_processed - self.saved_rows >= self.every:
+      self.save(input_offset, rows_processed)
+
+  def save(self, input_offset, rows_processed):
+    """Flushes the output file to disk and writes a checkpoint for the given input position.
+
+    Args:
+        input_offset (int): The input position just after the last processed row, from the input file's tell.
+        rows_processed (int): The number of input rows processed up to that position.
+    """
+    if input_offset >> 64: # the decoder was midway through a character, which never happens at the end of a row, so skip this one
+      return
+    if self.writer:
+      self.writer.flush()
+    self.outfile.flush()
+    os.fsync(self.outfile.fileno())
+    self.hash_to(input_offset)
+    checkpoint = {
+      'input_offset': input_offset,
+      'input_hash': self.hasher.hexdigest(),
+      'rows_processed': rows_processed,
+      'output_offset': self.outfile.tell(),
+      'options': self.options,
+    }
+    temp_file = self.checkpoint_file + '.tmp'
+    with open(temp_file, mode='w', encoding='utf-8') as checkpoint_out:
+      json.dump(checkpoint, checkpoint_out)
+    os.replace(temp_file, self.checkpoint_file)
+    self.saved_rows = rows_processed
+
+  def close(self, finished):
+    """Closes the hashing handle, and removes the checkpoint if the run finished.
+
+    Args:
+        finished (bool): If every row was processed, in which case there is nothing left to resume.
+    """
+    self.raw.close()
+    if finished and os.path.exists(self.checkpoint_file):
+      os.remove(self.checkpoint_file)
+
+  @staticmethod
+  def load(checkpoint_file, input_file, options):
+    """Reads a checkpoint and checks that it can be resumed from, that the options match and the input is unchanged up to the checkpoint.
+
+    Args:
+        checkpoint_file (str): The filename of the checkpoint.
+        input_file (str): The filename of the input file.
+        options (dict): The create_sheet options for this run.
+
+    Returns:
+        tuple: The checkpoint as a dictionary, or None, and a message explaining why it cannot be used, or None.
+    """
+    if not os.path.exists(checkpoint_file):
+      return None, f"No checkpoint found at {checkpoint_file}"
+    with open(checkpoint_file, mode='r', encoding='utf-8') as checkpoint_in:
+      checkpoint = json.load(checkpoint_in)
+    if checkpoint['options'] != options:
+      return None, f"Checkpoint was made with different options {checkpoint['options']}"
+    hasher = hashlib.blake2b()
+    remaining = checkpoint['input_offset']
+    with open(input_file, mode='rb') as raw:
+      while remaining > 0:
+        data = raw.read(min(remaining, 1 << 20))
+        if not data:
+          break
+        hasher.update(data)
+        remaining -= len(data)
+    if remaining > 0 or hasher.hexdigest() != checkpoint['input_hash']:
+      return None, "Input file has changed before the checkpoint"
+    return checkpoint, None
@@ -1,15 +1,22 @@
 import csv
+import os
+from collections import deque
+from itertools import chain
+from operator import itemgetter
+
+from .rdf_type import RDF_TYPE_MAP, TRANSCRIPT, work_rdf_type, attachment_rdf_type
+from .row import Row, build_index, pad_values
+from .block_writer import BlockWriter
+from ..columnar import ParquetSheetWriter, parquet_problem
+from ..compressed import open_sheet, is_compressed, compression_problem
+from ..profiling import NullProfile
+# Checkpoints, the work cache, identifier and mirror checks and the worker pool are imported where they are used, so runs without them start faster
+
+class IngestError(Exception):
+  """Raised when a row in the input sheet cannot be processed, the message explains what went wrong."""
 
 class CreateSheet:
-  RDF_TYPE_MAP = {
-    'Preservation': 'http://pcdm.org/use#PreservationFile', # will have _p at end of file_identifier
-    'Intermediate': 'http://pcdm.org/use#IntermediateFile', # will have _i at end of file_identifier
-    'Access': 'http://pcdm.org/use#ServiceFile',            # will be .mp3 .jpg, possibly .mp4 but not sure yet
-    'HOCR': 'http://pcdm.org/file-format-types#HTML',       # only applies to books?, has _hocr 
-    'PDF': 'http://pcdm.org/file-format-types#Document',    # if model is pdf 
-    'Transcript': 'http://pcdm.org/use#Transcript',         # will have _transcript at end of file_identifier
-    'OCR': 'http://pcdm.org/use#ExtractedText',             # only applies to books, has _ocr
-  }
+  RDF_TYPE_MAP = RDF_TYPE_MAP # defined in rdf_type.py, kept here for existing references
 
   RESTRICTED_TITLES = { # TODO titles are slightly different now so this will need to change
     'MODS',
@@ -22,6 +29,9 @@ class CreateSheet:
     'ALTO'
   }
 
+  # Where the import server serves files from, the remote_files of a fileset is this followed by its file_identifier
+  REMOTE_FILES_URL = "http://hykuimports.lib.utk.edu/files/hyku-import/"
+
   VISIBILITY_TYPE_MAP = [ # reference for types of visibilities
     'open',
     'restricted',
@@ -42,11 +52,11 @@ class CreateSheet:
     """Does any edits or checks to given work row, currently fixes has_work_type field, removes whitespace from source_identifier, and copies over primary identifier.
 
     Args:
-        work (dict): The work row that will be verified and fixed
+        work (Row): The work row that will be verified and fixed
         verbose (bool, optional): Option to print out extra debug information. Defaults to False.
 
     Returns:
-        dict: The work row after any edits or fixes
+        Row: The work row after any edits or fixes
     """
     if 'has_work_type' not in work:
       if work['model'].lower() in self.HAS_WORK_TYPE_MAP:
@@ -60,33 +70,18 @@ class CreateSheet:
       work['source_identifier'] = work['source_identifier'].replace(' ', '_')
     work['primary_identifier'] = work['source_identifier']
     if work['rdf_type'] == "":
-      if work['model'].lower() == 'pdf':
-        work['rdf_type'] = self.RDF_TYPE_MAP['PDF']
-      elif "_i." in work['file_identifier']:
-        work['rdf_type'] = self.RDF_TYPE_MAP['Intermediate'] 
-      elif "_p." in work['file_identifier']:
-        work['rdf_type'] = self.RDF_TYPE_MAP['Preservation']
-      elif "_transcript." in work['file_identifier']:
-        work['rdf_type'] = self.RDF_TYPE_MAP['Transcript']
-      elif "_ocr." in work['file_identifier']:
-        work['rdf_type'] = self.RDF_TYPE_MAP['OCR']
-      elif "_hocr." in work['file_identifier']:
-        work['rdf_type'] = self.RDF_TYPE_MAP['HOCR']
-      elif ".jpg" in work['file_identifier'] or ".mp3" in work['file_identifier'] or ".jp2" in work["file_identifier"]:
-        work['rdf_type'] = self.RDF_TYPE_MAP['Access']
-      else:
-        work['rdf_type'] = "" # default rdf type is currently nothing
+      work['rdf_type'] = work_rdf_type(work['model'], work['file_identifier']) # default rdf type is currently nothing
     return work
 
   def verify_attachment_row(self, attachment, verbose=False):
     """Does any edits or checks to given attachment row, currently sets correct rdf_type, copies over primary_identifier, and removes whitespace from source_identifier.
 
     Args:
-      attachment (dict): Attachment row as a dictionary that you want to edit/check
+      attachment (Row): Attachment row that you want to edit/check
       verbose (bool, optional): Option to print out extra debug information. Defaults to False.
 
     Returns:
-      dict: A dictionary of the attachment row with any fixes done
+      Row: The attachment row with any fixes done
     """
     if ' ' in attachment['source_identifier']:
       if verbose:
@@ -97,20 +92,7 @@ class CreateSheet:
     
     # adding the rdf type if it is not already present
     if attachment['rdf_type'] == "":
-      if "_hocr." in attachment['source_identifier']:
-        attachment['rdf_type'] = self.RDF_TYPE_MAP['HOCR']
-      elif "_ocr." in attachment['source_identifier']:
-        attachment['rdf_type'] = self.RDF_TYPE_MAP['OCR']
-      elif "_i." in attachment['file_identifier']:
-        attachment['rdf_type'] = self.RDF_TYPE_MAP['Intermediate'] 
-      elif "_p." in attachment['file_identifier']:
-        attachment['rdf_type'] = self.RDF_TYPE_MAP['Preservation']
-      elif "_transcript." in attachment['file_identifier']:
-        attachment['rdf_type'] = self.RDF_TYPE_MAP['Transcript']
-      elif ".jpg" in attachment['file_identifier'] or ".mp3" in attachment['file_identifier'] or ".jp2" in attachment["file_identifier"]:
-        attachment['rdf_type'] = self.RDF_TYPE_MAP['Access']
-      else:
-        attachment['rdf_type'] = ""
+      attachment['rdf_type'] = attachment_rdf_type(attachment['source_identifier'], attachment['file_identifier'])
     
     return attachment
 
@@ -118,12 +100,12 @@ class CreateSheet:
     """Creates an attachment row from a given work row
 
     Args:
-      work (dict): The work row to create the attachment row from as a dictionary.
+      work (Row): The work row to create the attachment row from.
       verbose (bool, optional): Option to print out extra debug information. Defaults to False
       av (int, optional): Represents how to handle audio visual works. None for not av, 1 for first attachment of av, 2 for transcript attachment for av. Defaults to None
     
     Returns:
-      dict: A dictionary representation of the attachment row
+      Row: The attachment row, sharing the work row's columns
     """
     if work['model'].lower() == 'image':                # Special case for images
       title = f"Image for {work['source_identifier']}"
@@ -134,32 +116,16 @@ class CreateSheet:
     
     # Ensures that file identifier only has one dot
     if work['file_identifier'].count('.') >= 2:
-      print(f"File identifier, {work["file_identifier"]} , for work {work['source_identifier']} has 2 or more periods, may cause errors")
+      print(f"File identifier, {work['file_identifier']} , for work {work['source_identifier']} has 2 or more periods, may cause errors")
       # may want to exit here, leaving it to just print error for now
 
-    # Finds the correct RDF type from the file identifier
-    if work['model'].lower() == 'pdf':
-      rdf = self.RDF_TYPE_MAP['PDF']
-    elif "_i." in work['file_identifier']:
-      rdf = self.RDF_TYPE_MAP['Intermediate'] 
-    elif "_p." in work['file_identifier']:
-      rdf = self.RDF_TYPE_MAP['Preservation']
-    elif "_transcript." in work['file_identifier']:
-      rdf = self.RDF_TYPE_MAP['Transcript']
-    elif "_ocr." in work['file_identifier']:
-      rdf = self.RDF_TYPE_MAP['OCR']
-    elif "_hocr." in work['file_identifier']:
-      rdf = self.RDF_TYPE_MAP['HOCR']
-    elif ".jpg" in work['file_identifier'] or ".mp3" in work['file_identifier'] or ".jp2" in work["file_identifier"]:
-      rdf = self.RDF_TYPE_MAP['Access']
-    else:
-      rdf = "" # default rdf type is currently nothing
-    
     # Special case for the second attachment from a single av work, which should always be a transcript
+    # Otherwise finds the correct RDF type from the file identifier
     if av == 2:
-      rdf = self.RDF_TYPE_MAP['Transcript']
+      rdf = TRANSCRIPT
       source_id = work['source_identifier'] + '_transcript_attachment'
     else:
+      rdf = work_rdf_type(work['model'], work['file_identifier'])
       source_id = work['source_identifier'] + '_attachment'
 
     # checks if the title is in the list of restricted titles and sets visibility accordingly, default is open
@@ -168,44 +134,42 @@ class CreateSheet:
     if title in self.RESTRICTED_TITLES:
       vis = self.VISIBILITY_TYPE_MAP[1]
 
-    # Builds the final attachment row dictionary
-    attachment = {
-      'source_identifier': source_id,
-      'primary_identifier': source_id,
-      'title': title,
-      'model': 'Attachment',
-      'parents': work['source_identifier'],
-      'visibility': vis,
-      'rdf_type': rdf,
-      'has_work_type': work['has_work_type']
-    }
+    # Builds the final attachment row, every other column is left empty
+    attachment = Row.blank(work.index, len(work.values))
+    attachment['source_identifier'] = source_id
+    attachment['primary_identifier'] = source_id
+    attachment['title'] = title
+    attachment['model'] = 'Attachment'
+    attachment['parents'] = work['source_identifier']
+    attachment['visibility'] = vis
+    attachment['rdf_type'] = rdf
+    attachment['has_work_type'] = work['has_work_type']
     return attachment
 
   def create_fileset_row(self, attachment, work, verbose, av=None):
     """Creates and returns a fileset row with all of the data filled in, most of the data is copied from the attachment
 
     Args:
-        attachment (dict): The attachment row to build this fileset from
-        work (dict): The associated work row for getting the source_identifier and file_identifier
+        attachment (Row): The attachment row to build this fileset from
+        work (Row): The associated work row for getting the source_identifier and file_identifier
         verbose (bool): Option to print out extra debug information
         av (int, optional): Option for specifying audio visual row, 2 will add _transcript before the file extension. Defaults to None.
 
     Returns:
-        dict: The finished fileset row with all correct metadata filled in
+        Row: The finished fileset row with all correct metadata filled in
     """
-    # Builds the final fileset row dictionary
-    fileset = {
-      'source_identifier': work['source_identifier'] + '_fileset',
-      'primary_identifier': work['source_identifier'] + '_fileset',
-      'title': attachment['title'],
-      'model': 'FileSet',
-      'parents': attachment['source_identifier'],
-      'visibility': attachment.get('visibility', 'open'),
-      'sequence': attachment.get('sequence', ''),
-      'rdf_type': attachment['rdf_type'],
-      'has_work_type': attachment['has_work_type'],
-      'remote_files': f"http://hykuimports.lib.utk.edu/files/hyku-import/{work['file_identifier'] if not (av==2) else self.append_transcript(work['file_identifier'])}"
-    }
+    # Builds the final fileset row, every other column is left empty
+    fileset = Row.blank(work.index, len(work.values))
+    fileset['source_identifier'] = work['source_identifier'] + '_fileset'
+    fileset['primary_identifier'] = work['source_identifier'] + '_fileset'
+    fileset['title'] = attachment['title']
+    fileset['model'] = 'FileSet'
+    fileset['parents'] = attachment['source_identifier']
+    fileset['visibility'] = attachment.get('visibility', 'open')
+    fileset['sequence'] = attachment.get('sequence', '')
+    fileset['rdf_type'] = attachment['rdf_type']
+    fileset['has_work_type'] = attachment['has_work_type']
+    fileset['remote_files'] = f"{self.REMOTE_FILES_URL}{work['file_identifier'] if not (av==2) else self.append_transcript(work['file_identifier'])}"
     return fileset
 
   def append_transcript(self, file_id):
@@ -226,36 +190,90 @@ class CreateSheet:
 
   def remove_file_identifier_column(self, row):
     """Helper function to remove the file_identifier column from a row dictionary.
+    Rows are no longer dictionaries inside ingest_main, which leaves file_identifier out by only writing the other columns, this is kept for existing callers.
 
     Args:
-        row (dict): The row you want to remove the column from.
+        row (dict or Row): The row you want to remove the column from, a Row is turned into a dictionary first.
 
     Returns:
         dict: The row dictionary with the file_identifier column removed.
     """
+    if isinstance(row, Row):
+      row = row.to_dict()
     if 'file_identifier' in row:
       del row['file_identifier']
     return row
 
-  def add_title_to_book_page(self, attachment, reader, verbose=False):
+  def build_parent_title_index(self, input_file):
+    """Reads the input file once and maps each source_identifier to its title, used for titling book page attachments.
+    Only the first row for a given source_identifier is kept, so lookups match what a top to bottom search of the file would find.
+
+    Args:
+        input_file (str): The filename of the input file.
+
+    Returns:
+        dict: A dictionary of source_identifier to title for every row in the input file.
+    """
+    parent_titles = {}
+    with open_sheet(input_file, mode='r', encoding='utf-8-sig') as infile:
+      reader = csv.reader(infile)
+      header = next(reader)
+      index = build_index(header)
+      source_identifier_position = index['source_identifier']
+      title_position = index['title']
+      width = max(source_identifier_position, title_position) + 1
+      for values in reader:
+        if not values: # blank lines are skipped, same as the main loop
+          continue
+        pad_values(values, width)
+        parent_titles.setdefault(values[source_identifier_position], values[title_position])
+    return parent_titles
+
+  def build_work_digests(self, input_file, index, width, salt):
+    """Reads the input file once and hashes the input rows of each work, a work's rows being the work row and the attachment rows whose parents is that work.
+
+    Args:
+        input_file (str): The filename of the input file.
+        index (dict): The column name to position index for the sheet.
+        width (int): The number of columns, including any that were added to the header.
+        salt (bytes): The starting hash for every work, from WorkCache.salt.
+
+    Returns:
+        dict: The work key from work_key to a list of the work's hash and its number of input rows.
+    """
+    from .work_cache import WorkCache
+    positions = (index['model'], index['source_identifier'], index['parents'])
+    work_digests = {}
+    with open_sheet(input_file, mode='r', encoding='utf-8-sig') as infile:
+      reader = csv.reader(infile)
+      next(reader)
+      for values in read_values(reader, width):
+        key = work_key(values, *positions)
+        if key is None:
+          continue
+        digest = work_digests.get(key)
+        if digest is None:
+          work_digests[key] = [WorkCache.add_row(salt, values), 1]
+        else:
+          digest[0] = WorkCache.add_row(digest[0], values)
+          digest[1] += 1
+    return work_digests
+
+  def add_title_to_book_page(self, attachment, parent_titles, verbose=False):
     """Sets the title field for book page attachments. Uses the parent's title and sequence to build correct page title. Also sets the correct rdf_type.
 
     Args:
-        attachment (dict): The book page attachment row to make edits to.
-        reader (DictReader): A file reader for the infile to use for finding this attachment's parent.
+        attachment (Row): The book page attachment row to make edits to.
+        parent_titles (dict): Index of source_identifier to title built by build_parent_title_index, used for finding this attachment's parent.
         verbose (bool, optional): Option to print out extra debug information. Defaults to False.
 
     Returns:
-        dict: The attachment row with the title and rdf_type fields set correctly.
+        Row: The attachment row with the title and rdf_type fields set correctly.
     """
 
     if attachment['title'] != "": 
       return attachment
-    parent_title = None
-    for row in reader:
-      if row['source_identifier'] == attachment['parents']:
-        parent_title = row['title']
-        break
+    parent_title = parent_titles.get(attachment['parents'])
 
     if parent_title:
       page_number = attachment['sequence']
@@ -269,26 +287,235 @@ class CreateSheet:
       # may want to exit here, leaving it to just print error for now
 
     # Adding the rdf type to the row
-    if "_hocr." in attachment['source_identifier']:
-      attachment['rdf_type'] = self.RDF_TYPE_MAP['HOCR']
-    elif "_ocr." in attachment['source_identifier']:
-      attachment['rdf_type'] = self.RDF_TYPE_MAP['OCR']
-    elif "_i." in attachment['file_identifier']:
-      attachment['rdf_type'] = self.RDF_TYPE_MAP['Intermediate'] 
-    elif "_p." in attachment['file_identifier']:
-      attachment['rdf_type'] = self.RDF_TYPE_MAP['Preservation']
-    elif "_transcript." in attachment['file_identifier']:
-      attachment['rdf_type'] = self.RDF_TYPE_MAP['Transcript']
-    elif ".jpg" in attachment['file_identifier'] or ".mp3" in attachment['file_identifier'] or ".jp2" in attachment["file_identifier"]:
-      attachment['rdf_type'] = self.RDF_TYPE_MAP['Access']
-    else:
-      attachment['rdf_type'] = ""
+    attachment['rdf_type'] = attachment_rdf_type(attachment['source_identifier'], attachment['file_identifier'])
 
     return attachment
 
-  def ingest_main(self, input_file, output_file, attachments_given, verbose, audio_visual):
+  def process_row(self, row, attachments_given, verbose, audio_visual, parent_titles):
+    """Processes a single row of the input sheet and returns every row that should be written to the outfile for it, in order.
+    Rows are independent of each other, so this can be run for many rows at once across worker processes.
+
+    Args:
+        row (Row): The input row to process.
+        attachments_given (bool): Option for if attachment rows should be expected in the input file
+        verbose (bool): Option to print out extra debug information.
+        audio_visual (bool): Option for if this file contains all audio visual works.
+        parent_titles (dict): Index of source_identifier to title from build_parent_title_index, only used when attachments are given.
+
+    Raises:
+        IngestError: If the row cannot be processed with the given options.
+
+    Returns:
+        list: The output rows, still including the file_identifier column which is left out when they are written.
+    """
+    if row['model'] == "Attachment":
+      if attachments_given:
+        if audio_visual: # attachments given for audio visual not currently supported, shouldn't be hard to add if needed
+          raise IngestError("Attachments given for audio visual works. Unexpected, exiting.")
+        attachment = self.verify_attachment_row(row, verbose)
+        # Adds title and rdf type for book page attachment rows, parents are looked up in the index built before the main loop
+        attachment = self.add_title_to_book_page(attachment, parent_titles, verbose)
+        fileset = self.create_fileset_row(attachment, row, verbose)
+        return [attachment, fileset]
+      else:
+        raise IngestError("Attachments given but not specified, please use the -a flag if attachments are in the input file")
+    elif row['model'] == "FileSet":
+      # Currently does nothing to the row if it is a fileset row
+      if verbose:
+        print("FileSet row read, skipping row")
+      return []
+    elif row['model'] == "Collection":
+      # Currently does nothing to the row if it is a collection row
+      if verbose: 
+        print("Collection row read, skipping row")
+      return []
+    else: # We can assume this row must be for a work
+      work = self.verify_work_row(row, verbose)
+      if row['model'] == 'Book' or row['model'] == 'CompoundObject':
+        if not attachments_given:
+          raise IngestError("Attachments given not specified, book/compound detected. Use the -a flag if attachments are in the input file.")
+      if audio_visual: # this is the special case of audio visual works
+        if attachments_given: # attachments given for audio visual not currently supported, shouldn't be hard to add if needed
+          raise IngestError("Unsure if this will ever happen, erroring for now if it does")
+        # Creates the 2 self.attachments and 2 filesets needed for each av work
+        attachment_1 =  self.create_attachment_row(work, verbose, 1)
+        attachment_2 =  self.create_attachment_row(work, verbose, 2)
+        fileset_1 =     self.create_fileset_row(attachment_1, work, verbose)
+        fileset_2 =     self.create_fileset_row(attachment_2, work, verbose)
+        # 5 lines for the outfile, the work, both attachments, and both filesets
+        return [work, attachment_1, attachment_2, fileset_1, fileset_2]
+      if not attachments_given: # will create attachment and fileset rows, and return them with the modified work row
+        attachment = self.create_attachment_row(work, verbose)
+        fileset = self.create_fileset_row(attachment, work, verbose)
+        return [work, attachment, fileset]
+      else: # Since attachments are given here, just return the work row
+        return [work]
+
+  # The columns every input sheet must have
+  REQUIRED_FIELDNAMES = ['source_identifier','model','visibility','remote_files','parents','file_identifier','title','sequence','abstract']
+  # These columns headers will be added if they do not already exist, although they should always exist, mostly here for debugging
+  ADDITIONAL_FIELDNAMES = ['source_identifier', 'primary_identifier', 'title', 'model', 'parents', 'abstract', 'sequence', 'visibility', 'rdf_type', 'remote_files', 'has_work_type']
+
+  @classmethod
+  def added_columns(cls, fieldnames):
+    """Returns the columns prepare_columns adds to a header, in the order they are added."""
+    return [field for field in cls.ADDITIONAL_FIELDNAMES if field not in fieldnames]
+
+  def prepare_columns(self, fieldnames, verbose=False):
+    """Checks that the input columns include every required column, and adds the columns the output needs that are missing.
+
+    Args:
+        fieldnames (list): The input columns, added columns are appended to it.
+        verbose (bool, optional): Option to print out extra debug information. Defaults to False.
+
+    Raises:
+        IngestError: If a required column is missing.
+
+    Returns:
+        list: The output columns, which are the input and added columns without file_identifier.
+    """
+    for field in self.REQUIRED_FIELDNAMES: # these should be the fieldnames required on the input file
+      if field not in fieldnames:
+        raise IngestError(f"Required column {field} not found, exiting")
+    # reads all columns names and adds the ones that do not exist
+    for field in self.added_columns(fieldnames):
+      if verbose:
+        print(field + " column not provided, adding it")
+      fieldnames.append(field)
+    return [field for field in fieldnames if field != 'file_identifier']
+
+  def generate_values(self, rows, index, output_columns, attachments_given, verbose, audio_visual, parent_titles=None, row_done=None):
+    """Generates the values of the output rows for each input row, one input row at a time, so memory use does not grow with the number of rows.
+    When attachments are given without a parent_titles index, titles are collected from the rows as they go by instead.
+    A book page that comes before its parent is then held back and generated right after its parent, or at the end if its parent never comes.
+
+    Args:
+        rows (iterable): The values of each input row, padded to the width of the index.
+        index (dict): The column name to position index shared by the rows.
+        output_columns (itemgetter): Picks the values of the output columns out of a row's values.
+        attachments_given (bool): Option for if attachment rows should be expected in the input file
+        verbose (bool): Option to print out extra debug information.
+        audio_visual (bool): Option for if this file contains all audio visual works.
+        parent_titles (dict, optional): Index of source_identifier to title from build_parent_title_index. Defaults to None.
+        row_done (callable, optional): Called after the output rows of each input row have been taken. Defaults to None.
+
+    Raises:
+        IngestError: If a row cannot be processed with the given options.
+
+    Yields:
+        tuple: The values of each output row.
+    """
+    collect_titles = attachments_given and parent_titles is None
+    if collect_titles:
+      parent_titles = {}
+      waiting = {} # parent source_identifier to the book pages waiting for its title
+      model_position = index['model']
+      source_identifier_position = index['source_identifier']
+      title_position = index['title']
+      parents_position = index['parents']
+    for values in rows:
+      if collect_titles:
+        source_identifier = values[source_identifier_position]
+        parent_titles.setdefault(source_identifier, values[title_position])
+        if values[model_position] == "Attachment" and values[title_position] == "" and values[parents_position] not in parent_titles:
+          waiting.setdefault(values[parents_position], []).append(values)
+          continue
+      for output_row in self.process_row(Row(index, values), attachments_given, verbose, audio_visual, parent_titles):
+        yield output_columns(output_row.values)
+      if collect_titles and source_identifier in waiting:
+        for page in waiting.pop(source_identifier):
+          for output_row in self.process_row(Row(index, page), attachments_given, verbose, audio_visual, parent_titles):
+            yield output_columns(output_row.values)
+      if row_done:
+        row_done()
+    if collect_titles:
+      for pages in waiting.values():
+        for page in pages:
+          for output_row in self.process_row(Row(index, page), attachments_given, verbose, audio_visual, parent_titles):
+            yield output_columns(output_row.values)
+
+  def stream_rows(self, rows, attachments_given=False, verbose=False, audio_visual=False, fieldnames=None, parent_titles=None):
+    """Generates the output rows for input rows given as dicts, without reading or writing any files, for use as a library.
+    Output rows are generated as they are asked for, so rows can be streamed from a database cursor or an upload straight into the output.
+
+    Args:
+        rows (iterable): The input rows as dicts of column name to value, for example from csv.DictReader.
+        attachments_given (bool, optional): Option for if attachment rows should be expected in the input rows. Defaults to False.
+        verbose (bool, optional): Option to print out extra debug information. Defaults to False.
+        audio_visual (bool, optional): Option for if the input rows are all audio visual works. Defaults to False.
+        fieldnames (list, optional): The input columns, taken from the keys of the first row if not given. Defaults to None.
+        parent_titles (dict, optional): Index of source_identifier to title for book pages, collected from the rows as they go by if not given,
+            see generate_values. Defaults to None.
+
+    Raises:
+        IngestError: If a required column is missing or a row cannot be processed with the given options.
+
+    Yields:
+        dict: Each output row, with the output columns in order and file_identifier left out.
+    """
+    rows = iter(rows)
+    if fieldnames is None:
+      first = next(rows, None)
+      if first is None:
+        return
+      fieldnames = list(first)
+      rows = chain([first], rows)
+    fieldnames = list(fieldnames)
+    output_fieldnames = self.prepare_columns(fieldnames, verbose)
+    index = build_index(fieldnames)
+    output_columns = itemgetter(*[index[field] for field in output_fieldnames])
+    # columns missing from a row are None, the same as the padding of short rows in a sheet
+    values = ([row.get(field) for field in fieldnames] for row in rows)
+    for output_values in self.generate_values(values, index, output_columns, attachments_given, verbose, audio_visual, parent_titles):
+      yield dict(zip(output_fieldnames, output_values))
+
+  def process_batch(self, batch, index, output_columns, attachments_given, verbose, audio_visual, parent_titles):
+    """Runs process_row on every row of a batch, stopping at the first row that cannot be processed.
+
+    Args:
+        batch (list): The values of the input rows to process, in input order.
+        index (dict): The column name to position index shared by the rows.
+        output_columns (itemgetter): Picks the values of the output columns out of a row's values.
+        attachments_given (bool): Option for if attachment rows should be expected in the input file
+        verbose (bool): Option to print out extra debug information.
+        audio_visual (bool): Option for if this file contains all audio visual works.
+        parent_titles (dict): Index of source_identifier to title from build_parent_title_index.
+
+    Returns:
+        tuple: The values of the output rows for the batch in order, and the error message of the row that stopped the batch or None.
+    """
+    output_rows = []
+    for values in batch:
+      try:
+        for output_row in self.process_row(Row(index, values), attachments_given, verbose, audio_visual, parent_titles):
+          output_rows.append(output_columns(output_row.values))
+      except IngestError as e:
+        return output_rows, str(e)
+    return output_rows, None
+
+  # The methods timed as their own stages when a run is profiled
+  PROFILED_METHODS = [
+    'build_parent_title_index',
+    'process_row',
+    'verify_work_row',
+    'verify_attachment_row',
+    'create_attachment_row',
+    'create_fileset_row',
+    'add_title_to_book_page',
+  ]
+
+  # Number of input rows between checkpoints when resuming without choosing how often to checkpoint
+  DEFAULT_CHECKPOINT_EVERY = 10000
+  # Output rows are collected and written a block at a time through a larger than default file buffer
+  DEFAULT_WRITE_BLOCK = 4096
+  DEFAULT_WRITE_BUFFER = 1024 * 1024
+
+  def ingest_main(self, input_file, output_file, attachments_given, verbose, audio_visual, workers=1, batch_size=1000, profile=None, checkpoint_every=None, resume=False, cache_file=None, delta=False, cache_max_entries=500000,
+                  write_block=DEFAULT_WRITE_BLOCK, write_buffer=DEFAULT_WRITE_BUFFER, check_ids=False, id_spill_file=None, parquet_file=None,
+                  parquet_row_group=ParquetSheetWriter.DEFAULT_ROW_GROUP_ROWS, mirror_dir=None, mirror_manifest=None, mirror_workers=16):
     """The main function that is called from the create_sheet driver function, these parameters match the command line arguments for create_sheet.
     This function is what will do all of the processing of the data and writing to the outfiles. 
+    The input and output files are read and written gzip or zstd compressed if their filenames end with .gz or .zst, see open_sheet.
 
     Args:
         input_file (srt): The filename of the input file.
@@ -296,111 +523,374 @@ class CreateSheet:
         attachments_given (bool): Option for if attachment rows should be expected in the input file
         verbose (bool): Option to print out extra debug information.
         audio_visual (bool): Option for if this file contains all audio visual works. 
+        workers (int, optional): Number of worker processes to expand rows with, 1 processes everything in this process. Defaults to 1.
+        batch_size (int, optional): Number of input rows sent to a worker process at a time when workers is more than 1. Defaults to 1000.
+        profile (Profile, optional): Collects stage timings and counters for the run, nothing is collected if not given. Defaults to None.
+        checkpoint_every (int, optional): Number of input rows between checkpoints written next to the output file, no checkpoints are written if not given. Defaults to None.
+        resume (bool, optional): Option to continue from the checkpoint of an earlier run that did not finish, instead of starting over. Defaults to False.
+        cache_file (str, optional): The filename of a work cache, the output rows of works whose input rows are unchanged since an earlier run are copied from it instead of generated again. Defaults to None.
+        delta (bool, optional): Option to only write the rows of works that are new or changed since they were cached, needs cache_file. Defaults to False.
+        cache_max_entries (int, optional): The most works to keep in the work cache. Defaults to 500000.
+        write_block (int, optional): Number of output rows to collect before writing them, 1 writes every row as it is generated. Defaults to 4096.
+        write_buffer (int, optional): Size in bytes of the output file buffer, -1 uses the system default. Defaults to 1 MiB.
+        check_ids (bool, optional): Option to check as the output is written that every source_identifier in it is unique, generated ones included,
+            and that every attachment and fileset's parents is in it. Problems are printed at the end and the run exits with an error. Defaults to False.
+        id_spill_file (str, optional): The filename of an SQLite file the identifier check can move its index into for very large sheets. Defaults to None.
+        parquet_file (str, optional): The filename of a Parquet file to write the output rows to as well, see ParquetSheetWriter. Needs pyarrow. Defaults to None.
+        parquet_row_group (int, optional): Number of rows in each row group of the Parquet file. Defaults to 65536.
+        mirror_dir (str, optional): A local mirror of the directory the import server serves remote_files from. Once the output is written,
+            the file of every remote_files in it is checked to exist in the mirror and not be empty, see MirrorCheck. Problems are written to mirror_manifest
+            and the run exits with an error. Defaults to None.
+        mirror_manifest (str, optional): The filename of the CSV manifest of missing and empty files, the output file followed by .missing.csv if not given. Defaults to None.
+        mirror_workers (int, optional): Number of threads checking files in the mirror. Defaults to 16.
     """
-    with open(input_file, mode='r', encoding='utf-8-sig') as infile, open(output_file, mode='w', newline='', encoding='utf-8') as outfile:
-      reader = csv.DictReader(infile)
+    profile = profile or NullProfile()
+    if delta and not cache_file:
+      print("A delta sheet needs a work cache to compare against. Exiting.")
+      exit(1)
+    if cache_file and (workers > 1 or checkpoint_every or resume):
+      print("The work cache cannot be used with workers or checkpoints. Exiting.")
+      exit(1)
+    if check_ids and resume:
+      print("Identifiers cannot be checked when resuming, the rows written before the checkpoint are not indexed. Exiting.")
+      exit(1)
+    if mirror_dir and resume:
+      print("Files cannot be checked against the mirror when resuming, the rows written before the checkpoint are not noted. Exiting.")
+      exit(1)
+    if mirror_dir and not os.path.isdir(mirror_dir):
+      print(f"Mirror directory {mirror_dir} not found. Exiting.")
+      exit(1)
+    if (checkpoint_every or resume) and (is_compressed(input_file) or is_compressed(output_file)):
+      print("Checkpoints need an uncompressed input and output file, a compressed file cannot be resumed part way through. Exiting.")
+      exit(1)
+    for filename in (input_file, output_file):
+      problem = compression_problem(filename)
+      if problem:
+        print(f"{problem}. Exiting.")
+        exit(1)
+    if parquet_file:
+      if checkpoint_every or resume:
+        print("A Parquet file cannot be written with checkpoints, it cannot be resumed part way through. Exiting.")
+        exit(1)
+      if parquet_problem():
+        print(f"{parquet_problem()}. Exiting.")
+        exit(1)
+    options = {'attachments_given': attachments_given, 'audio_visual': audio_visual}
+    state = None
+    checkpoint_file = None
+    if checkpoint_every or resume:
+      from .checkpoint import Checkpoint
+      checkpoint_file = Checkpoint.checkpoint_file_for(output_file)
+    if resume:
+      state, problem = Checkpoint.load(checkpoint_file, input_file, options)
+      if problem:
+        print(f"{problem}, cannot resume. Exiting.")
+        exit(1)
+      if not os.path.exists(output_file) or os.path.getsize(output_file) < state['output_offset']:
+        print(f"Output file {output_file} is shorter than the checkpoint, cannot resume. Exiting.")
+        exit(1)
+      checkpoint_every = checkpoint_every or self.DEFAULT_CHECKPOINT_EVERY
+    elif checkpoint_every and os.path.exists(checkpoint_file):
+      os.remove(checkpoint_file) # left over from an earlier run of this output file, which is about to be overwritten
+
+    with open_sheet(input_file, mode='r', encoding='utf-8-sig') as infile, open_sheet(output_file, mode='r+' if state else 'w', buffering=write_buffer, newline='', encoding='utf-8') as outfile, \
+        profile.timed_methods(self, self.PROFILED_METHODS):
+      # iterating over a file directly stops its position from being told, which checkpoints need, so read it by line instead
+      reader = csv.reader(iter(infile.readline, '') if checkpoint_every else infile)
       if verbose:
         print("Opening " + input_file + " as input file and " + output_file + " as output file")
         if attachments_given:
           print("Attachments given, only creating FileSet rows")
       # Check if the input file is empty
-      if not reader.fieldnames:
+      fieldnames = next(reader, None)
+      if not fieldnames:
         print("Input file is empty. Exiting.")
         exit(1)
-      fieldnames = reader.fieldnames
-      required_fieldnames = ['source_identifier','model','visibility','remote_files','parents','file_identifier','title','sequence','abstract']
-      for field in required_fieldnames: # these should be the fieldnames required on the input file
-        if field not in reader.fieldnames:
-          print(f"Required column {field} not found, exiting")
-          exit(1)
-      # These columns headers will be added if they do not already exist, although they should always exist, mostly here for debugging
-      additional_fieldnames = ['source_identifier', 'primary_identifier', 'title', 'model', 'parents', 'abstract', 'sequence', 'visibility', 'rdf_type', 'remote_files', 'has_work_type']
-      # reads all columns names and adds the ones that do not exist
-      for field in additional_fieldnames:
-        if field not in fieldnames:
-          if verbose:
-            print(field + " column not provided, adding it")
-          fieldnames.append(field)
-      # Create a copy of fieldnames for the writer and remove 'file_identifier' from it, TODO: this is not efficient and could be cleaned up
-      fieldnames_for_writer = fieldnames.copy()
-      if 'file_identifier' in fieldnames_for_writer:
-        fieldnames_for_writer.remove('file_identifier')
-
-      writer = csv.DictWriter(outfile, fieldnames=fieldnames_for_writer)
-      writer.writeheader()
+      try:
+        fieldnames_for_writer = self.prepare_columns(fieldnames, verbose)
+      except IngestError as e:
+        print(e)
+        exit(1)
+      # Every row shares one column index, and 'file_identifier' is dropped from the output by only writing the other columns
+      index = build_index(fieldnames)
+      output_columns = itemgetter(*[index[field] for field in fieldnames_for_writer])
+
+      writer = profile.writer(csv.writer(outfile))
+      block_writer = None
+      if write_block > 1:
+        writer = block_writer = BlockWriter(writer, write_block)
+      if state:
+        # picks up just after the last checkpointed row, and drops anything written for rows after it
+        if verbose:
+          print(f"Resuming after row {state['rows_processed']} from checkpoint {checkpoint_file}")
+        infile.seek(state['input_offset'])
+        outfile.seek(state['output_offset'])
+        outfile.truncate()
+      else:
+        writer.writerow(fieldnames_for_writer)
+      parquet_writer = None
+      if parquet_file:
+        # the header is only written to the CSV, it is the Parquet schema
+        writer = parquet_writer = ParquetSheetWriter(parquet_file, fieldnames_for_writer, writer, parquet_row_group)
+        parquet_writer.write_row_group = profile.timed('write parquet', parquet_writer.write_row_group)
+      checkpoint = None
+      if checkpoint_every:
+        checkpoint = Checkpoint(checkpoint_file, input_file, infile, outfile, checkpoint_every, options, state, block_writer)
+      id_index = None
+      if check_ids:
+        # every output row is added to the index as it is written, so checking needs no extra pass
+        from ..identifier_index import IdentifierIndex, CheckedWriter
+        id_index = IdentifierIndex(id_spill_file)
+        writer = CheckedWriter(writer, id_index, fieldnames_for_writer)
+      mirror_check = None
+      if mirror_dir:
+        # the files are noted as the rows are written and all checked at once at the end, so each directory is only listed once
+        from ..mirror_check import MirrorCheck, MirrorCheckedWriter
+        mirror_check = MirrorCheck(mirror_dir, self.REMOTE_FILES_URL, mirror_workers)
+        writer = MirrorCheckedWriter(writer, mirror_check, fieldnames_for_writer)
+
+      # Book page attachments need their parent's title, which may come before or after them in the file,
+      # so one extra pass over the input builds a source_identifier to title index shared by every attachment row
+      parent_titles = {}
+      if attachments_given:
+        if verbose:
+          print("Indexing parent titles for attachment rows")
+        parent_titles = self.build_parent_title_index(input_file)
+        profile.count('bytes read', os.path.getsize(input_file))
       
-      # Main for loop that reads every row in the infile and processes it
-      for row in reader:
-        if row['model'] == "Attachment":
-          if attachments_given:
-            if audio_visual: # attachments given for audio visual not currently supported, shouldn't be hard to add if needed
-              print("Attachments given for audio visual works. Unexpected, exiting.")
-              exit(1) 
-            attachment = self.verify_attachment_row(row, verbose)
-            # Adds title and rdf type for book page attachment rows, TODO: make this not so poorly written later
-            # makes a new file reader every time we need to do this, this is bad
-            with open(input_file, mode='r', encoding='utf-8-sig') as new_infile:
-              new_reader = csv.DictReader(new_infile)
-              attachment = self.add_title_to_book_page(attachment, new_reader, verbose)
-            fileset = self.create_fileset_row(attachment, row, verbose)
-            
-            # Removes 'file_identifier' from rows before writing to the CSV outfile
-            attachment =  self.remove_file_identifier_column(attachment)
-            fileset =     self.remove_file_identifier_column(fileset)
-            writer.writerow(attachment)
-            writer.writerow(fileset)
-          else:
-            print("Attachments given but not specified, please use the -a flag if attachments are in the input file")
-            exit(1)
-        elif row['model'] == "FileSet":
-          # Currently does nothing to the row if it is a fileset row
+      # Main loop that reads every row in the infile, processes it, and writes the resulting rows
+      # The output is the same in both cases, workers only change where the rows are expanded
+      rows = profile.rows(read_values(reader, len(fieldnames)), model_position=index['model'])
+      finished = False
+      cache = None
+      try:
+        if cache_file:
+          # one more pass hashes the input rows of every work, so a work can be looked up before all of its rows are read
           if verbose:
-            print("FileSet row read, skipping row")
-        elif row['model'] == "Collection":
-          # Currently does nothing to the row if it is a collection row
-          if verbose: 
-            print("Collection row read, skipping row")
-        else: # We can assume this row must be for a work
-          work = self.verify_work_row(row, verbose)
-          if row['model'] == 'Book' or row['model'] == 'CompoundObject':
-            if not attachments_given:
-              print("Attachments given not specified, book/compound detected. Use the -a flag if attachments are in the input file.")
-              exit(1) 
-          if audio_visual: # this is the special case of audio visual works
-            if attachments_given: # attachments given for audio visual not currently supported, shouldn't be hard to add if needed
-              print("Unsure if this will ever happen, erroring for now if it does")
-              exit(1)
-            # Creates the 2 self.attachments and 2 filesets needed for each av work
-            attachment_1 =  self.create_attachment_row(work, verbose, 1)
-            attachment_2 =  self.create_attachment_row(work, verbose, 2)
-            fileset_1 =     self.create_fileset_row(attachment_1, work, verbose)
-            fileset_2 =     self.create_fileset_row(attachment_2, work, verbose)
-            # Removes the file id column from everything related to this work
-            work =          self.remove_file_identifier_column(work)
-            attachment_1 =  self.remove_file_identifier_column(attachment_1)
-            attachment_2 =  self.remove_file_identifier_column(attachment_2)
-            fileset_1 =     self.remove_file_identifier_column(fileset_1)
-            fileset_2 =     self.remove_file_identifier_column(fileset_2)
-            # Writes 5 lines to outfile, the work, both attachments, and both filesets
-            writer.writerow(work)
-            writer.writerow(attachment_1)
-            writer.writerow(attachment_2)
-            writer.writerow(fileset_1)
-            writer.writerow(fileset_2)
-            # goes to the next row in the infile
-            continue
-          if not attachments_given: # will create and write attachment and fileset rows, and write modified work row
-            attachment = self.create_attachment_row(work, verbose)
-            fileset = self.create_fileset_row(attachment, work, verbose)
-            # Remove 'file_identifier' from rows before writing to the CSV outfile
-            work =        self.remove_file_identifier_column(work)
-            attachment =  self.remove_file_identifier_column(attachment)
-            fileset =     self.remove_file_identifier_column(fileset)
-            # Writing to the outfile
-            writer.writerow(work)
-            writer.writerow(attachment)
-            writer.writerow(fileset)
-          else: # Since attachments are given here, just remove file id and write work row
-            work = self.remove_file_identifier_column(work)
-            writer.writerow(work)
-            continue
+            print("Hashing works for the work cache " + cache_file)
+          with profile.stage('hashing works'):
+            from .work_cache import WorkCache
+            work_digests = self.build_work_digests(input_file, index, len(fieldnames), WorkCache.salt(fieldnames, attachments_given, audio_visual))
+          profile.count('bytes read', os.path.getsize(input_file))
+          cache = WorkCache(cache_file, cache_max_entries)
+          self.write_rows_cached(rows, writer, index, output_columns, attachments_given, verbose, audio_visual, parent_titles, cache, work_digests, delta, profile)
+          if verbose:
+            print(f"{cache.hits} works copied from the work cache, {cache.misses} works generated")
+        elif workers > 1:
+          self.write_rows_parallel(rows, writer, index, output_columns, attachments_given, verbose, audio_visual, parent_titles, workers, batch_size, profile, checkpoint)
+        else:
+          for output_values in self.generate_values(rows, index, output_columns, attachments_given, verbose, audio_visual, parent_titles,
+                                                    checkpoint.row_done if checkpoint else None):
+            writer.writerow(output_values)
+        finished = True
+      except IngestError as e:
+        print(e)
+        exit(1)
+      finally:
+        # rows generated before an error are still written, as they would be without the block writer
+        if block_writer:
+          block_writer.flush()
+        if parquet_writer:
+          parquet_writer.close()
+        if checkpoint:
+          checkpoint.close(finished)
+        if cache:
+          cache.close()
+        if id_index:
+          id_problems = id_index.finish()
+      profile.count('bytes read', os.path.getsize(input_file))
+    profile.count('bytes written', os.path.getsize(output_file))
+
+    mirror_problems = []
+    if mirror_check:
+      mirror_manifest = mirror_manifest or output_file + '.missing.csv'
+      if verbose:
+        print(f"Checking remote_files against the mirror in {mirror_dir}")
+      with profile.stage('checking mirror'):
+        mirror_problems = mirror_check.check(profile)
+      mirror_check.write_manifest(mirror_manifest, mirror_problems)
+      if verbose:
+        for row, source_identifier, remote_files, path, problem in mirror_problems:
+          print(f"Row {row}: {path} for {source_identifier} is {problem}")
+      if mirror_problems:
+        print(f"{len(mirror_problems)} files missing or empty in {mirror_dir}, listed in {mirror_manifest}")
+      elif verbose:
+        print(f"Every file found in {mirror_dir}")
+
+    if id_index:
+      for problem in id_problems:
+        print(problem)
+      if id_problems:
+        print(f"{len(id_problems)} identifier problems found in {output_file}. Exiting.")
+        exit(1)
+      if verbose:
+        print(f"No identifier problems found in {output_file}")
+    if mirror_problems:
+      exit(1)
+
+  def write_rows_cached(self, rows, writer, index, output_columns, attachments_given, verbose, audio_visual, parent_titles, cache, work_digests, delta, profile=None):
+    """Writes the output rows for each input row, copying them from the cache for works whose input rows have not changed and caching the rest.
+
+    Args:
+        rows (iterator): The values of each input row, from read_values.
+        writer (csv.writer): The writer for the output file, with the header already written.
+        index (dict): The column name to position index shared by the rows.
+        output_columns (itemgetter): Picks the values of the output columns out of a row's values.
+        attachments_given (bool): Option for if attachment rows should be expected in the input file
+        verbose (bool): Option to print out extra debug information.
+        audio_visual (bool): Option for if this file contains all audio visual works.
+        parent_titles (dict): Index of source_identifier to title from build_parent_title_index.
+        cache (WorkCache): The cache of earlier output rows.
+        work_digests (dict): The hash and number of input rows of each work, from build_work_digests.
+        delta (bool): Option to leave unchanged works out of the output entirely, so only new and changed works are written.
+        profile (Profile, optional): Counts the works found in and added to the cache. Defaults to None.
+
+    Raises:
+        IngestError: If a row cannot be processed.
+    """
+    profile = profile or NullProfile()
+    positions = (index['model'], index['source_identifier'], index['parents'])
+    rows_seen = {}      # work key to the number of its input rows read so far
+    cached_works = {}   # work key to its cached output rows, for cached works that still have rows to come
+    generated = {}      # work key to its output rows so far, for works that are not cached
+    for values in rows:
+      key = work_key(values, *positions)
+      if key is None: # FileSet and Collection rows belong to no work
+        for output_row in self.process_row(Row(index, values), attachments_given, verbose, audio_visual, parent_titles):
+          writer.writerow(output_columns(output_row.values))
+        continue
+      digest, total = work_digests[key]
+      member = rows_seen.get(key, 0)
+      rows_seen[key] = member + 1
+      last = member + 1 == total
+      if member == 0:
+        cached = cache.get(digest)
+        if cached is not None:
+          cached_works[key] = cached
+          profile.count('works from cache')
+      cached = cached_works.get(key)
+      if cached is not None:
+        if not delta:
+          writer.writerows(cached[member])
+        if last:
+          del cached_works[key]
+      else:
+        outputs = [output_columns(output_row.values) for output_row in self.process_row(Row(index, values), attachments_given, verbose, audio_visual, parent_titles)]
+        writer.writerows(outputs)
+        generated.setdefault(key, []).append(outputs)
+        if last:
+          cache.put(digest, generated.pop(key))
+          profile.count('works generated')
+      if last:
+        del rows_seen[key]
+
+  def write_rows_parallel(self, rows, writer, index, output_columns, attachments_given, verbose, audio_visual, parent_titles, workers, batch_size, profile=None, checkpoint=None):
+    """Expands the input rows in a pool of worker processes and writes the results in the original input order.
+    Rows are sent to the pool in batches, and only a few batches per worker are in flight at once so memory stays bounded.
+
+    Args:
+        rows (iterator): The values of each input row, from read_values.
+        writer (csv.writer): The writer for the output file, with the header already written.
+        index (dict): The column name to position index shared by the rows.
+        output_columns (itemgetter): Picks the values of the output columns out of a row's values.
+        attachments_given (bool): Option for if attachment rows should be expected in the input file
+        verbose (bool): Option to print out extra debug information.
+        audio_visual (bool): Option for if this file contains all audio visual works.
+        parent_titles (dict): Index of source_identifier to title from build_parent_title_index.
+        workers (int): Number of worker processes.
+        batch_size (int): Number of input rows in each batch.
+        profile (Profile, optional): Collects the time spent waiting on workers, the rows are expanded in the workers so their stages are not timed. Defaults to None.
+        checkpoint (Checkpoint, optional): Saves checkpoints at batch boundaries once the batch's rows are written. Defaults to None.
+
+    Raises:
+        IngestError: If a row cannot be processed, raised after every row before it has been written.
+    """
+    profile = profile or NullProfile()
+    max_in_flight = workers * 2
+    initargs = (index, output_columns, attachments_given, verbose, audio_visual, parent_titles)
+    rows = iter(rows)
+    read_error = None
+    from multiprocessing import Pool
+    with Pool(workers, initializer=_init_worker, initargs=initargs) as pool:
+      in_flight = deque()
+      finished = False
+      while not finished:
+        batch = []
+        try:
+          for values in rows:
+            batch.append(values)
+            if len(batch) >= batch_size:
+              break
+        except IngestError as e: # the rows read before a bad row are still processed and written first
+          read_error = e
+        finished = read_error is not None or len(batch) < batch_size
+        if batch:
+          # the input position after a bad row is not a safe place to resume from, so that batch gets no position
+          position = checkpoint.position(len(batch)) if checkpoint and not read_error else None
+          in_flight.append((pool.apply_async(_process_batch_in_worker, (batch,)), position))
+        # waits on the oldest batches before reading further so results are written in order
+        while in_flight and (finished or len(in_flight) >= max_in_flight):
+          result, position = in_flight.popleft()
+          with profile.stage('waiting for workers'):
+            output_rows, error = result.get()
+          writer.writerows(output_rows)
+          if error:
+            raise IngestError(error)
+          if position:
+            checkpoint.reached(position)
+    if read_error:
+      raise read_error
+
+def work_key(values, model_position, source_identifier_position, parents_position):
+  """Finds which work an input row belongs to, for grouping rows in the work cache.
+
+  Args:
+      values (list): The values of the input row.
+      model_position (int): The column position of the model.
+      source_identifier_position (int): The column position of the source_identifier.
+      parents_position (int): The column position of the parents.
+
+  Returns:
+      str: The source_identifier of the work, the parents of an attachment row, or None for FileSet and Collection rows.
+  """
+  model = values[model_position]
+  if model == "Attachment":
+    return values[parents_position]
+  if model == "FileSet" or model == "Collection":
+    return None
+  return values[source_identifier_position]
+
+def read_values(reader, width):
+  """Reads the values of each row from a csv.reader the same way csv.DictReader would, skipping blank lines and filling short rows with None.
+  The added columns are part of the header csv.DictReader reads rows with, so a row can have values for them, as it always could.
+
+  Args:
+      reader (csv.reader): The reader for the input file, positioned after the header.
+      width (int): The number of columns, including any that were added to the header.
+
+  Raises:
+      IngestError: If a row has more values than the header and the added columns together.
+
+  Yields:
+      list: The values of each row, in column order.
+  """
+  for values in reader:
+    if not values:
+      continue
+    if len(values) > width:
+      raise IngestError(f"Row on line {reader.line_num} has more values than the header and added columns have, exiting")
+    yield pad_values(values, width)
+
+# ======== Worker process state ================
+_worker_sheet = None
+_worker_options = None
+
+def _init_worker(index, output_columns, attachments_given, verbose, audio_visual, parent_titles):
+  """Sets up the CreateSheet instance and options used by each worker process in write_rows_parallel."""
+  global _worker_sheet, _worker_options
+  _worker_sheet = CreateSheet()
+  _worker_options = (index, output_columns, attachments_given, verbose, audio_visual, parent_titles)
+
+def _process_batch_in_worker(batch):
+  """Processes one batch of input rows inside a worker process, see CreateSheet.process_batch."""
+  return _worker_sheet.process_batch(batch, *_worker_options)
@@ -0,0 +1,90 @@
+import csv
+import os
+
+from .create_sheet import IngestError
+from ..compressed import open_sheet, is_compressed, compression_problem
+from ..fast_csv import MappedSheet
+
+# Work models that make up an audio visual sheet
+AUDIO_VISUAL_MODELS = frozenset(['audio', 'video'])
+# Work models that need -a, create_sheet stops on them without it
+ATTACHMENT_WORK_MODELS = frozenset(['book', 'compoundobject'])
+# Models that are not works
+NON_WORK_MODELS = frozenset(['attachment', 'fileset', 'collection'])
+
+def count_models(input_file, stop_at_attachment=False):
+  """Counts the rows of each model in a sheet, reading only the model column of each row.
+  A compressed sheet cannot be memory mapped, so it is decompressed and read with the csv module instead.
+
+  Args:
+      input_file (str): The filename of the sheet.
+      stop_at_attachment (bool, optional): Option to stop at the first attachment row, which is enough for options_for_models to decide both options.
+          The counts are then only for the rows up to it. Defaults to False.
+
+  Raises:
+      IngestError: If the sheet is empty, has no model column, or is compressed in a way that cannot be read.
+
+  Returns:
+      dict: The number of rows of each model.
+  """
+  if os.path.getsize(input_file) == 0:
+    raise IngestError(f"Input file {input_file} is empty")
+  if is_compressed(input_file):
+    problem = compression_problem(input_file)
+    if problem:
+      raise IngestError(problem)
+    with open_sheet(input_file, mode='r', encoding='utf-8-sig', newline='') as infile:
+      reader = csv.reader(infile)
+      fieldnames = next(reader, [])
+      if 'model' not in fieldnames:
+        raise IngestError(f"Required column model not found in {input_file}")
+      model_position = fieldnames.index('model')
+      # blank rows are skipped, the same as MappedSheet.column
+      return tally_models((values[model_position] if model_position < len(values) else "" for values in reader if values), stop_at_attachment)
+  with MappedSheet(input_file) as sheet:
+    if 'model' not in sheet.fieldnames:
+      raise IngestError(f"Required column model not found in {input_file}")
+    return tally_models(sheet.column(sheet.fieldnames.index('model')), stop_at_attachment)
+
+def tally_models(models, stop_at_attachment=False):
+  """Counts each model in the model column of a sheet, stopping after the first attachment if asked, see count_models."""
+  counts = {}
+  for model in models:
+    counts[model] = counts.get(model, 0) + 1
+    if stop_at_attachment and model.lower() == 'attachment':
+      break
+  return counts
+
+def options_for_models(model_counts):
+  """Works out the create_sheet options for a sheet from the models in it.
+  Attachments are given if there are any attachment rows, or any Book or CompoundObject works since create_sheet needs -a for those. The sheet is audio visual if it has works, all of them Audio or Video, and no attachment rows.
+
+  Args:
+      model_counts (dict): The number of rows of each model, from count_models.
+
+  Returns:
+      tuple: attachments_given and audio_visual.
+  """
+  models = {model.lower() for model in model_counts}
+  attachments_given = 'attachment' in models or bool(models & ATTACHMENT_WORK_MODELS)
+  works = models - NON_WORK_MODELS
+  audio_visual = not attachments_given and bool(works) and works <= AUDIO_VISUAL_MODELS
+  return attachments_given, audio_visual
+
+def detect_options(input_file, stop_at_attachment=False):
+  """Works out the create_sheet options a sheet needs by scanning its model column.
+  A sheet without attachment rows is always scanned to the end, since a single attachment row, book or compound object anywhere changes both options.
+
+  Args:
+      input_file (str): The filename of the sheet.
+      stop_at_attachment (bool, optional): Option to stop scanning at the first attachment row, see count_models. Defaults to False.
+
+  Raises:
+      IngestError: If the sheet is empty or has no model column.
+
+  Returns:
+      tuple: attachments_given, audio_visual, and the number of rows of each model.
+  """
+  model_counts = count_models(input_file, stop_at_attachment)
+  attachments_given, audio_visual = options_for_models(model_counts)
+  return attachments_given, audio_visual, model_counts
@@ -0,0 +1,77 @@
+RDF_TYPE_MAP = {
+  'Preservation': 'http://pcdm.org/use#PreservationFile', # will have _p at end of file_identifier
+  'Intermediate': 'http://pcdm.org/use#IntermediateFile', # will have _i at end of file_identifier
+  'Access': 'http://pcdm.org/use#ServiceFile',            # will be .mp3 .jpg, possibly .mp4 but not sure yet
+  'HOCR': 'http://pcdm.org/file-format-types#HTML',       # only applies to books?, has _hocr 
+  'PDF': 'http://pcdm.org/file-format-types#Document',    # if model is pdf 
+  'Transcript': 'http://pcdm.org/use#Transcript',         # will have _transcript at end of file_identifier
+  'OCR': 'http://pcdm.org/use#ExtractedText',             # only applies to books, has _ocr
+}
+
+# Every capitalization of 'pdf', so checking a work's model is a set lookup instead of lowercasing the model for each row
+PDF_MODELS = frozenset(p + d + f for p in 'pP' for d in 'dD' for f in 'fF')
+
+# Resolved once here so classifying a row does not need any dictionary lookups
+PDF = RDF_TYPE_MAP['PDF']
+INTERMEDIATE = RDF_TYPE_MAP['Intermediate']
+PRESERVATION = RDF_TYPE_MAP['Preservation']
+TRANSCRIPT = RDF_TYPE_MAP['Transcript']
+OCR = RDF_TYPE_MAP['OCR']
+HOCR = RDF_TYPE_MAP['HOCR']
+ACCESS = RDF_TYPE_MAP['Access']
+
+def file_rdf_type(file_identifier, attachment=False):
+  """Finds the rdf_type of a file from the markers in its file_identifier, the first marker in this order wins:
+  _i., _p., _transcript., _ocr., _hocr., then any of .jpg .mp3 .jp2 for access files.
+
+  Args:
+      file_identifier (str): The file_identifier to classify.
+      attachment (bool, optional): Option for classifying a given attachment row, which skips _ocr. and _hocr. since those come from its source_identifier. Defaults to False.
+
+  Returns:
+      str: The rdf_type URI, or an empty string if no marker matches.
+  """
+  if "_i." in file_identifier:
+    return INTERMEDIATE
+  if "_p." in file_identifier:
+    return PRESERVATION
+  if "_transcript." in file_identifier:
+    return TRANSCRIPT
+  if not attachment:
+    if "_ocr." in file_identifier:
+      return OCR
+    if "_hocr." in file_identifier:
+      return HOCR
+  if ".jpg" in file_identifier or ".mp3" in file_identifier or ".jp2" in file_identifier:
+    return ACCESS
+  return ""
+
+def work_rdf_type(model, file_identifier):
+  """Finds the rdf_type for a work row, or for an attachment row generated from a work row.
+
+  Args:
+      model (str): The model of the work.
+      file_identifier (str): The file_identifier of the work.
+
+  Returns:
+      str: The rdf_type URI, or an empty string if none applies.
+  """
+  if model in PDF_MODELS:
+    return PDF
+  return file_rdf_type(file_identifier)
+
+def attachment_rdf_type(source_identifier, file_identifier):
+  """Finds the rdf_type for an attachment row given in the input sheet, OCR and HOCR attachments are marked in the source_identifier.
+
+  Args:
+      source_identifier (str): The source_identifier of the attachment.
+      file_identifier (str): The file_identifier of the attachment.
+
+  Returns:
+      str: The rdf_type URI, or an empty string if none applies.
+  """
+  if "_hocr." in source_identifier:
+    return HOCR
+  if "_ocr." in source_identifier:
+    return OCR
+  return file_rdf_type(file_identifier, True)
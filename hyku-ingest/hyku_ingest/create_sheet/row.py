@@ -0,0 +1,74 @@
+class Row:
+  """A single row of a sheet, stored as a list of values in column order.
+  Every row read from or built for the same sheet shares one index of column name to position, so a row costs one list instead of a dictionary,
+  while row['column'] lookups and assignments still work like they did on the dictionaries from csv.DictReader.
+  """
+  __slots__ = ('index', 'values')
+
+  def __init__(self, index, values):
+    """
+    Args:
+        index (dict): The shared column name to position index for the sheet.
+        values (list): The values of this row, in column order.
+    """
+    self.index = index
+    self.values = values
+
+  @classmethod
+  def blank(cls, index, width):
+    """Creates a row with every column set to an empty string, used for rows that are generated rather than read.
+
+    Args:
+        index (dict): The shared column name to position index for the sheet.
+        width (int): The number of columns in the sheet.
+
+    Returns:
+        Row: The empty row.
+    """
+    return cls(index, [""] * width)
+
+  def __getitem__(self, column):
+    return self.values[self.index[column]]
+
+  def __setitem__(self, column, value):
+    self.values[self.index[column]] = value
+
+  def __contains__(self, column):
+    return column in self.index
+
+  def get(self, column, default=None):
+    """Returns the value of column, or default if the sheet has no such column."""
+    position = self.index.get(column)
+    if position is None:
+      return default
+    return self.values[position]
+
+  def to_dict(self):
+    """Returns the row as a dictionary of column name to value."""
+    return {column: self.values[position] for column, position in self.index.items()}
+
+def build_index(fieldnames):
+  """Builds the column name to position index shared by every row of a sheet.
+  If a column name is repeated the last position wins, the same as the dictionaries built by csv.DictReader.
+
+  Args:
+      fieldnames (list): The column names of the sheet, in order.
+
+  Returns:
+      dict: The column name to position index.
+  """
+  return {column: position for position, column in enumerate(fieldnames)}
+
+def pad_values(values, width):
+  """Fills out a row read with csv.reader to the width of the sheet, matching how csv.DictReader reads short rows.
+
+  Args:
+      values (list): The values read for the row, this list is extended in place.
+      width (int): The number of columns in the sheet.
+
+  Returns:
+      list: The values, with None for every missing column.
+  """
+  if len(values) < width:
+    values.extend([None] * (width - len(values)))
+  return values
@@ -0,0 +1,96 @@
+import hashlib
+import json
+import sqlite3
+
+class WorkCache:
+  """An on-disk SQLite cache of the output rows generated for each work, keyed by a hash of the work's input rows.
+  A work's input rows are the work row and any attachment rows given for it. When none of them changed since an earlier run,
+  its output rows can be copied from the cache instead of generated again, or left out of a delta sheet entirely.
+  The cache holds at most max_entries works, the ones not used for the most runs are evicted first.
+  """
+  # Bump this whenever the rows generated for a work change, so stale cache entries are never used
+  VERSION = 1
+
+  def __init__(self, cache_file, max_entries=500000):
+    """
+    Args:
+        cache_file (str): The filename of the SQLite cache, created if it does not exist.
+        max_entries (int, optional): The most works to keep in the cache. Defaults to 500000.
+    """
+    self.max_entries = max_entries
+    self.connection = sqlite3.connect(cache_file)
+    self.connection.execute("CREATE TABLE IF NOT EXISTS works (digest BLOB PRIMARY KEY, outputs TEXT NOT NULL, last_used INTEGER NOT NULL)")
+    self.connection.execute("CREATE TABLE IF NOT EXISTS runs (run INTEGER PRIMARY KEY AUTOINCREMENT)")
+    self.run = self.connection.execute("INSERT INTO runs DEFAULT VALUES").lastrowid
+    self.used = []
+    self.pending = 0
+    self.hits = 0
+    self.misses = 0
+
+  @classmethod
+  def salt(cls, fieldnames, attachments_given, audio_visual):
+    """Builds the bytes every work hash starts from, so works from sheets with other columns or options never match.
+
+    Args:
+        fieldnames (list): The columns of the input sheet, including any added ones.
+        attachments_given (bool): Option for if attachment rows are expected in the input file.
+        audio_visual (bool): Option for if the sheet contains audio visual works.
+
+    Returns:
+        bytes: The salt.
+    """
+    return json.dumps([cls.VERSION, fieldnames, attachments_given, audio_visual]).encode('utf-8')
+
+  @staticmethod
+  def add_row(digest, values):
+    """Folds one input row into a work's running hash, the order of the rows matters.
+
+    Args:
+        digest (bytes): The work's hash so far, or the salt for its first row.
+        values (list): The values of the input row, None is kept distinct from an empty string.
+
+    Returns:
+        bytes: The new hash.
+    """
+    hasher = hashlib.blake2b(digest, digest_size=16)
+    hasher.update('\x1f'.join('\x00' if value is None else value for value in values).encode('utf-8'))
+    return hasher.digest()
+
+  def get(self, digest):
+    """Looks up the output rows cached for a work and marks it as used in this run.
+
+    Args:
+        digest (bytes): The hash of the work's input rows.
+
+    Returns:
+        list: For each input row of the work in order, the list of its output rows, or None if the work is not cached.
+    """
+    found = self.connection.execute("SELECT outputs FROM works WHERE digest = ?", (digest,)).fetchone()
+    if found is None:
+      self.misses += 1
+      return None
+    self.hits += 1
+    self.used.append(digest)
+    return json.loads(found[0])
+
+  def put(self, digest, outputs):
+    """Stores the output rows generated for a work.
+
+    Args:
+        digest (bytes): The hash of the work's input rows.
+        outputs (list): For each input row of the work in order, the list of its output rows.
+    """
+    self.connection.execute("INSERT OR REPLACE INTO works (digest, outputs, last_used) VALUES (?, ?, ?)", (digest, json.dumps(outputs), self.run))
+    self.pending += 1
+    if self.pending >= 10000:
+      self.connection.commit()
+      self.pending = 0
+
+  def close(self):
+    """Marks the works used in this run, evicts the least recently used works over max_entries, and saves the cache."""
+    self.connection.executemany("UPDATE works SET last_used = ? WHERE digest = ?", ((self.run, digest) for digest in self.used))
+    excess = self.connection.execute("SELECT COUNT(*) FROM works").fetchone()[0] - self.max_entries
+    if excess > 0:
+      self.connection.execute("DELETE FROM works WHERE digest IN (SELECT digest FROM works ORDER BY last_used LIMIT ?)", (excess,))
+    self.connection.commit()
+    self.connection.close()
@@ -0,0 +1,105 @@
+import csv
+import mmap
+
+class MappedSheet:
+  """Memory maps a CSV sheet and finds its rows and fields at the byte level, so rows that are only copied or routed never have to be fully decoded.
+  Rows are the raw bytes from the file, line terminator included. A newline inside a quoted field does not end a row.
+  Only the fields asked for with field are decoded, and only those rows with a quote before the field are parsed with the csv module.
+  Blank lines are skipped, the same as the csv readers in create_sheet.
+  """
+
+  def __init__(self, input_file):
+    """
+    Args:
+        input_file (str): The filename of the sheet, it must not be empty.
+    """
+    self.file = open(input_file, mode='rb')
+    self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+    # the header is the first row even if it is blank, the same as next on a csv reader
+    self.header, self.data_start = self.read_row(0)
+    self.fieldnames = next(csv.reader([self.header.decode('utf-8-sig')]), [])
+    if self.header and not self.header.endswith(b'\n'): # a header with no rows after it
+      self.header += b'\r\n'
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    self.close()
+
+  def close(self):
+    self.map.close()
+    self.file.close()
+
+  def read_row(self, position):
+    """Reads the raw bytes of the row starting at a byte offset.
+
+    Args:
+        position (int): The byte offset the row starts at.
+
+    Returns:
+        tuple: The row with its line terminator, and the byte offset just after it.
+    """
+    mm = self.map
+    end = len(mm)
+    newline = mm.find(b'\n', position)
+    stop = end if newline == -1 else newline + 1
+    row = mm[position:stop]
+    # quotes come in pairs, so an odd number of them means the newline was inside a quoted field and the row goes on
+    quotes = row.count(b'"')
+    while quotes & 1 and stop < end:
+      newline = mm.find(b'\n', stop)
+      next_stop = end if newline == -1 else newline + 1
+      piece = mm[stop:next_stop]
+      quotes += piece.count(b'"')
+      row += piece
+      stop = next_stop
+    return row, stop
+
+  def rows(self):
+    """Yields the raw bytes of each row after the header.
+
+    Yields:
+        bytes: Each row that is not blank, with its line terminator.
+    """
+    read_row = self.read_row
+    end = len(self.map)
+    position = self.data_start
+    while position < end:
+      row, position = read_row(position)
+      if row.strip(b'\r\n'):
+        yield row
+
+  @staticmethod
+  def field(row, position):
+    """Returns one field of a raw row, decoded.
+
+    Args:
+        row (bytes): The raw row from rows.
+        position (int): The column position of the field.
+
+    Returns:
+        str: The value of the field, an empty string if the row is too short to have it.
+    """
+    parts = row.split(b',', position + 1)
+    if len(parts) <= position:
+      return ""
+    quote = row.find(b'"')
+    # the fields are only split right if no quote comes before the end of the field
+    if quote == -1 or quote >= sum(len(part) + 1 for part in parts[:position + 1]):
+      return parts[position].rstrip(b'\r\n').decode('utf-8')
+    values = next(csv.reader([row.decode('utf-8')]), [])
+    return values[position] if position < len(values) else ""
+
+  def column(self, position):
+    """Yields the value of one column for every row, without decoding the rest of each row.
+
+    Args:
+        position (int): The column position.
+
+    Yields:
+        str: The value of the column in each row.
+    """
+    field = self.field
+    for row in self.rows():
+      yield field(row, position)
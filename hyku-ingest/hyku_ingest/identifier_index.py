@@ -0,0 +1,159 @@
+import os
+import sqlite3
+
+# The ending create_sheet gives the transcript attachment of an audio visual work
+TRANSCRIPT_ATTACHMENT_SUFFIX = '_transcript_attachment'
+
+class IdentifierIndex:
+  """Checks the rows of an ingest sheet as they go by, for source_identifiers used more than once and for attachments and filesets whose parents is not in the sheet.
+  Identifiers are kept as 64 bit hashes along with the row they were first seen on, instead of as strings, so the index stays small.
+  If a spill file is given, the hashes are moved into an SQLite table in it whenever memory_limit of them are held in memory, for very large sheets.
+  Two different identifiers with the same hash would be reported as a duplicate, which is vanishingly unlikely with 64 bit hashes.
+  Rows are numbered the way a spreadsheet shows them, the header is row 1.
+  """
+  CHILD_MODELS = ('attachment', 'fileset')
+
+  def __init__(self, spill_file=None, memory_limit=5000000):
+    """
+    Args:
+        spill_file (str, optional): The filename of an SQLite file to move the index into when it gets large, it is removed once the check is finished.
+            The whole index is kept in memory if not given. Defaults to None.
+        memory_limit (int, optional): The most identifiers to hold in memory before they are moved to the spill file. Defaults to 5000000.
+    """
+    self.spill_file = spill_file
+    self.memory_limit = memory_limit
+    self.first_rows = {} # identifier hash to the row it was first seen on
+    self.connection = None
+    self.waiting = [] # row, identifier and parents of children whose parent had not been seen yet
+    self.problems = [] # row and message of each problem
+    self.previous = None # source_identifier, model and parents of the last row added, for spotting the generated transcript fileset
+
+  def find(self, key):
+    """Returns the row an identifier hash was first seen on, or None if it has not been seen."""
+    row = self.first_rows.get(key)
+    if row is None and self.connection:
+      found = self.connection.execute("SELECT row FROM identifiers WHERE hash = ?", (key,)).fetchone()
+      if found:
+        row = found[0]
+    return row
+
+  def add_row(self, source_identifier, model, parents, row):
+    """Adds a row's source_identifier to the index, noting it if it is a duplicate, and notes the row's parents if they should be in the sheet.
+
+    Args:
+        source_identifier (str): The source_identifier of the row.
+        model (str): The model of the row, only attachment and fileset rows have their parents checked.
+        parents (str): The parents of the row.
+        row (int): The row number.
+    """
+    key = hash(source_identifier)
+    first_row = self.find(key)
+    previous, self.previous = self.previous, (source_identifier, model, parents)
+    if first_row is not None:
+      if not (first_row == row - 1 and self.is_transcript_fileset(source_identifier, model, parents, previous)):
+        self.problems.append((row, f"Duplicate source_identifier {source_identifier}, first used on row {first_row}"))
+    else:
+      self.first_rows[key] = row
+      if self.spill_file and len(self.first_rows) >= self.memory_limit:
+        self.spill()
+    if model and model.lower() in self.CHILD_MODELS:
+      if not parents:
+        self.problems.append((row, f"{model} {source_identifier} has no parents"))
+      elif self.find(hash(parents)) is None: # parents can come later in the sheet, they are checked again at the end
+        self.waiting.append((row, source_identifier, parents))
+
+  @staticmethod
+  def is_transcript_fileset(source_identifier, model, parents, previous):
+    """Returns True for the transcript fileset create_sheet --audio_visual generates for a work, which is given the same <work>_fileset source_identifier
+    as the work's first fileset. That is how the generator has always named it, so it is left out of the duplicate check instead of failing every audio visual sheet.
+    Only the exact pair create_sheet writes is let through, the <work>_fileset of <work>_attachment directly followed by the <work>_fileset of
+    <work>_transcript_attachment, so any other repeat of <work>_fileset, such as a FileSet row given in the input, is still reported.
+
+    Args:
+        source_identifier (str): The source_identifier of the row.
+        model (str): The model of the row.
+        parents (str): The parents of the row.
+        previous (tuple): The source_identifier, model and parents of the row before it, or None.
+
+    Returns:
+        bool: True if the row is an audio visual transcript fileset.
+    """
+    if model != 'FileSet' or not parents or not parents.endswith(TRANSCRIPT_ATTACHMENT_SUFFIX):
+      return False
+    work = parents[:-len(TRANSCRIPT_ATTACHMENT_SUFFIX)]
+    return source_identifier == work + '_fileset' and previous == (source_identifier, 'FileSet', work + '_attachment')
+
+  def checked_rows(self, rows, fieldnames, first_row=2):
+    """Adds every row to the index as it is read, passing the rows on unchanged.
+
+    Args:
+        rows (iterable): The rows after the header.
+        fieldnames (list): The columns of the rows.
+        first_row (int, optional): The row number of the first row. Defaults to 2, just after the header.
+
+    Yields:
+        list: Each row.
+    """
+    positions = {field: position for position, field in enumerate(fieldnames)}
+    source_identifier_position = positions['source_identifier']
+    model_position = positions['model']
+    parents_position = positions['parents']
+    for row_number, row in enumerate(rows, first_row):
+      self.add_row(row[source_identifier_position], row[model_position], row[parents_position], row_number)
+      yield row
+
+  def spill(self):
+    """Moves the identifiers held in memory into the spill file."""
+    if self.connection is None:
+      self.connection = sqlite3.connect(self.spill_file)
+      self.connection.execute("DROP TABLE IF EXISTS identifiers")
+      self.connection.execute("CREATE TABLE identifiers (hash INTEGER PRIMARY KEY, row INTEGER NOT NULL)")
+    self.connection.executemany("INSERT INTO identifiers (hash, row) VALUES (?, ?)", self.first_rows.items())
+    self.connection.commit()
+    self.first_rows = {}
+
+  def finish(self):
+    """Checks the parents that had not been seen when their children were added, and removes the spill file.
+
+    Returns:
+        list: A message for every problem found, in row order, empty if there are none.
+    """
+    for row, source_identifier, parents in self.waiting:
+      if self.find(hash(parents)) is None:
+        self.problems.append((row, f"Parent {parents} of {source_identifier} not found in the sheet"))
+    self.waiting = []
+    if self.connection:
+      self.connection.close()
+      self.connection = None
+      os.remove(self.spill_file)
+    self.problems.sort(key=lambda problem: problem[0])
+    return [f"Row {row}: {message}" for row, message in self.problems]
+
+class CheckedWriter:
+  """A csv writer wrapper that adds every row written to an IdentifierIndex, for checking the identifiers of an output sheet as it is written."""
+
+  def __init__(self, writer, index, fieldnames, first_row=2):
+    """
+    Args:
+        writer (csv.writer): The writer to pass the rows on to.
+        index (IdentifierIndex): The index to add the rows to.
+        fieldnames (list): The columns of the rows written.
+        first_row (int, optional): The row number of the first row written. Defaults to 2, just after the header.
+    """
+    self.writer = writer
+    self.index = index
+    # the last column with a name is the one used, the same as build_index
+    positions = {field: position for position, field in enumerate(fieldnames)}
+    self.source_identifier_position = positions['source_identifier']
+    self.model_position = positions['model']
+    self.parents_position = positions['parents']
+    self.row = first_row
+
+  def writerow(self, row):
+    self.index.add_row(row[self.source_identifier_position], row[self.model_position], row[self.parents_position], self.row)
+    self.row += 1
+    self.writer.writerow(row)
+
+  def writerows(self, rows):
+    for row in rows:
+      self.writerow(row)
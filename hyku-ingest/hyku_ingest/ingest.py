@@ -1,25 +1,140 @@
-from hyku_ingest.create_sheet import CreateSheet
-from hyku_ingest.split_sheet import split_sheet
-
 import argparse
 import os
 import csv
+import sys
+
+# The subcommands import what they need when they run, so starting the command only loads the one that is used
 
 # ======== Driver functions ================
+def make_profile(args):
+  """Creates a Profile if --profile or --profile_dump was given.
+
+  Args:
+      args (args): A namespace of the command line arguments.
+
+  Returns:
+      Profile: The profile to pass to the command, or None if profiling is off.
+  """
+  if args.profile or args.profile_dump:
+    from hyku_ingest.profiling import Profile
+    return Profile(args.profile_dump)
+  return None
+
+def report_problems(problems, warnings=True):
+  """Prints every problem found by validate_sheet followed by a count of the errors and warnings.
+
+  Args:
+      problems (list): The problems from validate_sheet.
+      warnings (bool, optional): Option to print the warnings as well as the errors. Defaults to True.
+
+  Returns:
+      int: The number of errors.
+  """
+  errors = sum(1 for problem in problems if problem.error)
+  for problem in problems:
+    if problem.error or warnings:
+      print(problem)
+  print(f"{errors} errors, {len(problems) - errors} warnings")
+  return errors
+
+def create_sheet_batch(args):
+  """Driver function for create_sheet with --input_dir and --output_dir, creates a sheet for every sheet in the input directory with run_batch.
+
+  Args:
+      args (args): A namespace of the command line arguments.
+  """
+  if not args.input_dir or not args.output_dir:
+    print("Error: Both input_dir and output_dir arguments are required for a batch. Use `ingest create_sheet -h` to see help menu.")
+    exit(1)
+  if args.input_file or args.output_file:
+    print("Error: input_file and output_file cannot be used with input_dir and output_dir. Use `ingest create_sheet -h` to see help menu.")
+    exit(1)
+  if args.attachments_given or args.audio_visual:
+    print("Error: -a and --audio_visual are detected for each sheet in a batch, they cannot be given. Use `ingest create_sheet -h` to see help menu.")
+    exit(1)
+  if not os.path.isdir(args.input_dir):
+    print(f"Error: Input directory {args.input_dir} not found.")
+    exit(1)
+  if os.path.realpath(args.input_dir) == os.path.realpath(args.output_dir):
+    print("Error: Input directory cannot be the same as output directory. Use `ingest create_sheet -h` to see help menu")
+    exit(1)
+  if args.batch_workers is not None and args.batch_workers < 1:
+    print("Error: --batch_workers must be at least 1. Use `ingest create_sheet -h` to see help menu")
+    exit(1)
+  from hyku_ingest.create_sheet import run_batch
+  results = run_batch(args.input_dir, args.output_dir, args.batch_workers, args.verbose)
+  if any('error' in result for result in results):
+    exit(1)
+
+def check_compression(*filenames):
+  """Exits with an error if any of the files is compressed in a way that cannot be read or written here.
+
+  Args:
+      *filenames (str): The input and output filenames of the command.
+  """
+  from hyku_ingest.compressed import compression_problem
+  for filename in filenames:
+    problem = compression_problem(filename)
+    if problem:
+      print(f"Error: {problem}.")
+      exit(1)
+
 def create_sheet(args):
   """Driver function for the create_sheet command line option, will parse command line arguments and run ingest_main.
 
   Args:
       args (args): A namespace of the command line arguments.
   """
+  if args.input_dir or args.output_dir:
+    create_sheet_batch(args)
+    return
   if not args.input_file or not args.output_file:
     print("Error: Both input_file and output_file arguments are required. Use `ingest create_sheet -h` to see help menu.")
     exit(1)
   if args.input_file == args.output_file:
     print("Error: Input file cannot be the same as output file. Use `ingest create_sheet -h` to see help menu")
     exit(1)
+  if args.workers < 1:
+    print("Error: --workers must be at least 1. Use `ingest create_sheet -h` to see help menu")
+    exit(1)
+  if args.mirror_workers < 1:
+    print("Error: --mirror_workers must be at least 1. Use `ingest create_sheet -h` to see help menu")
+    exit(1)
+  check_compression(args.input_file, args.output_file)
+  from hyku_ingest.create_sheet import CreateSheet, IngestError, detect_options
+  if args.auto:
+    if args.attachments_given or args.audio_visual:
+      print("Error: -a and --audio_visual are detected with --auto, they cannot be given with it. Use `ingest create_sheet -h` to see help menu.")
+      exit(1)
+    try:
+      # stops at the first attachment row, which decides both options
+      args.attachments_given, args.audio_visual, _ = detect_options(args.input_file, stop_at_attachment=True)
+    except IngestError as e:
+      print(f"Error: {e}")
+      exit(1)
+    options = [flag for flag, given in (('-a', args.attachments_given), ('--audio_visual', args.audio_visual)) if given]
+    print(f"Detected options: {' '.join(options) or 'none'}")
+  if args.preflight:
+    from hyku_ingest.validate import validate_sheet
+    # checks the whole sheet before anything is written, so a bad sheet is rejected before a long run
+    # warnings are left out since create_sheet prints them itself as it reaches them
+    if report_problems(validate_sheet(args.input_file, args.attachments_given, args.audio_visual), warnings=False):
+      print(f"Preflight check failed, {args.output_file} was not created. Exiting.")
+      exit(1)
+  from hyku_ingest.columnar import ParquetSheetWriter
+  profile = make_profile(args)
+  if profile:
+    profile.start()
   cs = CreateSheet()
-  cs.ingest_main(args.input_file, args.output_file, args.attachments_given, args.verbose, args.audio_visual)
+  cs.ingest_main(args.input_file, args.output_file, args.attachments_given, args.verbose, args.audio_visual, args.workers, profile=profile,
+                 checkpoint_every=args.checkpoint_every, resume=args.resume, cache_file=args.cache, delta=args.delta,
+                 cache_max_entries=args.cache_max_entries, write_buffer=args.write_buffer or CreateSheet.DEFAULT_WRITE_BUFFER,
+                 check_ids=args.check_ids, id_spill_file=args.id_spill_file, parquet_file=args.parquet,
+                 parquet_row_group=args.parquet_row_group or ParquetSheetWriter.DEFAULT_ROW_GROUP_ROWS,
+                 mirror_dir=args.mirror_dir, mirror_manifest=args.mirror_manifest, mirror_workers=args.mirror_workers)
+  if profile:
+    profile.stop()
+    print(profile.summary())
 
 def split_sheet_main(args):
   """Driver function for the split_sheet command line option, will parse command line arguments and run split_sheet.
@@ -30,20 +145,166 @@ def split_sheet_main(args):
   if not args.input_file:
     print("Error: input_file argument is required. Use `ingest split_sheet -h` to see help menu.")
     exit(1)
+  if args.workers < 1:
+    print("Error: --workers must be at least 1. Use `ingest split_sheet -h` to see help menu")
+    exit(1)
   if not args.num_rows:
     print("No number of rows set, using default of 10000")
     chunk_size = 10000
   else:
     chunk_size = args.num_rows
   
+  from hyku_ingest.compressed import compression_suffix
+  from hyku_ingest.split_sheet import split_sheet
   input_file = args.input_file
-  base_filename = os.path.splitext(os.path.basename(input_file))[0]
+  # the chunks are compressed the same way as the input file unless --compress is given
+  input_compression = compression_suffix(input_file)
+  if args.compress is None:
+    chunk_suffix = '.csv' + input_compression
+  else:
+    chunk_suffix = '.csv' if args.compress == 'none' else f'.csv.{args.compress}'
+  input_name = os.path.basename(input_file)
+  base_filename = os.path.splitext(input_name[:len(input_name) - len(input_compression)])[0]
   output_dir = os.path.abspath(os.path.dirname(input_file))
   output_file_prefix = os.path.join(output_dir, f'{base_filename}_')
   # hopefully this file is always empty, if not there are unexpected rows in the input file, most likely work and collection rows
-  non_filesets_attachment_file = os.path.join(output_dir, f'{base_filename}_empty.csv')
+  non_filesets_attachment_file = os.path.join(output_dir, f'{base_filename}_empty{chunk_suffix}')
+  check_compression(input_file, non_filesets_attachment_file)
+
+  profile = make_profile(args)
+  if profile:
+    profile.start()
+  split_sheet(input_file, output_file_prefix, non_filesets_attachment_file, chunk_size, profile, args.group_by_parent, args.workers,
+              args.check_ids, args.id_spill_file, args.fast, chunk_suffix, args.parquet)
+  if profile:
+    profile.stop()
+    print(profile.summary())
+
+def benchmark_main(args):
+  """Driver function for the benchmark command line option, runs the benchmark suite, saves the results, and compares them to earlier results if given.
+
+  Args:
+      args (args): A namespace of the command line arguments.
+  """
+  from hyku_ingest.benchmark.suite import run_benchmarks, save_results, load_results, compare_results
+  results = run_benchmarks(args.num_rows, args.columns, args.workers, args.chunk_size, work_dir=args.work_dir, verbose=True)
+  save_results(results, args.output_file)
+  print(f"Results written to {args.output_file}")
+  if args.compare:
+    regressions = compare_results(results, load_results(args.compare), args.threshold)
+    for regression in regressions:
+      print(f"Regression: {regression}")
+    if regressions:
+      exit(1)
+    print(f"No regressions compared to {args.compare}")
+
+def validate_main(args):
+  """Driver function for the validate command line option, checks a whole input sheet and prints every problem found.
+  Exits with an error if any of the problems are errors.
+
+  Args:
+      args (args): A namespace of the command line arguments.
+  """
+  if not args.input_file:
+    print("Error: input_file argument is required. Use `ingest validate -h` to see help menu.")
+    exit(1)
+  check_compression(args.input_file)
+  from hyku_ingest.validate import validate_sheet
+  if report_problems(validate_sheet(args.input_file, args.attachments_given, args.audio_visual)):
+    exit(1)
+
+def run_job(parser, line):
+  """Runs one job for ingest serve, an ingest command given as a JSON line such as {"id": 1, "argv": ["create_sheet", "-i", "in.csv", "-o", "out.csv"]}.
+  Everything the command prints is collected into the response instead of being printed, and the command exiting ends the job rather than the process.
+
+  Args:
+      parser (argparse.ArgumentParser): The parser from build_parser.
+      line (str): The JSON job.
+
+  Returns:
+      dict: The job's id, its exit status, its printed output, and how many seconds it took.
+  """
+  import io, json, time, traceback
+  from contextlib import redirect_stdout, redirect_stderr
+  start = time.perf_counter()
+  job_id = None
+  try:
+    job = json.loads(line)
+    job_id = job.get('id')
+    argv = job['argv']
+    if not argv or argv[0] == 'serve' or not all(isinstance(arg, str) for arg in argv):
+      raise ValueError("argv must be a list of strings starting with a command other than serve")
+  except (ValueError, KeyError, TypeError, AttributeError) as e:
+    return {'id': job_id, 'status': 2, 'output': f"Error: bad job, {e}\n", 'seconds': 0}
+  status = 0
+  output = io.StringIO()
+  with redirect_stdout(output), redirect_stderr(output):
+    try:
+      args = parser.parse_args(argv)
+      args.func(args)
+    except SystemExit as e: # every command exits this way on an error
+      status = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    except Exception: # a failing job is reported, it does not stop the other jobs
+      traceback.print_exc()
+      status = 1
+  return {'id': job_id, 'status': status, 'output': output.getvalue(), 'seconds': time.perf_counter() - start}
+
+def serve_jobs(parser, lines, respond):
+  """Runs each job line in turn and responds to it with a JSON line, blank lines are skipped."""
+  import json
+  for line in lines:
+    if line.strip():
+      respond(json.dumps(run_job(parser, line)) + '\n')
+
+def is_socket(path):
+  """Returns True if path is a Unix socket, checked before removing a --socket path so no other file is removed."""
+  import stat
+  try:
+    return stat.S_ISSOCK(os.stat(path).st_mode)
+  except FileNotFoundError:
+    return False
 
-  split_sheet(input_file, output_file_prefix, non_filesets_attachment_file, chunk_size)
+def serve_main(args):
+  """Driver function for the serve command line option, runs jobs from stdin, or from connections to a Unix socket, until stdin is closed or the process is stopped.
+  The subcommands are imported up front, so no job pays for starting Python or importing them.
+  Jobs run one at a time, the current directory of this process is the one relative filenames are found from.
+
+  Args:
+      args (args): A namespace of the command line arguments.
+  """
+  import hyku_ingest.create_sheet, hyku_ingest.split_sheet, hyku_ingest.validate, hyku_ingest.profiling, hyku_ingest.compressed # warm up
+  parser = build_parser()
+  if not args.socket:
+    def respond(response):
+      sys.stdout.write(response)
+      sys.stdout.flush()
+    # the commands exit with the builtin exit, which closes sys.stdin, so jobs are read from a copy of it that no job can close
+    with os.fdopen(os.dup(sys.stdin.fileno()), 'r', encoding=sys.stdin.encoding, errors=sys.stdin.errors) as jobs:
+      serve_jobs(parser, jobs, respond)
+    return
+
+  import socketserver
+  class JobHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+      def respond(response):
+        self.wfile.write(response.encode('utf-8'))
+        self.wfile.flush()
+      serve_jobs(parser, (line.decode('utf-8') for line in self.rfile), respond)
+
+  if os.path.exists(args.socket):
+    if not is_socket(args.socket): # never remove a file that was given by mistake
+      print(f"Error: {args.socket} exists and is not a socket. Use `ingest serve -h` to see help menu.")
+      exit(1)
+    os.remove(args.socket) # left over from a server that was stopped
+  with socketserver.UnixStreamServer(args.socket, JobHandler) as server:
+    print(f"Listening for jobs on {args.socket}", flush=True)
+    try:
+      server.serve_forever()
+    except KeyboardInterrupt:
+      pass
+    finally:
+      if is_socket(args.socket):
+        os.remove(args.socket)
 
 def no_command(args):
   """
@@ -52,11 +313,12 @@ def no_command(args):
   print("No command given. Use `ingest -h` to see commands.")
   exit(1)
 
-def start(): # the entry point for the command line interface
-  """
-  This is the function that gets run when this package is installed and you run the command `ingest`. This behavior is defined in the pyproject.toml
+def build_parser():
+  """Builds the argument parser for the ingest command and all of its subcommands.
+
+  Returns:
+      argparse.ArgumentParser: The parser, each subcommand sets func to its driver function.
   """
-  
   # Create the main argument parser and add the subparsers for each different command
   parser = argparse.ArgumentParser(description='Tools for creating and manipulating ingest spreadsheets')
   parser.set_defaults(func=no_command)
@@ -66,19 +328,78 @@ def start(): # the entry point for the command line interface
   parser_create_sheet = subparsers.add_parser('create_sheet', help='Create ingest sheets from metadata files')
   parser_create_sheet.add_argument('-i', '--input_file', type=str, help='Input CSV file with metadata')
   parser_create_sheet.add_argument('-o', '--output_file', type=str, help='Output CSV file with generated works, attachments, and filesets rows')
+  parser_create_sheet.add_argument('--input_dir', type=str, help='Directory of input CSV files to create sheets for as a batch, the options for each file are detected from it')
+  parser_create_sheet.add_argument('--output_dir', type=str, help='Directory to write the batch output sheets to, with the same filenames as the input files')
+  parser_create_sheet.add_argument('--batch_workers', type=int, help='Number of sheets in a batch to create at the same time, defaults to the number of CPUs')
   parser_create_sheet.add_argument('-a', '--attachments_given', action='store_true', help='Flag to generate just filesets')
   parser_create_sheet.add_argument('-v', '--verbose', action='store_true', help='Flag to print out debug information')
   parser_create_sheet.add_argument('--audio_visual', action='store_true', help='Flag to specify that these will be audio visual works') # probably don't need this, keeping it for now
+  parser_create_sheet.add_argument('--auto', action='store_true', help='Flag to detect -a and --audio_visual from the model column of the input sheet instead of giving them')
+  parser_create_sheet.add_argument('--preflight', action='store_true', help='Flag to check the whole input sheet first, and exit listing every problem instead of creating the output')
+  parser_create_sheet.add_argument('--workers', type=int, default=1, help='Number of worker processes to expand rows with, output is identical to a single process run')
+  parser_create_sheet.add_argument('--checkpoint_every', type=int, help='Write a checkpoint next to the output file every this many input rows, so a failed run can be resumed')
+  parser_create_sheet.add_argument('--resume', action='store_true', help='Flag to continue a failed run from its checkpoint instead of starting over')
+  parser_create_sheet.add_argument('--cache', type=str, help='SQLite work cache, works whose input rows are unchanged since an earlier run are copied from it instead of generated again')
+  parser_create_sheet.add_argument('--delta', action='store_true', help='Flag to only write the rows of works that are new or changed since they were cached, needs --cache')
+  parser_create_sheet.add_argument('--cache_max_entries', type=int, default=500000, help='The most works to keep in the work cache, the least recently used are evicted first')
+  parser_create_sheet.add_argument('--write_buffer', type=int, help='Size in bytes of the output file buffer, output rows are written to it in blocks, defaults to 1 MiB')
+  parser_create_sheet.add_argument('--check_ids', action='store_true', help='Flag to check that every source_identifier in the output is unique and every parents is in it')
+  parser_create_sheet.add_argument('--id_spill_file', type=str, help='SQLite file the --check_ids index is moved into for very large sheets, removed when the run finishes')
+  parser_create_sheet.add_argument('--mirror_dir', type=str, help='Local mirror of the import server files, every remote_files in the output is checked to exist in it and not be empty')
+  parser_create_sheet.add_argument('--mirror_manifest', type=str, help='CSV file to list the files missing from --mirror_dir in, defaults to the output file followed by .missing.csv')
+  parser_create_sheet.add_argument('--mirror_workers', type=int, default=16, help='Number of threads checking files in --mirror_dir')
+  parser_create_sheet.add_argument('--parquet', type=str, help='Parquet file to write the output rows to as well as the CSV, for audits that only read some columns, needs pyarrow')
+  parser_create_sheet.add_argument('--parquet_row_group', type=int, help='Number of rows in each row group of the Parquet file, defaults to 65536')
+  parser_create_sheet.add_argument('--profile', action='store_true', help='Flag to print per-stage timings and counters when the run finishes')
+  parser_create_sheet.add_argument('--profile_dump', type=str, help='File to write cProfile stats to, implies --profile')
   parser_create_sheet.set_defaults(func=create_sheet)
 
   # Creating the subparser for the split_sheet functionality
   parser_split_sheet = subparsers.add_parser('split_sheet', help='Split and sort a large ingest sheet into smaller files')
   parser_split_sheet.add_argument('-i', '--input_file', type=str, help='Input CSV file')
-  parser_split_sheet.add_argument('-n', '--num_rows', type=str, help='The number of rows per file')
+  parser_split_sheet.add_argument('-n', '--num_rows', type=int, help='The number of rows per file')
+  parser_split_sheet.add_argument('--group_by_parent', action='store_true', help='Flag to keep all of the attachments and filesets of a work in the same numbered chunks')
+  parser_split_sheet.add_argument('--workers', type=int, default=1, help='Number of threads writing chunk files at the same time, output is identical to a single thread run')
+  parser_split_sheet.add_argument('--fast', action='store_true', help='Flag to copy rows into the chunk files as raw bytes instead of parsing and rewriting them')
+  parser_split_sheet.add_argument('--compress', choices=['gz', 'zst', 'none'], help='Compression for the chunk files, defaults to the same as the input file')
+  parser_split_sheet.add_argument('--check_ids', action='store_true', help='Flag to check that every source_identifier in the input is unique and every parents is in it')
+  parser_split_sheet.add_argument('--id_spill_file', type=str, help='SQLite file the --check_ids index is moved into for very large sheets, removed when the run finishes')
+  parser_split_sheet.add_argument('--parquet', type=str, help='Parquet file to write every row of the input to as well as the chunk files, needs pyarrow')
+  parser_split_sheet.add_argument('--profile', action='store_true', help='Flag to print per-stage timings and counters when the run finishes')
+  parser_split_sheet.add_argument('--profile_dump', type=str, help='File to write cProfile stats to, implies --profile')
   parser_split_sheet.set_defaults(func=split_sheet_main)
 
+  # Creating the subparser for checking input sheets
+  parser_validate = subparsers.add_parser('validate', help='Check an input sheet for every problem that would stop create_sheet or break the import')
+  parser_validate.add_argument('-i', '--input_file', type=str, help='Input CSV file with metadata')
+  parser_validate.add_argument('-a', '--attachments_given', action='store_true', help='Flag for if attachment rows are in the input file, as with create_sheet -a')
+  parser_validate.add_argument('--audio_visual', action='store_true', help='Flag to specify that these will be audio visual works')
+  parser_validate.set_defaults(func=validate_main)
+
+  # Creating the subparser for the benchmark suite
+  parser_benchmark = subparsers.add_parser('benchmark', help='Measure create_sheet and split_sheet throughput on generated sheets')
+  parser_benchmark.add_argument('-n', '--num_rows', type=int, default=100000, help='The number of rows in each generated sheet')
+  parser_benchmark.add_argument('-c', '--columns', type=int, default=20, help='The number of extra metadata columns in each generated sheet')
+  parser_benchmark.add_argument('-o', '--output_file', type=str, default='benchmark_results.json', help='JSON file to write the results to')
+  parser_benchmark.add_argument('--workers', type=int, default=1, help='The --workers option to run create_sheet with')
+  parser_benchmark.add_argument('--chunk_size', type=int, default=10000, help='The number of rows per file for split_sheet')
+  parser_benchmark.add_argument('--work_dir', type=str, help='Directory for the generated sheets, defaults to the system temp directory')
+  parser_benchmark.add_argument('--compare', type=str, help='JSON results from an earlier run to check for regressions against')
+  parser_benchmark.add_argument('--threshold', type=float, default=0.1, help='Fraction a result can get worse by before it counts as a regression')
+  parser_benchmark.set_defaults(func=benchmark_main)
+
+  # Creating the subparser for keeping a warm process that runs jobs
+  parser_serve = subparsers.add_parser('serve', help='Keep one process running and run ingest commands sent to it as JSON lines, instead of starting a process per sheet')
+  parser_serve.add_argument('--socket', type=str, help='Unix socket to listen for jobs on, jobs are read from stdin if not given')
+  parser_serve.set_defaults(func=serve_main)
+  return parser
+
+def start(): # the entry point for the command line interface
+  """
+  This is the function that gets run when this package is installed and you run the command `ingest`. This behavior is defined in the pyproject.toml
+  """
   # collect the arguments and run the entered subparser's function
-  args = parser.parse_args()
+  args = build_parser().parse_args()
   args.func(args)
 
 
@@ -0,0 +1,134 @@
+import csv
+import os
+import stat
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+
+class MirrorCheck:
+  """Checks that the files in the remote_files of an ingest sheet exist in a local mirror of the import server, and are not empty.
+  Each directory is listed once and the listing cached, so a missing file is found without a stat call, and only the files that are listed are stat'ed for their size.
+  Listings and stats are spread over a pool of threads, since on network storage they spend most of their time waiting.
+  Rows are numbered the way a spreadsheet shows them, the header is row 1.
+  """
+  MANIFEST_FIELDNAMES = ['row', 'source_identifier', 'remote_files', 'path', 'problem']
+  # Most files stat'ed by one thread task
+  STAT_BATCH_SIZE = 1000
+
+  def __init__(self, mirror_dir, url_prefix, workers=16):
+    """
+    Args:
+        mirror_dir (str): The local directory that the import server serves url_prefix from.
+        url_prefix (str): The start of every remote_files URL that is in the mirror, remote_files that do not start with it are not checked.
+        workers (int, optional): Number of threads listing directories and stat'ing files. Defaults to 16.
+    """
+    self.mirror_dir = mirror_dir
+    self.url_prefix = url_prefix
+    self.workers = workers
+    self.files = {} # path in the mirror to the row, source_identifier and remote_files of the first row using it
+    self.listings = {} # directory to the set of names in it, None if the directory does not exist
+
+  def add_row(self, source_identifier, remote_files, row):
+    """Notes a row's remote_files to be checked, if it is in the mirror.
+
+    Args:
+        source_identifier (str): The source_identifier of the row.
+        remote_files (str): The remote_files of the row.
+        row (int): The row number.
+    """
+    if remote_files and remote_files.startswith(self.url_prefix):
+      path = os.path.join(self.mirror_dir, remote_files[len(self.url_prefix):])
+      if path not in self.files:
+        self.files[path] = (row, source_identifier, remote_files)
+
+  def list_directory(self, directory):
+    """Returns the set of names in a directory, or None if it does not exist."""
+    try:
+      with os.scandir(directory) as entries:
+        return {entry.name for entry in entries}
+    except (FileNotFoundError, NotADirectoryError):
+      return None
+
+  def file_problems(self, paths):
+    """Returns what is wrong with each of a batch of listed files, 'empty', 'not a file', or None if nothing is."""
+    problems = []
+    for path in paths:
+      try:
+        file_stat = os.stat(path)
+      except FileNotFoundError: # removed since its directory was listed
+        problems.append('missing')
+        continue
+      if not stat.S_ISREG(file_stat.st_mode):
+        problems.append('not a file')
+      elif file_stat.st_size == 0:
+        problems.append('empty')
+      else:
+        problems.append(None)
+    return problems
+
+  def check(self, profile=None):
+    """Checks every file noted, listing each directory that is not cached yet and then stat'ing the files found in the listings.
+
+    Args:
+        profile (Profile, optional): Counts the files checked and directories listed. Defaults to None.
+
+    Returns:
+        list: The row, source_identifier, remote_files, path and problem of every missing, empty or other bad file, in row order, empty if there are none.
+    """
+    problems = []
+    with ThreadPoolExecutor(max_workers=self.workers) as executor:
+      directories = [directory for directory in {os.path.dirname(path) for path in self.files} if directory not in self.listings]
+      self.listings.update(zip(directories, executor.map(self.list_directory, directories)))
+      listed = []
+      for path, (row, source_identifier, remote_files) in self.files.items():
+        names = self.listings[os.path.dirname(path)]
+        if names is None or os.path.basename(path) not in names:
+          problems.append((row, source_identifier, remote_files, path, 'missing'))
+        else:
+          listed.append(path)
+      # the files are stat'ed in batches, a task per file costs more than the stat itself on local disks
+      batch_size = max(1, min(self.STAT_BATCH_SIZE, len(listed) // (self.workers * 4)))
+      batches = [listed[start:start + batch_size] for start in range(0, len(listed), batch_size)]
+      for path, problem in zip(listed, chain.from_iterable(executor.map(self.file_problems, batches))):
+        if problem:
+          row, source_identifier, remote_files = self.files[path]
+          problems.append((row, source_identifier, remote_files, path, problem))
+    if profile:
+      profile.count('mirror files checked', len(self.files))
+      profile.count('mirror directories listed', len(directories))
+    self.files = {}
+    problems.sort(key=lambda problem: problem[0])
+    return problems
+
+  def write_manifest(self, manifest_file, problems):
+    """Writes the problems from check to a CSV manifest, with just the header if there are none."""
+    with open(manifest_file, 'w', newline='', encoding='utf-8') as manifest:
+      writer = csv.writer(manifest)
+      writer.writerow(self.MANIFEST_FIELDNAMES)
+      writer.writerows(problems)
+
+class MirrorCheckedWriter:
+  """A csv writer wrapper that notes the remote_files of every row written in a MirrorCheck, for checking the files of an output sheet once it is written."""
+
+  def __init__(self, writer, mirror_check, fieldnames, first_row=2):
+    """
+    Args:
+        writer (csv.writer): The writer to pass the rows on to.
+        mirror_check (MirrorCheck): The check to note the rows in.
+        fieldnames (list): The columns of the rows written.
+        first_row (int, optional): The row number of the first row written. Defaults to 2, just after the header.
+    """
+    self.writer = writer
+    self.mirror_check = mirror_check
+    positions = {field: position for position, field in enumerate(fieldnames)}
+    self.source_identifier_position = positions['source_identifier']
+    self.remote_files_position = positions['remote_files']
+    self.row = first_row
+
+  def writerow(self, row):
+    self.mirror_check.add_row(row[self.source_identifier_position], row[self.remote_files_position], self.row)
+    self.row += 1
+    self.writer.writerow(row)
+
+  def writerows(self, rows):
+    for row in rows:
+      self.writerow(row)
@@ -0,0 +1,201 @@
+import cProfile
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+class Profile:
+  """Collects per-stage timings and counters for a create_sheet or split_sheet run, and optionally a cProfile dump.
+  Instrumentation is added by wrapping methods, readers and writers, so a run without --profile uses a NullProfile and runs the same code as before.
+  """
+  enabled = True
+
+  def __init__(self, dump_file=None):
+    """
+    Args:
+        dump_file (str, optional): Filename to write cProfile stats to, for use with pstats or snakeviz. Defaults to None.
+    """
+    self.dump_file = dump_file
+    self.timings = {}
+    self.calls = {}
+    self.counters = {}
+    self.start_time = None
+    self.end_time = None
+    self.profiler = None
+
+  def start(self):
+    """Starts timing the whole run, and cProfile if a dump file was given."""
+    self.start_time = time.perf_counter()
+    if self.dump_file:
+      self.profiler = cProfile.Profile()
+      self.profiler.enable()
+
+  def stop(self):
+    """Stops timing the run and writes the cProfile dump if one was requested."""
+    if self.profiler:
+      self.profiler.disable()
+      self.profiler.dump_stats(self.dump_file)
+    self.end_time = time.perf_counter()
+
+  def add_time(self, stage, seconds):
+    """Adds seconds to the total time spent in stage."""
+    self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+    self.calls[stage] = self.calls.get(stage, 0) + 1
+
+  def count(self, counter, amount=1):
+    """Adds amount to a counter."""
+    self.counters[counter] = self.counters.get(counter, 0) + amount
+
+  @contextmanager
+  def stage(self, stage):
+    """Context manager that adds the time spent inside it to stage."""
+    start = time.perf_counter()
+    try:
+      yield
+    finally:
+      self.add_time(stage, time.perf_counter() - start)
+
+  def timed(self, stage, func):
+    """Wraps func so the time spent in each call is added to stage.
+
+    Args:
+        stage (str): The name of the stage to add the time to.
+        func (callable): The function or bound method to time.
+
+    Returns:
+        callable: The timed function.
+    """
+    @wraps(func)
+    def timed_func(*args, **kwargs):
+      start = time.perf_counter()
+      try:
+        return func(*args, **kwargs)
+      finally:
+        self.add_time(stage, time.perf_counter() - start)
+    return timed_func
+
+  @contextmanager
+  def timed_methods(self, obj, method_names):
+    """Context manager that replaces each named method of obj, on that instance only, with a timed version using the method name as the stage.
+    The original methods are put back when it exits.
+
+    Args:
+        obj (object): The instance whose methods should be timed.
+        method_names (list): The names of the methods to time.
+    """
+    for name in method_names:
+      setattr(obj, name, self.timed(name, getattr(obj, name)))
+    try:
+      yield
+    finally:
+      for name in method_names:
+        delattr(obj, name)
+
+  def rows(self, rows, stage='read', model_position=None):
+    """Wraps an iterator of rows so the time spent reading each one is added to stage, and rows are counted, by model if model_position is given.
+
+    Args:
+        rows (iterator): The rows to read, each one a list of values.
+        stage (str, optional): The name of the stage to add the time to. Defaults to 'read'.
+        model_position (int, optional): The column position of the model, to count rows by model. Defaults to None.
+
+    Yields:
+        list: Each row from rows, unchanged.
+    """
+    rows = iter(rows)
+    while True:
+      start = time.perf_counter()
+      try:
+        row = next(rows)
+      except StopIteration:
+        self.add_time(stage, time.perf_counter() - start)
+        return
+      self.add_time(stage, time.perf_counter() - start)
+      self.count('rows read')
+      if model_position is not None:
+        self.count(f"rows read: {row[model_position] if len(row) > model_position else None}")
+      yield row
+
+  def writer(self, writer, stage='write'):
+    """Wraps a csv writer so the time spent writing is added to stage and written rows are counted."""
+    return TimedWriter(self, writer, stage)
+
+  def summary(self):
+    """Builds a summary of the run, with each stage's share of the total time and every counter, and rows/sec for rows read.
+
+    Returns:
+        str: The summary, one line per stage or counter.
+    """
+    end_time = self.end_time if self.end_time is not None else time.perf_counter()
+    total = end_time - self.start_time if self.start_time is not None else sum(self.timings.values())
+    lines = ["Profile summary:", f"  total: {total:.3f}s"]
+    for stage, seconds in sorted(self.timings.items(), key=lambda item: item[1], reverse=True):
+      share = seconds / total * 100 if total else 0
+      lines.append(f"  {stage}: {seconds:.3f}s ({share:.1f}%), {self.calls[stage]} calls")
+    for counter, amount in sorted(self.counters.items()):
+      lines.append(f"  {counter}: {amount}")
+    if total and 'rows read' in self.counters:
+      lines.append(f"  rows/sec: {self.counters['rows read'] / total:.0f}")
+    if self.dump_file:
+      lines.append(f"  cProfile stats written to {self.dump_file}")
+    return "\n".join(lines)
+
+class TimedWriter:
+  """A csv writer wrapper for Profile.writer, times and counts every row written."""
+
+  def __init__(self, profile, writer, stage):
+    self.profile = profile
+    self.writer = writer
+    self.stage = stage
+
+  def writerow(self, row):
+    start = time.perf_counter()
+    try:
+      return self.writer.writerow(row)
+    finally:
+      self.profile.add_time(self.stage, time.perf_counter() - start)
+      self.profile.count('rows written')
+
+  def writerows(self, rows):
+    rows = list(rows)
+    start = time.perf_counter()
+    try:
+      return self.writer.writerows(rows)
+    finally:
+      self.profile.add_time(self.stage, time.perf_counter() - start)
+      self.profile.count('rows written', len(rows))
+
+class NullProfile:
+  """Stand in for Profile when profiling is off, every method leaves its arguments untouched so no instrumentation is added."""
+  enabled = False
+
+  def start(self):
+    pass
+
+  def stop(self):
+    pass
+
+  def add_time(self, stage, seconds):
+    pass
+
+  def count(self, counter, amount=1):
+    pass
+
+  @contextmanager
+  def stage(self, stage):
+    yield
+
+  def timed(self, stage, func):
+    return func
+
+  @contextmanager
+  def timed_methods(self, obj, method_names):
+    yield
+
+  def rows(self, rows, stage='read', model_position=None):
+    return rows
+
+  def writer(self, writer, stage='write'):
+    return writer
+
+  def summary(self):
+    return ""
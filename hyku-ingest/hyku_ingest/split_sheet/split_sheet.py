@@ -1,57 +1,453 @@
 import os
 import csv
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
-def split_sheet(input_file, output_file_prefix, non_filesets_attachment_file, chunk_size):
+from ..columnar import ParquetSheetWriter, parquet_problem
+from ..compressed import open_sheet, is_compressed
+from ..fast_csv import MappedSheet
+from ..identifier_index import IdentifierIndex
+from ..profiling import NullProfile
+
+class ChunkWriter:
+  """Writes rows into numbered chunk files, moving on to the next file once the current one holds chunk_size rows.
+  Only one chunk file is open at a time, so memory use does not grow with the size of the input sheet.
+  """
+
+  def __init__(self, output_file_prefix, kind, header, chunk_size, suffix='.csv'):
+    """
+    Args:
+        output_file_prefix (str): A string to start every chunk filename with.
+        kind (str): The kind of rows in these chunks, used in the filename, e.g. 'fileset' or 'attachment'.
+        header (list): The header row written at the top of every chunk file.
+        chunk_size (int): Maximum number of rows that each file can have, excluding the header row.
+        suffix (str, optional): The end of every chunk filename, '.csv.gz' or '.csv.zst' writes the chunks compressed. Defaults to '.csv'.
+    """
+    self.output_file_prefix = output_file_prefix
+    self.kind = kind
+    self.header = header
+    self.chunk_size = chunk_size
+    self.suffix = suffix
+    self.chunk_number = 0
+    self.rows_in_chunk = 0
+    self.chunk_csv = None
+    self.writer = None
+    self.files = []
+
+  def writerow(self, row):
+    """Writes a row to the current chunk file, opening the next chunk file first if the current one is full or not opened yet.
+
+    Args:
+        row (list): The row to write.
+    """
+    if self.chunk_csv is None or self.rows_in_chunk >= self.chunk_size:
+      self.rotate()
+    self.writer.writerow(row)
+    self.rows_in_chunk += 1
+
+  def rotate(self):
+    """Closes the current chunk file, if there is one, and opens the next chunk file with the header row written."""
+    if self.chunk_csv is not None:
+      self.chunk_csv.close()
+      self.chunk_number += 1
+    self.open_chunk()
+
+  def write_chunk(self, chunk_number, rows):
+    """Writes rows into a chunk file of their own with the given number, even if there are more than chunk_size of them.
+
+    Args:
+        chunk_number (int): The number of the chunk file.
+        rows (list): The rows to write.
+    """
+    self.close()
+    self.chunk_number = chunk_number
+    self.open_chunk()
+    self.writer.writerows(rows)
+    self.rows_in_chunk = len(rows)
+
+  def chunk_file(self, chunk_number):
+    """Returns the filename of a chunk."""
+    return f"{self.output_file_prefix}{self.kind}_{chunk_number}{self.suffix}"
+
+  def open_chunk(self):
+    """Opens the chunk file for the current chunk number with the header row written."""
+    output_file = self.chunk_file(self.chunk_number)
+    self.files.append(output_file)
+    self.chunk_csv = open_sheet(output_file, 'w', newline='')
+    self.writer = csv.writer(self.chunk_csv)
+    self.writer.writerow(self.header)
+    self.rows_in_chunk = 0
+
+  def close(self):
+    """Closes the current chunk file, if there is one."""
+    if self.chunk_csv is not None:
+      self.chunk_csv.close()
+      self.chunk_csv = None
+
+class RawChunkWriter(ChunkWriter):
+  """A ChunkWriter for raw rows from a MappedSheet, the bytes of the header and rows are copied into the chunk files as they are."""
+
+  def writerow(self, row):
+    """Writes the raw bytes of a row to the current chunk file, opening the next chunk file first if the current one is full or not opened yet.
+
+    Args:
+        row (bytes): The row to write, with its line terminator.
+    """
+    if self.chunk_csv is None or self.rows_in_chunk >= self.chunk_size:
+      self.rotate()
+    self.chunk_csv.write(row)
+    self.rows_in_chunk += 1
+
+  def open_chunk(self):
+    """Opens the chunk file for the current chunk number with the header row written."""
+    output_file = self.chunk_file(self.chunk_number)
+    self.files.append(output_file)
+    self.chunk_csv = open_sheet(output_file, 'wb')
+    self.chunk_csv.write(self.header)
+    self.rows_in_chunk = 0
+
+def split_sheet_fast(input_file, output_file_prefix, non_filesets_attachment_file, chunk_size, profile, chunk_suffix='.csv'):
+  """Splits a sheet the same way as split_sheet, but copies the bytes of each row into the chunk files instead of parsing and rewriting it.
+  Only the model of each row is decoded. The chunk files hold the same rows as split_sheet writes, but keep the input's quoting and line endings,
+  so they are only byte for byte the same when the input was written by Python's csv module, as create_sheet's output is.
+
+  Args:
+      input_file (str): The filename of the input file.
+      output_file_prefix (str): A string to start every newly created file with.
+      non_filesets_attachment_file (str): Filename of the file where any miscellaneous rows will go.
+      chunk_size (int): Maximum number of rows that each file can have, excluding the header row.
+      profile (Profile): Collects stage timings and counters for the run.
+      chunk_suffix (str, optional): The end of every chunk filename, see ChunkWriter. Defaults to '.csv'.
+
+  Returns:
+      list: The filenames of every file written.
+  """
+  with MappedSheet(input_file) as sheet:
+    if 'model' not in sheet.fieldnames:
+      print("Required column model not found, exiting")
+      exit(1)
+    model_position = sheet.fieldnames.index('model')
+    fileset_writer = RawChunkWriter(output_file_prefix, 'fileset', sheet.header, chunk_size, chunk_suffix)
+    attachment_writer = RawChunkWriter(output_file_prefix, 'attachment', sheet.header, chunk_size, chunk_suffix)
+    fileset_writer.writerow = profile.timed('write filesets', fileset_writer.writerow)
+    attachment_writer.writerow = profile.timed('write attachments', attachment_writer.writerow)
+    field = sheet.field
+    with open_sheet(non_filesets_attachment_file, 'wb') as non_filesets_attachment_csv:
+      write_other = profile.timed('write other rows', non_filesets_attachment_csv.write)
+      non_filesets_attachment_csv.write(sheet.header)
+      try:
+        for row in profile.rows(sheet.rows()):
+          if not row.endswith(b'\n'): # the last row of a file with no newline at the end
+            row += b'\r\n'
+          model = field(row, model_position).lower()
+          if model == 'fileset':
+            fileset_writer.writerow(row)
+          elif model == 'attachment':
+            attachment_writer.writerow(row)
+          else:
+            write_other(row)
+      finally:
+        fileset_writer.close()
+        attachment_writer.close()
+  return [non_filesets_attachment_file] + fileset_writer.files + attachment_writer.files
+
+def write_chunk_file(output_file, header, rows):
+  """Writes one whole chunk file, the header row followed by rows."""
+  with open_sheet(output_file, 'w', newline='') as chunk_csv:
+    writer = csv.writer(chunk_csv)
+    writer.writerow(header)
+    writer.writerows(rows)
+
+class ChunkPool:
+  """Writes whole chunk files on a pool of threads, so the writes to slow or network storage overlap with each other and with reading.
+  At most two chunks per thread are waiting to be written at a time, reading waits for the oldest one to finish beyond that, which keeps memory bounded.
+  """
+
+  def __init__(self, workers, profile=None):
+    """
+    Args:
+        workers (int): Number of threads writing chunk files.
+        profile (Profile, optional): Times how long reading waits for chunk files to be written. Defaults to None.
+    """
+    self.executor = ThreadPoolExecutor(max_workers=workers)
+    self.max_in_flight = workers * 2
+    self.in_flight = deque()
+    self.profile = profile or NullProfile()
+
+  def submit(self, output_file, header, rows):
+    """Queues a chunk file to be written, first waiting for the oldest queued chunk file if too many are waiting."""
+    if len(self.in_flight) >= self.max_in_flight:
+      with self.profile.stage('waiting for chunk writers'):
+        self.in_flight.popleft().result()
+    self.in_flight.append(self.executor.submit(write_chunk_file, output_file, header, rows))
+
+  def close(self):
+    """Waits for every queued chunk file to be written, raising the error of any that failed."""
+    try:
+      with self.profile.stage('waiting for chunk writers'):
+        while self.in_flight:
+          self.in_flight.popleft().result()
+    finally:
+      self.executor.shutdown()
+
+class PooledChunkWriter(ChunkWriter):
+  """A ChunkWriter that collects each chunk's rows and hands the whole chunk to a ChunkPool to write, instead of writing the rows itself.
+  The chunk files and their contents are the same as ChunkWriter's.
+  """
+
+  def __init__(self, output_file_prefix, kind, header, chunk_size, pool, suffix='.csv'):
+    """
+    Args:
+        output_file_prefix (str): A string to start every chunk filename with.
+        kind (str): The kind of rows in these chunks, used in the filename, e.g. 'fileset' or 'attachment'.
+        header (list): The header row written at the top of every chunk file.
+        chunk_size (int): Maximum number of rows that each file can have, excluding the header row.
+        pool (ChunkPool): The pool that writes the chunk files, shared with the other kinds of chunks.
+        suffix (str, optional): The end of every chunk filename, see ChunkWriter. Defaults to '.csv'.
+    """
+    super().__init__(output_file_prefix, kind, header, chunk_size, suffix)
+    self.pool = pool
+    self.rows = []
+
+  def writerow(self, row):
+    rows = self.rows
+    rows.append(row)
+    if len(rows) >= self.chunk_size:
+      self.write_chunk(len(self.files), rows)
+      self.rows = []
+
+  def write_chunk(self, chunk_number, rows):
+    output_file = self.chunk_file(chunk_number)
+    self.files.append(output_file)
+    self.pool.submit(output_file, self.header, rows)
+
+  def close(self):
+    """Hands any rows left over to the pool as the last chunk."""
+    if self.rows:
+      self.write_chunk(len(self.files), self.rows)
+      self.rows = []
+
+def pack_groups(weights, capacity):
+  """Assigns groups of rows to chunks with first-fit decreasing bin packing, so as few chunks as possible are used.
+  The largest groups are placed first, each into the first chunk it still fits in. A group larger than capacity gets a chunk of its own.
+
+  Args:
+      weights (list): The number of rows in each group.
+      capacity (int): Maximum number of rows in a chunk.
+
+  Returns:
+      tuple: The chunk number of each group, and the number of chunks used.
+  """
+  size = 1
+  while size < len(weights):
+    size *= 2
+  # a tree over the chunks holding the most room left in any chunk below each node, to find the first chunk with enough room quickly
+  # chunks that are not used yet have all of their room, so the first fit is always a used chunk or the next unused one
+  room = [capacity] * (2 * size)
+  chunks = [0] * len(weights)
+  used = 0
+  for group in sorted(range(len(weights)), key=lambda group: -weights[group]):
+    weight = weights[group]
+    if weight > room[1]: # too large for any chunk
+      node = size + used
+      room[node] = 0
+    else:
+      node = 1
+      while node < size:
+        node = 2 * node if room[2 * node] >= weight else 2 * node + 1
+      room[node] -= weight
+    chunk = node - size
+    chunks[group] = chunk
+    used = max(used, chunk + 1)
+    node //= 2
+    while node:
+      room[node] = max(room[2 * node], room[2 * node + 1])
+      node //= 2
+  return chunks, used
+
+def write_grouped_chunks(rows, header, model_position, fileset_writer, attachment_writer, other_writer, chunk_size):
+  """Writes attachment and fileset rows into chunks that each hold whole works, so a work's rows never straddle two import files.
+  The attachments sharing a parents value and the filesets of those attachments form a group, and the groups are packed into chunks
+  with pack_groups. Chunk n of the attachments and chunk n of the filesets hold the same works. Every row is held in memory until the groups are packed.
+
+  Args:
+      rows (iterator): The rows after the header.
+      header (list): The header row of the input file.
+      model_position (int): The column position of the model.
+      fileset_writer (ChunkWriter): The writer for the fileset chunks.
+      attachment_writer (ChunkWriter): The writer for the attachment chunks.
+      other_writer (csv.writer): The writer for any rows that are neither attachments nor filesets.
+      chunk_size (int): Maximum number of rows of each kind in a chunk, unless a single group is larger.
+  """
+  for field in ['source_identifier', 'parents']:
+    if field not in header:
+      print(f"Required column {field} not found, exiting")
+      exit(1)
+  source_identifier_position = header.index('source_identifier')
+  parents_position = header.index('parents')
+
+  groups = {} # group key to its attachment rows and fileset rows, in the order the groups are first seen
+  attachment_groups = {} # attachment source_identifier to the key of its group
+  filesets = []
+  for row in rows:
+    model = row[model_position].lower()
+    if model == 'attachment':
+      key = row[parents_position] or row[source_identifier_position]
+      attachment_groups[row[source_identifier_position]] = key
+      groups.setdefault(key, ([], []))[0].append(row)
+    elif model == 'fileset':
+      filesets.append(row)
+    else:
+      other_writer.writerow(row)
+  # filesets can come before their attachment, so they are only grouped once every attachment has been seen
+  for row in filesets:
+    key = attachment_groups.get(row[parents_position]) or row[parents_position] or row[source_identifier_position]
+    groups.setdefault(key, ([], []))[1].append(row)
+
+  weights = [max(len(attachments), len(group_filesets)) for attachments, group_filesets in groups.values()]
+  chunks, chunk_count = pack_groups(weights, chunk_size)
+  chunk_attachments = [[] for _ in range(chunk_count)]
+  chunk_filesets = [[] for _ in range(chunk_count)]
+  for (key, (attachments, group_filesets)), chunk, weight in zip(groups.items(), chunks, weights):
+    if weight > chunk_size:
+      print(f"Parent {key} has {weight} rows, more than the chunk size of {chunk_size}, writing it to a chunk of its own")
+    chunk_attachments[chunk].extend(attachments)
+    chunk_filesets[chunk].extend(group_filesets)
+  for chunk in range(chunk_count):
+    if chunk_attachments[chunk]:
+      attachment_writer.write_chunk(chunk, chunk_attachments[chunk])
+    if chunk_filesets[chunk]:
+      fileset_writer.write_chunk(chunk, chunk_filesets[chunk])
+
+def count_written(profile, input_file, written):
+  """Counts the bytes read and the files and bytes written by a split, if the run is being profiled."""
+  if profile.enabled:
+    profile.count('bytes read', os.path.getsize(input_file))
+    profile.count('files written', len(written))
+    profile.count('bytes written', sum(os.path.getsize(filename) for filename in written))
+
+def split_sheet(input_file, output_file_prefix, non_filesets_attachment_file, chunk_size, profile=None, group_by_parent=False, workers=1,
+                check_ids=False, id_spill_file=None, fast=False, chunk_suffix='.csv', parquet_file=None):
   """Splits a given input sheet into filesets and attachments, then splits those into files with a max number of rows.
+  Rows are streamed straight into the current chunk file, so memory use stays constant no matter how large the input is,
+  unless group_by_parent is given. Files ending with .gz or .zst are read and written compressed, see open_sheet.
 
   Args:
       input_file (str): The filename of the input file. This is the file that will be split up, this file itself will not be changed.
       output_file_prefix (str): A string to start every newly created file with, is usually just the input file without the file extension.
       non_filesets_attachment_file (str): Filename of the file where any miscellaneous rows will go. This file should be empty.
       chunk_size (int): Maximum number of rows that each file can have, excluding the header row.
+      profile (Profile, optional): Collects stage timings and counters for the run, nothing is collected if not given. Defaults to None.
+      group_by_parent (bool, optional): Option to keep every work's attachments and filesets in the same numbered chunks, see write_grouped_chunks. Defaults to False.
+      workers (int, optional): Number of threads writing chunk files at the same time, 1 writes every chunk file as it is read. Defaults to 1.
+      check_ids (bool, optional): Option to check as the sheet is read that every source_identifier is unique and every attachment and fileset's parents
+          is in the sheet. Problems are printed at the end and the run exits with an error. Defaults to False.
+      id_spill_file (str, optional): The filename of an SQLite file the identifier check can move its index into for very large sheets. Defaults to None.
+      fast (bool, optional): Option to copy rows into the chunk files as raw bytes, see split_sheet_fast. Cannot be used with group_by_parent,
+          workers or check_ids. A compressed input file cannot be memory mapped, so it is split the normal way. Defaults to False.
+      chunk_suffix (str, optional): The end of every chunk filename, '.csv.gz' or '.csv.zst' writes the chunks compressed. Defaults to '.csv'.
+      parquet_file (str, optional): The filename of a Parquet file to write every row of the input sheet to as well, as it is read, see ParquetSheetWriter.
+          Needs pyarrow, and cannot be used with fast. Defaults to None.
   """
-  with open(input_file, 'r') as csvfile:
+  profile = profile or NullProfile()
+  if parquet_file:
+    if fast:
+      print("The fast split does not parse rows, so it cannot write a Parquet file. Exiting.")
+      exit(1)
+    if parquet_problem():
+      print(f"{parquet_problem()}. Exiting.")
+      exit(1)
+  if fast:
+    if group_by_parent or workers > 1 or check_ids:
+      print("The fast split cannot be used with grouping by parent, workers or checking identifiers. Exiting.")
+      exit(1)
+    if is_compressed(input_file):
+      print("The fast split cannot read a compressed input file, splitting it the normal way")
+      fast = False
+  if fast:
     if os.stat(input_file).st_size == 0:
       print("Input file is empty. Exiting.")
       exit(1)
+    written = split_sheet_fast(input_file, output_file_prefix, non_filesets_attachment_file, chunk_size, profile, chunk_suffix)
+    count_written(profile, input_file, written)
+    return
+  with open_sheet(input_file, 'r') as csvfile:
     reader = csv.reader(csvfile)
-    header = next(reader)
-
-    non_filesets_attachment_rows = []
-    fileset_rows = []
-    attachment_rows = []
-
-    #### Assumes model is in the second column
-    # makes the fileset and attachment row arrays for easy use
-    # stores the other rows as well but there should never be other rows
-    for row in reader:
-      if row[1].lower() == 'fileset':
-        fileset_rows.append(row)
-      elif row[1].lower() == 'attachment':
-        attachment_rows.append(row)
-      else:
-        non_filesets_attachment_rows.append(row)
+    header = next(reader, None)
+    if header is None: # checked on the rows rather than the file size, which a compressed file always has
+      print("Input file is empty. Exiting.")
+      exit(1)
+    if 'model' not in header:
+      print("Required column model not found, exiting")
+      exit(1)
+    model_position = header.index('model')
+    id_index = None
+    if check_ids:
+      for field in ['source_identifier', 'parents']:
+        if field not in header:
+          print(f"Required column {field} not found, exiting")
+          exit(1)
+      id_index = IdentifierIndex(id_spill_file)
+    parquet_writer = None
+    if parquet_file:
+      parquet_writer = ParquetSheetWriter(parquet_file, header)
+      parquet_writer.write_row_group = profile.timed('write parquet', parquet_writer.write_row_group)
+
+    pool = None
+    if workers > 1:
+      # each chunk file is collected in memory and written whole by a thread, so several chunk files are written at once
+      pool = ChunkPool(workers, profile)
+      fileset_writer = PooledChunkWriter(output_file_prefix, 'fileset', header, chunk_size, pool, chunk_suffix)
+      attachment_writer = PooledChunkWriter(output_file_prefix, 'attachment', header, chunk_size, pool, chunk_suffix)
+    else:
+      fileset_writer = ChunkWriter(output_file_prefix, 'fileset', header, chunk_size, chunk_suffix)
+      attachment_writer = ChunkWriter(output_file_prefix, 'attachment', header, chunk_size, chunk_suffix)
+    # only the calls made from here are timed, a pooled writer's writerow calls write_chunk and would count the chunk twice
+    if group_by_parent:
+      fileset_writer.write_chunk = profile.timed('write filesets', fileset_writer.write_chunk)
+      attachment_writer.write_chunk = profile.timed('write attachments', attachment_writer.write_chunk)
+    else:
+      fileset_writer.writerow = profile.timed('write filesets', fileset_writer.writerow)
+      attachment_writer.writerow = profile.timed('write attachments', attachment_writer.writerow)
 
     # writes the file that should be empty, just for sanity purposes
-    with open(non_filesets_attachment_file, 'w', newline='') as non_filesets_attachment_csv:
-      writer = csv.writer(non_filesets_attachment_csv)
+    with open_sheet(non_filesets_attachment_file, 'w', newline='') as non_filesets_attachment_csv:
+      writer = profile.writer(csv.writer(non_filesets_attachment_csv), 'write other rows')
       writer.writerow(header)
-      writer.writerows(non_filesets_attachment_rows)
-
-    # writes the fileset row files, one chunk at a time
-    for i in range(0, len(fileset_rows), chunk_size):
-      chunk = fileset_rows[i:i + chunk_size]
-      output_file = f"{output_file_prefix}fileset_{i // chunk_size}.csv"
-      with open(output_file, 'w', newline='') as chunk_csv:
-        writer = csv.writer(chunk_csv)
-        writer.writerow(header)
-        writer.writerows(chunk)
-
-    # writes the attachment row files, one chunk at a time
-    for i in range(0, len(attachment_rows), chunk_size):
-      chunk = attachment_rows[i:i + chunk_size]
-      output_file = f"{output_file_prefix}attachment_{i // chunk_size}.csv"
-      with open(output_file, 'w', newline='') as chunk_csv:
-        writer = csv.writer(chunk_csv)
-        writer.writerow(header)
-        writer.writerows(chunk)
\ No newline at end of file
+
+      # sends each fileset and attachment row to its chunk writer as it is read
+      # writes the other rows to the empty file but there should never be other rows
+      try:
+        rows = profile.rows(reader, model_position=model_position)
+        if id_index:
+          rows = id_index.checked_rows(rows, header)
+        if parquet_writer:
+          rows = parquet_writer.written_rows(rows)
+        if group_by_parent:
+          write_grouped_chunks(rows, header, model_position, fileset_writer, attachment_writer, writer, chunk_size)
+        else:
+          for row in rows:
+            model = row[model_position].lower()
+            if model == 'fileset':
+              fileset_writer.writerow(row)
+            elif model == 'attachment':
+              attachment_writer.writerow(row)
+            else:
+              writer.writerow(row)
+      finally:
+        fileset_writer.close()
+        attachment_writer.close()
+        if pool:
+          pool.close()
+        if parquet_writer:
+          parquet_writer.close()
+
+  count_written(profile, input_file, [non_filesets_attachment_file] + fileset_writer.files + attachment_writer.files)
+
+  if id_index:
+    id_problems = id_index.finish()
+    for problem in id_problems:
+      print(problem)
+    if id_problems:
+      print(f"{len(id_problems)} identifier problems found in {input_file}. Exiting.")
+      exit(1)
@@ -0,0 +1,3 @@
+from .validate import validate_sheet, Problem
+
+__all__ = ["validate_sheet", "Problem"]
@@ -0,0 +1,162 @@
+import csv
+
+from ..create_sheet import CreateSheet
+from ..create_sheet.row import build_index
+from ..compressed import open_sheet
+
+class Problem:
+  """A problem found in an input sheet. Errors stop create_sheet or break the import, warnings are printed by create_sheet but do not stop it."""
+
+  def __init__(self, line, message, error=True):
+    """
+    Args:
+        line (int): The line of the sheet the problem is on, None for problems with the whole sheet.
+        message (str): What is wrong.
+        error (bool, optional): Option for if this is an error rather than a warning. Defaults to True.
+    """
+    self.line = line
+    self.message = message
+    self.error = error
+
+  def __str__(self):
+    level = "Error" if self.error else "Warning"
+    if self.line is None:
+      return f"{level}: {self.message}"
+    return f"{level} on line {self.line}: {self.message}"
+
+def clean_source_identifier(source_identifier):
+  """Returns the source_identifier the way create_sheet writes it, with spaces removed."""
+  return source_identifier.strip().replace(' ', '_')
+
+def used_columns(values, index, attachments_given):
+  """Returns the required columns create_sheet reads for a row, which depend on the row's model.
+
+  Args:
+      values (list): The values of the row, which may be shorter than the header.
+      index (dict): The column name to position index for the sheet.
+      attachments_given (bool): Option for if attachment rows are expected in the input file.
+
+  Returns:
+      list: The names of the columns the row needs, in column order.
+  """
+  model_position = index['model']
+  model = values[model_position] if model_position < len(values) else None
+  if model == "FileSet" or model == "Collection": # create_sheet skips these rows
+    columns = ['model']
+  elif model == "Attachment":
+    columns = ['model', 'source_identifier', 'parents', 'title', 'file_identifier']
+    title_position = index['title']
+    if title_position < len(values) and values[title_position] == "": # book page titles are built from the sequence
+      columns.append('sequence')
+  elif attachments_given:
+    columns = ['model', 'source_identifier']
+  else: # the work's attachment and fileset are built from its title and file_identifier
+    columns = ['model', 'source_identifier', 'title', 'file_identifier']
+  return sorted(columns, key=index.get)
+
+def validate_sheet(input_file, attachments_given=False, audio_visual=False):
+  """Checks a whole input sheet in one streaming pass for the problems that would stop create_sheet part way through or break the import,
+  so a bad sheet can be rejected in seconds with every problem listed, instead of one at a time after a long run.
+  The checks are for required columns, rows with more values than the header, models that do not match the options, duplicate source_identifiers,
+  attachments whose parents are not in the sheet, book pages without a sequence, and file_identifiers that are empty or have 2 or more periods.
+
+  Args:
+      input_file (str): The filename of the input sheet.
+      attachments_given (bool, optional): Option for if attachment rows are expected in the input file, the same as create_sheet -a. Defaults to False.
+      audio_visual (bool, optional): Option for if the sheet contains all audio visual works. Defaults to False.
+
+  Returns:
+      list: Every Problem found, in line order, empty if the sheet is fine.
+  """
+  problems = []
+  with open_sheet(input_file, mode='r', encoding='utf-8-sig', newline='') as infile:
+    reader = csv.reader(infile)
+    fieldnames = next(reader, None)
+    if not fieldnames:
+      return [Problem(None, "Input file is empty")]
+    missing = [field for field in CreateSheet.REQUIRED_FIELDNAMES if field not in fieldnames]
+    if missing: # rows cannot be checked without these columns
+      return [Problem(1, f"Required column {field} not found") for field in missing]
+
+    index = build_index(fieldnames)
+    header_width = len(fieldnames)
+    # create_sheet adds the output columns the header is missing, and a row can have values for those too
+    width = len(fieldnames) + len(CreateSheet.added_columns(fieldnames))
+    model_position = index['model']
+    source_identifier_position = index['source_identifier']
+    parents_position = index['parents']
+    file_identifier_position = index['file_identifier']
+    title_position = index['title']
+    sequence_position = index['sequence']
+
+    source_identifiers = {} # source_identifier to the line it is first used on
+    waiting_parents = [] # line and parents of attachments whose parent had not been seen yet
+    for values in reader:
+      if not values: # blank lines are skipped, same as create_sheet
+        continue
+      line = reader.line_num
+      if len(values) > width:
+        problems.append(Problem(line, f"Row has {len(values)} values but the header and added columns only have {width} columns"))
+        continue
+      if len(values) > header_width:
+        problems.append(Problem(line, f"Row has {len(values)} values but the header only has {header_width} columns, the extra values go in the columns create_sheet adds", error=False))
+      if len(values) < header_width:
+        # create_sheet fills out short rows, so they are only a problem when a column this row's model uses is cut off
+        missing = [field for field in used_columns(values, index, attachments_given) if index[field] >= len(values)]
+        if missing:
+          problems.append(Problem(line, f"Row has {len(values)} values, too few to include the {', '.join(missing)} column{'s' if len(missing) > 1 else ''} this row needs"))
+          if source_identifier_position < len(values) and values[source_identifier_position]: # still counted, so its attachments find it
+            source_identifiers.setdefault(clean_source_identifier(values[source_identifier_position]), line)
+          continue
+        problems.append(Problem(line, f"Row has {len(values)} values but the header has {header_width} columns, the rest are left empty", error=False))
+        values.extend([""] * (header_width - len(values)))
+
+      model = values[model_position]
+      source_identifier = clean_source_identifier(values[source_identifier_position])
+      if not source_identifier:
+        problems.append(Problem(line, "Row has no source_identifier"))
+      elif source_identifier in source_identifiers:
+        problems.append(Problem(line, f"Duplicate source_identifier {source_identifier}, first used on line {source_identifiers[source_identifier]}"))
+      else:
+        source_identifiers[source_identifier] = line
+
+      if model == "Attachment":
+        if not attachments_given:
+          problems.append(Problem(line, "Attachment row found, use the -a flag if attachments are in the input file"))
+        elif audio_visual:
+          problems.append(Problem(line, "Attachment rows are not supported for audio visual works"))
+        parents = clean_source_identifier(values[parents_position])
+        if not parents:
+          problems.append(Problem(line, f"Attachment {source_identifier} has no parents"))
+        elif parents not in source_identifiers:
+          waiting_parents.append((line, source_identifier, parents))
+        if attachments_given and values[title_position] == "":
+          # book page titles are built from the parent's title and the page's sequence
+          if values[sequence_position] == "":
+            problems.append(Problem(line, f"Book page {source_identifier} has no title and no sequence to build one from"))
+          if source_identifier.count('.') >= 2:
+            problems.append(Problem(line, f"Source identifier for {source_identifier} has 2 or more periods, may cause errors", error=False))
+      elif model == "FileSet" or model == "Collection":
+        continue # create_sheet skips these rows
+      elif not model:
+        problems.append(Problem(line, f"Row {source_identifier} has no model"))
+      else: # a work
+        if (model == 'Book' or model == 'CompoundObject') and not attachments_given:
+          problems.append(Problem(line, f"{model} {source_identifier} found, use the -a flag if attachments are in the input file"))
+        if audio_visual and attachments_given:
+          problems.append(Problem(line, "Attachments given for audio visual works are not supported"))
+        if not attachments_given: # the work's attachment and fileset are generated from its file_identifier
+          file_identifier = values[file_identifier_position]
+          if not file_identifier:
+            problems.append(Problem(line, f"Work {source_identifier} has no file_identifier"))
+          elif file_identifier.count('.') >= 2:
+            problems.append(Problem(line, f"File identifier, {file_identifier} , for work {source_identifier} has 2 or more periods, may cause errors", error=False))
+          elif audio_visual and '.' not in file_identifier:
+            problems.append(Problem(line, f"File identifier, {file_identifier} , for work {source_identifier} has no extension to add _transcript before", error=False))
+
+  # parents can come after their attachments, so they are only missing once the whole sheet has been read
+  for line, source_identifier, parents in waiting_parents:
+    if parents not in source_identifiers:
+      problems.append(Problem(line, f"Parent {parents} of attachment {source_identifier} not found in the sheet"))
+  problems.sort(key=lambda problem: problem.line or 0)
+  return problems
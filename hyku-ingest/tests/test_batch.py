@@ -0,0 +1,33 @@
+import os
+import shutil
+
+from hyku_ingest.create_sheet import run_batch
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+def read_bytes(filename):
+  with open(filename, mode='rb') as infile:
+    return infile.read()
+
+def test_bad_sheet_does_not_stop_the_batch(tmp_path, capsys):
+  input_dir = tmp_path / 'input'
+  output_dir = tmp_path / 'output'
+  input_dir.mkdir()
+  for mode in ('plain', 'attachments', 'audio_visual'):
+    shutil.copy(os.path.join(FIXTURES, f'{mode}_input.csv'), input_dir / f'{mode}_input.csv')
+  # a sheet saved as Latin-1 instead of UTF-8 cannot be decoded
+  (input_dir / 'bad_input.csv').write_bytes(read_bytes(os.path.join(FIXTURES, 'plain_input.csv')).replace(b'Knoxville', 'Knöxville'.encode('latin-1')))
+
+  results = run_batch(str(input_dir), str(output_dir), workers=2)
+
+  by_name = {os.path.basename(result['input_file']): result for result in results}
+  assert len(by_name) == 4
+  assert 'UnicodeDecodeError' in by_name['bad_input.csv']['error']
+  for mode in ('plain', 'attachments', 'audio_visual'):
+    assert 'error' not in by_name[f'{mode}_input.csv']
+    assert read_bytes(output_dir / f'{mode}_input.csv') == read_bytes(os.path.join(FIXTURES, f'{mode}_expected.csv'))
+  out = capsys.readouterr().out
+  assert "bad_input.csv: FAILED, UnicodeDecodeError" in out
+  assert "attachments_input.csv: 160 rows in" in out and "options: -a" in out
+  assert "audio_visual_input.csv: 30 rows in" in out and "options: --audio_visual" in out
+  assert "Batch finished: 3 of 4 sheets created, " in out
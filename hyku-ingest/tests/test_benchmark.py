@@ -0,0 +1,34 @@
+import os
+import subprocess
+import sys
+
+from hyku_ingest.benchmark.suite import compare_results, peak_rss_kb
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Imports the benchmark package in a fresh interpreter where the Unix only resource module cannot be imported, as on Windows
+IMPORT_WITHOUT_RESOURCE = """
+import sys
+sys.modules['resource'] = None
+import hyku_ingest.benchmark.suite
+print(hyku_ingest.benchmark.suite.peak_rss_kb())
+"""
+
+def test_benchmark_imports_without_resource():
+  env = dict(os.environ, PYTHONPATH=PACKAGE_DIR)
+  result = subprocess.run([sys.executable, '-c', IMPORT_WITHOUT_RESOURCE], capture_output=True, text=True, env=env, timeout=60)
+  assert result.returncode == 0, result.stderr
+  assert result.stdout.strip() == 'None'
+
+def test_peak_rss_kb(monkeypatch):
+  assert peak_rss_kb() > 0
+  monkeypatch.setitem(sys.modules, 'resource', None)
+  assert peak_rss_kb() is None
+
+def case(rows_per_second, peak_rss_kb):
+  return {'cases': {'create_sheet': {'rows_per_second': rows_per_second, 'peak_rss_kb': peak_rss_kb}}}
+
+def test_compare_results_skips_memory_that_was_not_measured():
+  assert compare_results(case(1000, None), case(1000, 100)) == []
+  assert compare_results(case(1000, 200), case(1000, None)) == []
+  assert compare_results(case(1000, 200), case(1000, 100)) == ["create_sheet: peak RSS 200 KB, was 100 KB"]
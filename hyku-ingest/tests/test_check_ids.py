@@ -0,0 +1,82 @@
+import csv
+import os
+
+import pytest
+
+from hyku_ingest.create_sheet import CreateSheet
+from hyku_ingest.identifier_index import IdentifierIndex
+from hyku_ingest.split_sheet import split_sheet
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+HEADER = "source_identifier,model,visibility,remote_files,parents,file_identifier,title,sequence,abstract\n"
+
+def create_sheet(tmp_path, rows, **options):
+  input_file = tmp_path / 'in.csv'
+  input_file.write_text(HEADER + ''.join(row + '\n' for row in rows))
+  output_file = tmp_path / 'out.csv'
+  CreateSheet().ingest_main(str(input_file), str(output_file), options.pop('attachments_given', False), False, options.pop('audio_visual', False),
+                            check_ids=True, **options)
+  return output_file
+
+def test_audio_visual_sheet_passes(tmp_path, capsys):
+  create_sheet(tmp_path, ["audio_1,Audio,open,,,audio_1.mp3,First,,", "video_1,Video,open,,,video_1.mp4,Second,,"], audio_visual=True)
+  assert "identifier problems" not in capsys.readouterr().out
+
+def test_audio_visual_sheet_still_finds_duplicate_works(tmp_path, capsys):
+  with pytest.raises(SystemExit) as exited:
+    create_sheet(tmp_path, ["audio_1,Audio,open,,,audio_1.mp3,First,,", "audio_1,Audio,open,,,audio_2.mp3,Second,,"], audio_visual=True)
+  assert exited.value.code == 1
+  out = capsys.readouterr().out
+  assert "Duplicate source_identifier audio_1, first used on row 2" in out
+  assert "Duplicate source_identifier audio_1_attachment" in out
+  assert "Duplicate source_identifier audio_1_transcript_attachment" in out
+  # both filesets of the second work repeat the first work's fileset, only the pair generated for one work is let through
+  assert out.count("Duplicate source_identifier audio_1_fileset, first used on row 5") == 2
+
+def test_duplicate_fileset_is_found_outside_audio_visual(tmp_path, capsys):
+  with pytest.raises(SystemExit):
+    create_sheet(tmp_path, ["image_1,Image,open,,,image_1.jpg,First,,", "image_1,Image,open,,,image_2.jpg,Second,,"])
+  assert "Duplicate source_identifier image_1_fileset" in capsys.readouterr().out
+
+def test_only_the_generated_transcript_pair_is_skipped():
+  index = IdentifierIndex()
+  index.add_row('work_1', 'Audio', '', 2)
+  index.add_row('work_1_attachment', 'Attachment', 'work_1', 3)
+  index.add_row('work_1_transcript_attachment', 'Attachment', 'work_1', 4)
+  index.add_row('work_1_fileset', 'FileSet', 'work_1_attachment', 5)
+  index.add_row('work_1_fileset', 'FileSet', 'work_1_transcript_attachment', 6) # the generated pair
+  index.add_row('work_1_fileset', 'FileSet', 'work_1_transcript_attachment', 7) # a third one right after
+  index.add_row('work_2', 'Audio', '', 8)
+  index.add_row('work_2_transcript_attachment', 'Attachment', 'work_2', 9)
+  index.add_row('work_2_fileset', 'FileSet', 'work_2_transcript_attachment', 10) # no first fileset before it
+  index.add_row('work_2_fileset', 'FileSet', 'work_2_transcript_attachment', 11)
+  index.add_row('work_1_fileset', 'FileSet', 'work_1_transcript_attachment', 12) # not next to the first fileset
+  assert index.finish() == [
+    "Row 7: Duplicate source_identifier work_1_fileset, first used on row 5",
+    "Row 11: Duplicate source_identifier work_2_fileset, first used on row 10",
+    "Row 12: Duplicate source_identifier work_1_fileset, first used on row 5",
+  ]
+
+def test_given_fileset_colliding_with_generated_one_is_found(tmp_path, capsys):
+  # a FileSet row given in an input sheet with the identifier create_sheet generates for a transcript fileset
+  input_file = tmp_path / 'av.csv'
+  with open(os.path.join(FIXTURES, 'audio_visual_expected.csv'), encoding='utf-8', newline='') as infile:
+    rows = list(csv.reader(infile))
+  header = rows[0]
+  first_work = rows[1][0]
+  collision = [''] * len(header)
+  collision[header.index('source_identifier')] = first_work + '_fileset'
+  collision[header.index('model')] = 'FileSet'
+  collision[header.index('parents')] = first_work + '_transcript_attachment'
+  with open(input_file, 'w', encoding='utf-8', newline='') as outfile:
+    csv.writer(outfile).writerows(rows + [collision])
+  with pytest.raises(SystemExit):
+    split_sheet(str(input_file), str(tmp_path / 'av_'), str(tmp_path / 'av_empty.csv'), 40, check_ids=True)
+  out = capsys.readouterr().out
+  assert f"Row {len(rows) + 1}: Duplicate source_identifier {first_work}_fileset, first used on row 5" in out
+  assert "1 identifier problems" in out
+
+def test_split_sheet_passes_generated_audio_visual_sheet(tmp_path, capsys):
+  split_sheet(os.path.join(FIXTURES, 'audio_visual_expected.csv'), str(tmp_path / 'av_'), str(tmp_path / 'av_empty.csv'), 40, check_ids=True)
+  assert "Duplicate" not in capsys.readouterr().out
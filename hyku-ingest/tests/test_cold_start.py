@@ -0,0 +1,27 @@
+import json
+import os
+import subprocess
+import sys
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs ingest --help in a fresh interpreter and reports which hyku_ingest modules were imported by the end of it
+LIST_MODULES = """
+import json, sys
+from hyku_ingest.ingest import start
+sys.argv = ['ingest', '--help']
+try:
+  start()
+except SystemExit:
+  pass
+sys.stderr.write(json.dumps(sorted(name for name in sys.modules if name.startswith('hyku_ingest'))))
+"""
+
+def test_help_does_not_import_subcommands():
+  env = dict(os.environ, PYTHONPATH=PACKAGE_DIR)
+  result = subprocess.run([sys.executable, '-c', LIST_MODULES], capture_output=True, text=True, env=env, timeout=60)
+  assert result.returncode == 0, result.stderr
+  assert "create_sheet" in result.stdout # the help was printed
+  imported = json.loads(result.stderr)
+  for subcommand in ('create_sheet', 'split_sheet', 'validate'):
+    assert not any(name == f'hyku_ingest.{subcommand}' or name.startswith(f'hyku_ingest.{subcommand}.') for name in imported), imported
@@ -0,0 +1,75 @@
+import csv
+import os
+
+import pytest
+
+from hyku_ingest.columnar import ParquetSheetWriter, parquet_column_names
+from hyku_ingest.create_sheet import CreateSheet
+from hyku_ingest.split_sheet import split_sheet
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+MODES = {
+  'plain': (False, False),
+  'attachments': (True, False),
+  'audio_visual': (False, True),
+}
+
+def read_csv(filename):
+  with open(filename, newline='', encoding='utf-8') as infile:
+    return list(csv.reader(infile))
+
+def read_parquet(filename):
+  pyarrow_parquet = pytest.importorskip('pyarrow.parquet')
+  return pyarrow_parquet.read_table(str(filename))
+
+def assert_matches_csv(table, rows):
+  header, values = rows[0], rows[1:]
+  assert table.column_names == parquet_column_names(header)
+  assert table.num_rows == len(values)
+  for position, column in enumerate(table.columns):
+    # every value is a string, the None of a short input row is an empty string the same as in the CSV
+    assert column.null_count == 0
+    assert column.to_pylist() == [row[position] for row in values]
+
+def test_parquet_column_names():
+  assert parquet_column_names(['a', 'b', 'a', 'a', 'a.1']) == ['a', 'b', 'a.1', 'a.2', 'a.1.1']
+
+@pytest.mark.parametrize('mode', MODES)
+def test_create_sheet_parquet_matches_csv(mode, tmp_path):
+  pytest.importorskip('pyarrow')
+  attachments_given, audio_visual = MODES[mode]
+  output_file = tmp_path / 'out.csv'
+  parquet_file = tmp_path / 'out.parquet'
+  # small row groups so the rows are spread over several of them
+  CreateSheet().ingest_main(os.path.join(FIXTURES, f'{mode}_input.csv'), str(output_file), attachments_given, False, audio_visual,
+                            parquet_file=str(parquet_file), parquet_row_group=17)
+  with open(output_file, 'rb') as written, open(os.path.join(FIXTURES, f'{mode}_expected.csv'), 'rb') as expected:
+    assert written.read() == expected.read()
+  assert_matches_csv(read_parquet(parquet_file), read_csv(os.path.join(FIXTURES, f'{mode}_expected.csv')))
+
+def test_split_sheet_parquet_matches_input(tmp_path):
+  pytest.importorskip('pyarrow')
+  input_file = os.path.join(FIXTURES, 'attachments_expected.csv')
+  split_sheet(input_file, str(tmp_path / 'split_'), str(tmp_path / 'split_empty.csv'), 40, parquet_file=str(tmp_path / 'split.parquet'))
+  assert_matches_csv(read_parquet(tmp_path / 'split.parquet'), read_csv(input_file))
+
+def test_writer_pads_and_converts_values(tmp_path):
+  pytest.importorskip('pyarrow')
+  passed_on = []
+  class ListWriter:
+    def writerow(self, row):
+      passed_on.append(row)
+  writer = ParquetSheetWriter(str(tmp_path / 'rows.parquet'), ['a', 'b', 'a'], ListWriter(), row_group_rows=2)
+  rows = [['1', None, ''], ['2'], ['3', 4, '5', 'cut off'], ['6', '', None]]
+  writer.writerows(rows)
+  writer.close()
+  assert passed_on == rows # the rows are passed on unchanged
+  table = read_parquet(tmp_path / 'rows.parquet')
+  assert table.column_names == ['a', 'b', 'a.1']
+  assert table.to_pylist() == [
+    {'a': '1', 'b': '', 'a.1': ''},
+    {'a': '2', 'b': '', 'a.1': ''},
+    {'a': '3', 'b': '4', 'a.1': '5'},
+    {'a': '6', 'b': '', 'a.1': ''},
+  ]
@@ -0,0 +1,69 @@
+import os
+import sys
+
+import pytest
+
+from hyku_ingest.compressed import open_sheet
+from hyku_ingest.create_sheet import CreateSheet
+from hyku_ingest.split_sheet import split_sheet
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+MODES = {
+  'plain': (False, False),
+  'attachments': (True, False),
+  'audio_visual': (False, True),
+}
+
+# The bytes every gzip and zstd file starts with
+MAGIC = {'.gz': b'\x1f\x8b', '.zst': b'\x28\xb5\x2f\xfd'}
+
+def require(suffix):
+  """Skips the test if there is nothing to read and write this compression with."""
+  if suffix == '.zst':
+    pytest.importorskip('compression.zstd' if sys.version_info >= (3, 14) else 'zstandard')
+
+def read_bytes(filename):
+  with open_sheet(str(filename), mode='rb') as infile:
+    return infile.read()
+
+def compress(source, destination):
+  with open(source, mode='rb') as infile, open_sheet(str(destination), mode='wb') as outfile:
+    outfile.write(infile.read())
+
+@pytest.mark.parametrize('suffix', ['.gz', '.zst'])
+@pytest.mark.parametrize('mode', MODES)
+def test_create_sheet_round_trip(mode, suffix, tmp_path):
+  require(suffix)
+  input_file = tmp_path / f'in.csv{suffix}'
+  output_file = tmp_path / f'out.csv{suffix}'
+  compress(os.path.join(FIXTURES, f'{mode}_input.csv'), input_file)
+  attachments_given, audio_visual = MODES[mode]
+  CreateSheet().ingest_main(str(input_file), str(output_file), attachments_given, False, audio_visual)
+  # the output really is compressed, and holds exactly the baseline output
+  with open(output_file, mode='rb') as raw:
+    assert raw.read(4).startswith(MAGIC[suffix])
+  assert read_bytes(output_file) == read_bytes(os.path.join(FIXTURES, f'{mode}_expected.csv'))
+
+@pytest.mark.parametrize('suffix', ['.gz', '.zst'])
+def test_uncompressed_input_to_compressed_output(suffix, tmp_path):
+  require(suffix)
+  output_file = tmp_path / f'out.csv{suffix}'
+  CreateSheet().ingest_main(os.path.join(FIXTURES, 'plain_input.csv'), str(output_file), False, False, False)
+  assert read_bytes(output_file) == read_bytes(os.path.join(FIXTURES, 'plain_expected.csv'))
+
+@pytest.mark.parametrize('suffix', ['.gz', '.zst'])
+@pytest.mark.parametrize('mode', ['attachments', 'audio_visual'])
+@pytest.mark.parametrize('fast', [False, True], ids=['normal', 'fast'])
+def test_split_sheet_round_trip(mode, suffix, fast, tmp_path):
+  require(suffix)
+  input_file = tmp_path / f'{mode}.csv{suffix}'
+  compress(os.path.join(FIXTURES, f'{mode}_expected.csv'), input_file)
+  # a compressed input cannot be memory mapped, so the fast split falls back to the normal one
+  split_sheet(str(input_file), str(tmp_path / f'{mode}_'), str(tmp_path / f'{mode}_empty.csv{suffix}'), 40, fast=fast, chunk_suffix=f'.csv{suffix}')
+  split_fixtures = os.path.join(FIXTURES, 'split')
+  expected = sorted(name for name in os.listdir(split_fixtures) if name.startswith(mode + '_'))
+  written = sorted(name[:-len(suffix)] for name in os.listdir(tmp_path) if name.startswith(mode + '_') and name.endswith(suffix))
+  assert written == expected
+  for name in expected:
+    assert read_bytes(tmp_path / (name + suffix)) == read_bytes(os.path.join(split_fixtures, name))
@@ -0,0 +1,168 @@
+import csv
+import os
+
+import pytest
+
+from hyku_ingest.create_sheet import CreateSheet
+from hyku_ingest.create_sheet.row import Row, build_index
+
+# The *_expected.csv fixtures were written by create_sheet as it was before any of the performance work, from the *_input.csv fixtures next to them,
+# so every run here has to match that output byte for byte
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+MODES = {
+  'plain': {'attachments_given': False, 'audio_visual': False},
+  'attachments': {'attachments_given': True, 'audio_visual': False},
+  'audio_visual': {'attachments_given': False, 'audio_visual': True},
+}
+
+def fixture(name):
+  return os.path.join(FIXTURES, name)
+
+def read_bytes(filename):
+  with open(filename, mode='rb') as infile:
+    return infile.read()
+
+def create_sheet(mode, output_file, **options):
+  CreateSheet().ingest_main(fixture(f'{mode}_input.csv'), str(output_file), MODES[mode]['attachments_given'], False, MODES[mode]['audio_visual'], **options)
+  return read_bytes(output_file)
+
+@pytest.mark.parametrize('mode', MODES)
+def test_output_matches_baseline(mode, tmp_path):
+  assert create_sheet(mode, tmp_path / 'out.csv') == read_bytes(fixture(f'{mode}_expected.csv'))
+
+@pytest.mark.parametrize('mode', MODES)
+def test_output_matches_baseline_writing_every_row(mode, tmp_path):
+  assert create_sheet(mode, tmp_path / 'out.csv', write_block=1, write_buffer=-1) == read_bytes(fixture(f'{mode}_expected.csv'))
+
+@pytest.mark.parametrize('mode', MODES)
+def test_workers_output_matches_baseline(mode, tmp_path):
+  # small batches so the rows are spread over many batches and every worker
+  assert create_sheet(mode, tmp_path / 'out.csv', workers=3, batch_size=7) == read_bytes(fixture(f'{mode}_expected.csv'))
+
+@pytest.mark.parametrize('workers', [1, 3])
+def test_resume_after_failure_matches_baseline(workers, tmp_path):
+  original = read_bytes(fixture('plain_input.csv'))
+  # a Book row needs -a, so this row stops the run part way through the sheet
+  broken = original.replace(b'synthetic_00000030,Pdf,', b'synthetic_00000030,Book,')
+  assert broken != original
+  input_file = tmp_path / 'in.csv'
+  output_file = tmp_path / 'out.csv'
+  checkpoint_file = tmp_path / 'out.csv.checkpoint'
+  input_file.write_bytes(broken)
+  with pytest.raises(SystemExit):
+    CreateSheet().ingest_main(str(input_file), str(output_file), False, False, False, workers, batch_size=7, checkpoint_every=10)
+  assert checkpoint_file.exists()
+
+  # the bad row comes after the checkpoint, so it can be fixed before resuming
+  input_file.write_bytes(original)
+  CreateSheet().ingest_main(str(input_file), str(output_file), False, False, False, workers, batch_size=7, resume=True)
+  assert read_bytes(output_file) == read_bytes(fixture('plain_expected.csv'))
+  assert not checkpoint_file.exists()
+
+def test_resume_refuses_changed_input_before_checkpoint(tmp_path, capsys):
+  original = read_bytes(fixture('plain_input.csv'))
+  input_file = tmp_path / 'in.csv'
+  output_file = tmp_path / 'out.csv'
+  input_file.write_bytes(original.replace(b'synthetic_00000030,Pdf,', b'synthetic_00000030,Book,'))
+  with pytest.raises(SystemExit):
+    CreateSheet().ingest_main(str(input_file), str(output_file), False, False, False, checkpoint_every=10)
+  input_file.write_bytes(original.replace(b'synthetic_00000001,', b'synthetic_00000001_changed,'))
+  with pytest.raises(SystemExit):
+    CreateSheet().ingest_main(str(input_file), str(output_file), False, False, False, resume=True)
+  assert "Input file has changed before the checkpoint, cannot resume" in capsys.readouterr().out
+
+def test_row_longer_than_header_fills_added_columns(tmp_path):
+  # the header has no rdf_type or has_work_type column, they are added, and a row can have values for them as with csv.DictReader
+  input_file = tmp_path / 'in.csv'
+  input_file.write_text(
+    "source_identifier,model,visibility,remote_files,parents,file_identifier,title,sequence,abstract\n"
+    "work_1,Image,open,,,work_1.jpg,First,,,extra_1\n"
+    "work_2,Image,open,,,work_2.jpg,Second,,\n"
+  )
+  output_file = tmp_path / 'out.csv'
+  CreateSheet().ingest_main(str(input_file), str(output_file), False, False, False)
+  # the same output the baseline wrote for this sheet, the extra value went in primary_identifier, the first added column, which verify_work_row then sets
+  assert read_bytes(output_file) == (
+    b"source_identifier,model,visibility,remote_files,parents,title,sequence,abstract,primary_identifier,rdf_type,has_work_type\r\n"
+    b"work_1,Image,open,,,First,,,work_1,,\r\n"
+    b"work_1_attachment,Attachment,open,,work_1,Image for work_1,,,work_1_attachment,http://pcdm.org/use#ServiceFile,\r\n"
+    b"work_1_fileset,FileSet,open,http://hykuimports.lib.utk.edu/files/hyku-import/work_1.jpg,work_1_attachment,Image for work_1,,,work_1_fileset,http://pcdm.org/use#ServiceFile,\r\n"
+    b"work_2,Image,open,,,Second,,,work_2,,\r\n"
+    b"work_2_attachment,Attachment,open,,work_2,Image for work_2,,,work_2_attachment,http://pcdm.org/use#ServiceFile,\r\n"
+    b"work_2_fileset,FileSet,open,http://hykuimports.lib.utk.edu/files/hyku-import/work_2.jpg,work_2_attachment,Image for work_2,,,work_2_fileset,http://pcdm.org/use#ServiceFile,\r\n"
+  )
+
+def test_row_longer_than_added_columns_is_rejected(tmp_path, capsys):
+  input_file = tmp_path / 'in.csv'
+  input_file.write_text(
+    "source_identifier,model,visibility,remote_files,parents,file_identifier,title,sequence,abstract,primary_identifier,rdf_type,has_work_type\n"
+    "work_1,Image,open,,,work_1.jpg,First,,,,,,too many\n"
+  )
+  with pytest.raises(SystemExit):
+    CreateSheet().ingest_main(str(input_file), str(tmp_path / 'out.csv'), False, False, False)
+  assert "Row on line 2 has more values than the header and added columns have" in capsys.readouterr().out
+
+def test_remove_file_identifier_column():
+  sheet = CreateSheet()
+  assert sheet.remove_file_identifier_column({'source_identifier': 'a', 'file_identifier': 'a.jpg'}) == {'source_identifier': 'a'}
+  row = Row(build_index(['source_identifier', 'file_identifier']), ['a', 'a.jpg'])
+  assert sheet.remove_file_identifier_column(row) == {'source_identifier': 'a'}
+
+def read_dicts(filename):
+  with open(filename, newline='', encoding='utf-8-sig') as infile:
+    return list(csv.DictReader(infile))
+
+def streamed(mode, rows):
+  # None values are written as empty strings, the same as the csv module writes them
+  output = CreateSheet().stream_rows(rows, MODES[mode]['attachments_given'], False, MODES[mode]['audio_visual'])
+  return [{field: '' if value is None else value for field, value in row.items()} for row in output]
+
+@pytest.mark.parametrize('mode', ['plain', 'audio_visual'])
+def test_stream_rows_matches_baseline(mode):
+  assert streamed(mode, read_dicts(fixture(f'{mode}_input.csv'))) == read_dicts(fixture(f'{mode}_expected.csv'))
+
+def stream_order(input_rows, output_rows):
+  """Puts the baseline output rows in the order stream_rows promises for -a, book pages that come before their parent right after it, or at the end if it never comes."""
+  generated = {} # input source_identifier to its output rows, a fileset belongs to the attachment it is made for
+  for row in output_rows:
+    generated.setdefault(row['parents'] if row['model'] == 'FileSet' else row['source_identifier'], []).append(row)
+  ordered = []
+  seen = set()
+  waiting = {}
+  for row in input_rows:
+    source_identifier = row['source_identifier']
+    seen.add(source_identifier)
+    if row['model'] == 'Attachment' and row['title'] == '' and row['parents'] not in seen:
+      waiting.setdefault(row['parents'], []).append(source_identifier)
+      continue
+    ordered.extend(generated.pop(source_identifier, []))
+    for page in waiting.pop(source_identifier, []):
+      ordered.extend(generated.pop(page))
+  for pages in waiting.values():
+    for page in pages:
+      ordered.extend(generated.pop(page))
+  assert not generated
+  return ordered
+
+def test_stream_rows_with_attachments_holds_pages_back_until_their_parent():
+  input_rows = read_dicts(fixture('attachments_input.csv'))
+  expected = read_dicts(fixture('attachments_expected.csv'))
+  output = streamed('attachments', input_rows)
+  # the same rows as create_sheet writes, which builds the titles index first and so keeps the input order
+  assert sorted(output, key=lambda row: row['source_identifier']) == sorted(expected, key=lambda row: row['source_identifier'])
+  assert output != expected # the fixture has pages before their parents, so the order has to differ
+  assert output == stream_order(input_rows, expected)
+
+def test_stream_rows_with_attachments_puts_orphan_pages_last():
+  def row(source_identifier, model, parents='', title='', sequence='', file_identifier=''):
+    values = dict.fromkeys(CreateSheet.REQUIRED_FIELDNAMES, '')
+    values.update(source_identifier=source_identifier, model=model, visibility='open', parents=parents, title=title, sequence=sequence, file_identifier=file_identifier)
+    return values
+  rows = [
+    row('page_1', 'Attachment', parents='missing_book', sequence='1', file_identifier='page_1.jp2'),
+    row('book', 'Book', title='A book'),
+    row('page_2', 'Attachment', parents='book', sequence='1', file_identifier='page_2.jp2'),
+  ]
+  output = streamed('attachments', rows)
+  assert [row['source_identifier'] for row in output] == ['book', 'page_2', 'page_2_fileset', 'page_1', 'page_1_fileset']
@@ -0,0 +1,86 @@
+import csv
+import gzip
+import os
+import subprocess
+import sys
+
+import pytest
+
+from hyku_ingest.create_sheet import detect_options
+from hyku_ingest.create_sheet.detect import options_for_models
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(PACKAGE_DIR, 'tests', 'fixtures')
+
+def fixture(name):
+  return os.path.join(FIXTURES, name)
+
+def write_books_without_attachments(filename):
+  # the works of the -a fixture with its attachment rows left out
+  with open(fixture('attachments_input.csv'), newline='', encoding='utf-8') as infile, open(filename, 'w', newline='', encoding='utf-8') as outfile:
+    writer = csv.writer(outfile)
+    for row in csv.reader(infile):
+      if row[1] != 'Attachment':
+        writer.writerow(row)
+  return str(filename)
+
+@pytest.mark.parametrize('mode, expected', [
+  ('plain', (False, False)),
+  ('attachments', (True, False)),
+  ('audio_visual', (False, True)),
+])
+def test_detect_fixture_options(mode, expected):
+  attachments_given, audio_visual, model_counts = detect_options(fixture(f'{mode}_input.csv'))
+  assert (attachments_given, audio_visual) == expected
+  assert sum(model_counts.values()) > 0
+
+def test_detect_books_without_attachments(tmp_path):
+  attachments_given, audio_visual, model_counts = detect_options(write_books_without_attachments(tmp_path / 'books.csv'))
+  assert 'Attachment' not in model_counts and 'Book' in model_counts
+  assert (attachments_given, audio_visual) == (True, False)
+
+def test_detect_compressed_sheet(tmp_path):
+  compressed = tmp_path / 'audio_visual.csv.gz'
+  with open(fixture('audio_visual_input.csv'), 'rb') as infile, gzip.open(compressed, 'wb') as outfile:
+    outfile.write(infile.read())
+  assert detect_options(str(compressed))[:2] == (False, True)
+
+def test_stop_at_attachment_counts_up_to_first_attachment():
+  _, _, all_counts = detect_options(fixture('attachments_input.csv'))
+  attachments_given, audio_visual, counts = detect_options(fixture('attachments_input.csv'), stop_at_attachment=True)
+  assert (attachments_given, audio_visual) == (True, False)
+  assert counts['Attachment'] == 1 and sum(counts.values()) < sum(all_counts.values())
+
+@pytest.mark.parametrize('model_counts, expected', [
+  ({}, (False, False)),
+  ({'Image': 3, 'Pdf': 1}, (False, False)),
+  ({'Audio': 2, 'video': 1, 'Collection': 1, 'FileSet': 1}, (False, True)),
+  ({'Audio': 2, 'Image': 1}, (False, False)),
+  ({'Audio': 2, 'Attachment': 4}, (True, False)),
+  ({'Book': 1}, (True, False)),
+  ({'CompoundObject': 1, 'Image': 2}, (True, False)),
+  ({'Collection': 1, 'FileSet': 2}, (False, False)),
+])
+def test_options_for_models(model_counts, expected):
+  assert options_for_models(model_counts) == expected
+
+def run_create_sheet(*args):
+  env = dict(os.environ, PYTHONPATH=PACKAGE_DIR)
+  return subprocess.run([sys.executable, '-m', 'hyku_ingest.ingest', 'create_sheet', *args], capture_output=True, text=True, env=env, timeout=60)
+
+@pytest.mark.parametrize('mode, detected', [('plain', 'none'), ('attachments', '-a'), ('audio_visual', '--audio_visual')])
+def test_auto_matches_fixture_output(mode, detected, tmp_path):
+  result = run_create_sheet('-i', fixture(f'{mode}_input.csv'), '-o', str(tmp_path / 'out.csv'), '--auto')
+  assert result.returncode == 0, result.stdout
+  assert f"Detected options: {detected}" in result.stdout
+  with open(fixture(f'{mode}_expected.csv'), 'rb') as expected:
+    assert (tmp_path / 'out.csv').read_bytes() == expected.read()
+
+def test_auto_books_without_attachments(tmp_path):
+  input_file = write_books_without_attachments(tmp_path / "books.csv")
+  auto = run_create_sheet('-i', input_file, '-o', str(tmp_path / 'auto.csv'), '--auto')
+  assert auto.returncode == 0, auto.stdout
+  assert "Detected options: -a" in auto.stdout
+  given = run_create_sheet('-i', input_file, '-o', str(tmp_path / 'given.csv'), '-a')
+  assert given.returncode == 0, given.stdout
+  assert (tmp_path / 'auto.csv').read_bytes() == (tmp_path / 'given.csv').read_bytes()
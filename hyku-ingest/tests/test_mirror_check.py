@@ -0,0 +1,113 @@
+import csv
+import os
+import threading
+
+import pytest
+
+from hyku_ingest.create_sheet import CreateSheet
+from hyku_ingest.mirror_check import MirrorCheck
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+URL = CreateSheet.REMOTE_FILES_URL
+
+class Counts:
+  def __init__(self):
+    self.counts = {}
+
+  def count(self, name, amount=1):
+    self.counts[name] = self.counts.get(name, 0) + amount
+
+def test_mirror_check_reports_missing_and_empty_files(tmp_path, monkeypatch):
+  mirror = tmp_path / 'mirror'
+  (mirror / 'audio').mkdir(parents=True)
+  (mirror / 'present.jpg').write_bytes(b'jpeg')
+  (mirror / 'empty.jpg').write_bytes(b'')
+  (mirror / 'folder.jpg').mkdir()
+  (mirror / 'audio' / 'present.mp3').write_bytes(b'mp3')
+  (mirror / 'audio' / 'other.mp3').write_bytes(b'mp3')
+
+  stat_calls = [] # the paths each stat task was given, and the thread it ran on
+  file_problems = MirrorCheck.file_problems
+  def recording_file_problems(self, paths):
+    stat_calls.append((list(paths), threading.current_thread()))
+    return file_problems(self, paths)
+  monkeypatch.setattr(MirrorCheck, 'file_problems', recording_file_problems)
+  listed = []
+  list_directory = MirrorCheck.list_directory
+  def recording_list_directory(self, directory):
+    listed.append(directory)
+    return list_directory(self, directory)
+  monkeypatch.setattr(MirrorCheck, 'list_directory', recording_list_directory)
+
+  check = MirrorCheck(str(mirror), URL, workers=4)
+  rows = [
+    ('present', URL + 'present.jpg'),
+    ('empty', URL + 'empty.jpg'),
+    ('folder', URL + 'folder.jpg'),
+    ('missing', URL + 'missing.jpg'),
+    ('audio', URL + 'audio/present.mp3'),
+    ('audio_missing', URL + 'audio/missing.mp3'),
+    ('no_directory', URL + 'video/missing.mp4'),
+    ('elsewhere', 'https://example.org/files/elsewhere.jpg'), # not on the import server, not checked
+    ('no_files', ''),
+    ('present_again', URL + 'empty.jpg'), # the same file is only checked and reported for its first row
+  ]
+  for row, (source_identifier, remote_files) in enumerate(rows, 2):
+    check.add_row(source_identifier, remote_files, row)
+  counts = Counts()
+  problems = check.check(counts)
+
+  assert problems == [
+    (3, 'empty', URL + 'empty.jpg', os.path.join(str(mirror), 'empty.jpg'), 'empty'),
+    (4, 'folder', URL + 'folder.jpg', os.path.join(str(mirror), 'folder.jpg'), 'not a file'),
+    (5, 'missing', URL + 'missing.jpg', os.path.join(str(mirror), 'missing.jpg'), 'missing'),
+    (7, 'audio_missing', URL + 'audio/missing.mp3', os.path.join(str(mirror), 'audio/missing.mp3'), 'missing'),
+    (8, 'no_directory', URL + 'video/missing.mp4', os.path.join(str(mirror), 'video/missing.mp4'), 'missing'),
+  ]
+  # each directory is listed once, and only the files found in the listings are stat'ed, on the pool's threads
+  assert sorted(listed) == sorted([str(mirror), os.path.join(str(mirror), 'audio'), os.path.join(str(mirror), 'video')])
+  stat_paths = sorted(path for paths, _ in stat_calls for path in paths)
+  assert stat_paths == sorted(os.path.join(str(mirror), name) for name in ('present.jpg', 'empty.jpg', 'folder.jpg', 'audio/present.mp3'))
+  assert all(thread is not threading.main_thread() for _, thread in stat_calls)
+  assert counts.counts == {'mirror files checked': 7, 'mirror directories listed': 3}
+
+  manifest = tmp_path / 'missing.csv'
+  check.write_manifest(str(manifest), problems)
+  with open(manifest, newline='', encoding='utf-8') as infile:
+    written = list(csv.reader(infile))
+  assert written[0] == MirrorCheck.MANIFEST_FIELDNAMES
+  assert [row[1] for row in written[1:]] == ['empty', 'folder', 'missing', 'audio_missing', 'no_directory']
+
+def mirror_for(expected_file, mirror):
+  """Creates a non-empty file in the mirror for every remote_files in an output sheet, returning their names."""
+  with open(expected_file, newline='', encoding='utf-8') as infile:
+    names = sorted({row['remote_files'][len(URL):] for row in csv.DictReader(infile) if row['remote_files']})
+  for name in names:
+    path = mirror / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b'file')
+  return names
+
+def test_create_sheet_passes_with_every_file_in_mirror(tmp_path):
+  mirror = tmp_path / 'mirror'
+  mirror_for(os.path.join(FIXTURES, 'attachments_expected.csv'), mirror)
+  output_file = tmp_path / 'out.csv'
+  CreateSheet().ingest_main(os.path.join(FIXTURES, 'attachments_input.csv'), str(output_file), True, False, False, mirror_dir=str(mirror), mirror_workers=4)
+  with open(output_file, 'rb') as written, open(os.path.join(FIXTURES, 'attachments_expected.csv'), 'rb') as expected:
+    assert written.read() == expected.read()
+  assert (tmp_path / 'out.csv.missing.csv').read_text().splitlines() == [','.join(MirrorCheck.MANIFEST_FIELDNAMES)]
+
+def test_create_sheet_lists_missing_files(tmp_path, capsys):
+  mirror = tmp_path / 'mirror'
+  names = mirror_for(os.path.join(FIXTURES, 'plain_expected.csv'), mirror)
+  (mirror / names[0]).unlink()
+  (mirror / names[1]).write_bytes(b'')
+  manifest = tmp_path / 'manifest.csv'
+  with pytest.raises(SystemExit) as exited:
+    CreateSheet().ingest_main(os.path.join(FIXTURES, 'plain_input.csv'), str(tmp_path / 'out.csv'), False, False, False,
+                              mirror_dir=str(mirror), mirror_manifest=str(manifest))
+  assert exited.value.code == 1
+  assert f"2 files missing or empty in {mirror}" in capsys.readouterr().out
+  with open(manifest, newline='', encoding='utf-8') as infile:
+    problems = {row['remote_files'][len(URL):]: row['problem'] for row in csv.DictReader(infile)}
+  assert problems == {names[0]: 'missing', names[1]: 'empty'}
@@ -0,0 +1,38 @@
+from itertools import product
+
+from hyku_ingest.benchmark.rdf_type import generate_rows, legacy_work_rdf_type, legacy_attachment_rdf_type
+from hyku_ingest.benchmark.suite import compare_results
+from hyku_ingest.create_sheet.rdf_type import work_rdf_type, attachment_rdf_type
+
+# identifiers around the edges of the substring chains: no dot, several dots, markers with no extension, markers in the wrong place and more than one marker
+EDGE_FILE_IDENTIFIERS = [
+  '', '.', 'page', 'page.jpg', 'page.JPG', 'page.jpg.tif', 'page.tif.jpg', 'page_i', 'page_i.', 'page_i.tif', 'page_p.tif', 'page_P.tif',
+  'page_transcript.txt', 'page_transcript', 'page_ocr.txt', 'page_hocr.html', 'page_i.tif_p.tif', 'page_p.tif_i.tif', 'page_hocr_i.tif',
+  'page_ocr.jpg', 'page.mp3', 'page.mp4', 'page.jp2', 'page.jp2_transcript.txt', '_i.', '_p._i.', 'page_x.jpg', 'page_ii.tif', 'a.b.c.d',
+]
+EDGE_SOURCE_IDENTIFIERS = ['', 'page', 'page_ocr.txt', 'page_hocr.html', 'page_hocr.html_ocr.txt', 'page_ocr', 'page_HOCR.html', 'page_i.tif']
+EDGE_MODELS = ['Image', 'Pdf', 'pdf', 'PDF', 'pDf', 'Pdf ', 'Pdfs', 'Book', 'Audio', 'Video', 'CompoundObject', 'Attachment', '']
+
+def edge_rows():
+  for model, source_identifier, file_identifier in product(EDGE_MODELS, EDGE_SOURCE_IDENTIFIERS, EDGE_FILE_IDENTIFIERS):
+    yield {'model': model, 'source_identifier': source_identifier, 'file_identifier': file_identifier}
+
+def assert_same_classifications(rows):
+  for row in rows:
+    assert work_rdf_type(row['model'], row['file_identifier']) == legacy_work_rdf_type(row), row
+    assert attachment_rdf_type(row['source_identifier'], row['file_identifier']) == legacy_attachment_rdf_type(row), row
+
+def test_generated_identifiers_match_reference_chains():
+  assert_same_classifications(generate_rows(50000, seed=0))
+  assert_same_classifications(generate_rows(50000, seed=1))
+
+def test_edge_case_identifiers_match_reference_chains():
+  assert_same_classifications(edge_rows())
+
+def test_compare_results_fails_on_mismatches():
+  results = {'cases': {}, 'rdf_type': {'mismatches': 0}}
+  assert compare_results(results, results) == []
+  mismatched = {'cases': {}, 'rdf_type': {'mismatches': 3}}
+  regressions = compare_results(mismatched, results)
+  assert len(regressions) == 1
+  assert regressions[0].startswith("rdf_type: 3 identifiers")
@@ -0,0 +1,57 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+
+import pytest
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+INPUT_SHEET = (
+  "source_identifier,model,visibility,remote_files,parents,file_identifier,title,sequence,abstract\n"
+  "work_1,Image,open,,,work_1.jpg,First work,,\n"
+)
+
+def run_ingest(args, cwd, stdin=None):
+  env = dict(os.environ, PYTHONPATH=PACKAGE_DIR)
+  return subprocess.run([sys.executable, '-m', 'hyku_ingest.ingest', *args], cwd=cwd, input=stdin, capture_output=True, text=True, env=env, timeout=60)
+
+def test_failing_job_does_not_stop_serve(tmp_path):
+  (tmp_path / 'in.csv').write_text(INPUT_SHEET)
+  jobs = [
+    {'id': 1, 'argv': ['create_sheet', '-i', 'in.csv']}, # no output file, exits with an error
+    {'id': 2, 'argv': ['create_sheet', '-i', 'in.csv', '-o', 'out.csv']},
+  ]
+  result = run_ingest(['serve'], tmp_path, ''.join(json.dumps(job) + '\n' for job in jobs))
+  assert result.returncode == 0, result.stderr
+  responses = [json.loads(line) for line in result.stdout.splitlines()]
+  assert [(response['id'], response['status']) for response in responses] == [(1, 1), (2, 0)]
+  assert (tmp_path / 'out.csv').exists()
+
+def test_serve_does_not_remove_other_files(tmp_path):
+  not_a_socket = tmp_path / 'notes.txt'
+  not_a_socket.write_text("keep me")
+  result = run_ingest(['serve', '--socket', str(not_a_socket)], tmp_path)
+  assert result.returncode == 1
+  assert "is not a socket" in result.stdout
+  assert not_a_socket.read_text() == "keep me"
+
+@pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'), reason="Unix sockets are not available")
+def test_serve_replaces_stale_socket(tmp_path):
+  stale = tmp_path / 'ingest.sock'
+  listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+  listener.bind(str(stale))
+  listener.close() # leaves the socket file behind, as a stopped server would
+  env = dict(os.environ, PYTHONPATH=PACKAGE_DIR)
+  server = subprocess.Popen([sys.executable, '-m', 'hyku_ingest.ingest', 'serve', '--socket', str(stale)], cwd=tmp_path, stdout=subprocess.PIPE, text=True, env=env)
+  try:
+    assert server.stdout.readline().startswith("Listening for jobs")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+      client.connect(str(stale))
+      client.sendall(b'{"id": 1, "argv": ["validate"]}\n')
+      response = json.loads(client.makefile('r').readline())
+    assert response['id'] == 1 and response['status'] == 1
+  finally:
+    server.terminate()
+    server.wait(timeout=10)
@@ -0,0 +1,88 @@
+import csv
+import os
+
+import pytest
+
+from hyku_ingest.profiling import Profile
+from hyku_ingest.split_sheet import split_sheet
+
+# The fixtures in split/ were written by split_sheet as it was before any of the performance work, with 40 rows per chunk,
+# from the create_sheet output fixtures of the same name
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+SPLIT_FIXTURES = os.path.join(FIXTURES, 'split')
+CHUNK_SIZE = 40
+
+def read_files(directory, prefix):
+  files = {}
+  for filename in sorted(os.listdir(directory)):
+    if filename.startswith(prefix + '_') and filename != prefix + '.csv':
+      with open(os.path.join(directory, filename), mode='rb') as infile:
+        files[filename] = infile.read()
+  return files
+
+def split(mode, tmp_path, **options):
+  input_file = tmp_path / f'{mode}.csv'
+  input_file.write_bytes(open(os.path.join(FIXTURES, f'{mode}_expected.csv'), mode='rb').read())
+  split_sheet(str(input_file), str(tmp_path / f'{mode}_'), str(tmp_path / f'{mode}_empty.csv'), CHUNK_SIZE, **options)
+  return read_files(tmp_path, mode)
+
+@pytest.mark.parametrize('mode', ['attachments', 'audio_visual'])
+@pytest.mark.parametrize('options', [{}, {'workers': 3}, {'fast': True}], ids=['serial', 'workers', 'fast'])
+def test_chunks_match_baseline(mode, options, tmp_path):
+  expected = read_files(SPLIT_FIXTURES, mode)
+  assert split(mode, tmp_path, **options) == expected
+
+def read_rows(filename):
+  with open(filename, newline='', encoding='utf-8') as infile:
+    return list(csv.reader(infile))[1:]
+
+@pytest.mark.parametrize('mode', ['attachments', 'audio_visual'])
+@pytest.mark.parametrize('chunk_size', [3, 10, 17])
+def test_group_by_parent_never_splits_a_work(mode, chunk_size, tmp_path):
+  input_file = tmp_path / f'{mode}.csv'
+  input_file.write_bytes(open(os.path.join(FIXTURES, f'{mode}_expected.csv'), mode='rb').read())
+  split_sheet(str(input_file), str(tmp_path / f'{mode}_'), str(tmp_path / f'{mode}_empty.csv'), chunk_size, group_by_parent=True)
+
+  work_chunks = {} # work to every chunk number its attachments and filesets were written to
+  attachment_works = {} # attachment source_identifier to its work
+  chunk_rows = {} # (kind, chunk number) to its rows
+  for kind in ('attachment', 'fileset'):
+    chunk = 0
+    while os.path.exists(tmp_path / f'{mode}_{kind}_{chunk}.csv'):
+      chunk_rows[kind, chunk] = read_rows(tmp_path / f'{mode}_{kind}_{chunk}.csv')
+      chunk += 1
+  for (kind, chunk), rows in sorted(chunk_rows.items()): # attachments first, so every fileset's attachment is known
+    for row in rows:
+      source_identifier, parents = row[0], row[4]
+      work = parents if kind == 'attachment' else attachment_works[parents]
+      if kind == 'attachment':
+        attachment_works[source_identifier] = work
+      work_chunks.setdefault(work, set()).add(chunk)
+
+  assert work_chunks
+  for work, chunks in work_chunks.items():
+    assert len(chunks) == 1, f"{work} was split across chunks {sorted(chunks)}"
+  for (kind, chunk), rows in chunk_rows.items():
+    works = {row[4] if kind == 'attachment' else attachment_works[row[4]] for row in rows}
+    assert len(rows) <= chunk_size or len(works) == 1, f"{kind} chunk {chunk} has {len(rows)} rows from {len(works)} works"
+
+  # every row is still written once, only the chunks they are in change
+  expected = read_files(SPLIT_FIXTURES, mode)
+  for kind in ('attachment', 'fileset'):
+    expected_rows = sorted(row for name, data in expected.items() if f'_{kind}_' in name for row in data.decode('utf-8').splitlines()[1:])
+    written_rows = sorted(line for (written_kind, chunk) in chunk_rows if written_kind == kind
+                          for line in open(tmp_path / f'{mode}_{kind}_{chunk}.csv', encoding='utf-8').read().splitlines()[1:])
+    assert written_rows == expected_rows
+
+@pytest.mark.parametrize('options', [{}, {'workers': 3}, {'group_by_parent': True}, {'group_by_parent': True, 'workers': 3}], ids=['serial', 'workers', 'grouped', 'grouped_workers'])
+def test_profile_times_each_write_once(options, tmp_path):
+  profile = Profile()
+  split('attachments', tmp_path, profile=profile, **options)
+  rows = read_rows(os.path.join(FIXTURES, 'attachments_expected.csv'))
+  filesets = sum(1 for row in rows if row[1] == 'FileSet')
+  attachments = sum(1 for row in rows if row[1] == 'Attachment')
+  if options.get('group_by_parent'): # a call per chunk file
+    filesets = len(read_files(tmp_path, 'attachments_fileset'))
+    attachments = len(read_files(tmp_path, 'attachments_attachment'))
+  assert profile.calls['write filesets'] == filesets
+  assert profile.calls['write attachments'] == attachments
@@ -0,0 +1,65 @@
+import os
+import subprocess
+import sys
+
+from hyku_ingest.validate import validate_sheet
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEADER = "source_identifier,model,visibility,remote_files,parents,file_identifier,title,sequence,abstract\n"
+
+def write_sheet(path, *rows):
+  path.write_text(HEADER + ''.join(row + '\n' for row in rows))
+  return str(path)
+
+def run_create_sheet(input_file, output_file, *flags):
+  env = dict(os.environ, PYTHONPATH=PACKAGE_DIR)
+  return subprocess.run([sys.executable, '-m', 'hyku_ingest.ingest', 'create_sheet', '-i', input_file, '-o', output_file, *flags],
+                        capture_output=True, text=True, env=env, timeout=60)
+
+def test_short_row_is_a_warning_when_its_columns_are_present(tmp_path):
+  # the book row stops before sequence and abstract, which a work with -a does not use
+  input_file = write_sheet(tmp_path / 'in.csv',
+    "book_1,Book,open,,,,A book",
+    "page_1,Attachment,open,,book_1,page_1.jpg,,1,",
+  )
+  problems = validate_sheet(input_file, attachments_given=True)
+  assert [problem.error for problem in problems] == [False]
+  assert problems[0].line == 2
+  # create_sheet accepts the sheet, and so does its preflight check
+  assert run_create_sheet(input_file, str(tmp_path / 'out.csv'), '-a').returncode == 0
+  result = run_create_sheet(input_file, str(tmp_path / 'preflight.csv'), '-a', '--preflight')
+  assert result.returncode == 0, result.stdout
+  assert (tmp_path / 'preflight.csv').read_bytes() == (tmp_path / 'out.csv').read_bytes()
+
+def test_short_row_missing_a_used_column_is_an_error(tmp_path):
+  # without -a the work's attachment is built from its title and file_identifier, which are cut off
+  input_file = write_sheet(tmp_path / 'in.csv', "work_1,Image,open,,")
+  problems = validate_sheet(input_file)
+  assert len(problems) == 1
+  assert problems[0].error
+  assert "file_identifier, title" in problems[0].message
+
+def test_short_work_is_still_a_parent(tmp_path):
+  input_file = write_sheet(tmp_path / 'in.csv',
+    "book_1,Book,open,,",
+    "page_1,Attachment,open,,book_1,page_1.jpg,,1,",
+  )
+  problems = validate_sheet(input_file, attachments_given=True)
+  # the book row needs no file_identifier or title with -a, so it is only short
+  assert [(problem.line, problem.error) for problem in problems] == [(2, False)]
+
+def test_row_with_values_for_added_columns_is_a_warning(tmp_path):
+  # create_sheet adds primary_identifier, rdf_type and the other missing output columns, and a row can have values for them
+  input_file = write_sheet(tmp_path / 'in.csv', "work_1,Image,open,,,work_1.jpg,First,,,extra_1")
+  problems = validate_sheet(input_file)
+  assert [(problem.line, problem.error) for problem in problems] == [(2, False)]
+  assert run_create_sheet(input_file, str(tmp_path / 'out.csv'), '--preflight').returncode == 0
+
+def test_row_longer_than_added_columns_is_an_error(tmp_path):
+  # every added column is already in this header, so there is nowhere for an extra value to go
+  header = HEADER.strip() + ",primary_identifier,rdf_type,has_work_type\n"
+  input_file = tmp_path / 'in.csv'
+  input_file.write_text(header + "work_1,Image,open,,,work_1.jpg,First,,,,,,too many\n")
+  problems = validate_sheet(str(input_file))
+  assert [(problem.line, problem.error) for problem in problems] == [(2, True)]
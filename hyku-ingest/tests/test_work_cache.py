@@ -0,0 +1,100 @@
+import os
+import re
+
+from hyku_ingest.create_sheet import CreateSheet
+from hyku_ingest.create_sheet.work_cache import WorkCache
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+MODES = {
+  'plain': (False, False),
+  'attachments': (True, False),
+  'audio_visual': (False, True),
+}
+
+def read_bytes(filename):
+  with open(filename, mode='rb') as infile:
+    return infile.read()
+
+def cached_run(input_file, output_file, cache_file, capsys, attachments_given=False, audio_visual=False, delta=False):
+  """Runs create_sheet with the work cache and returns how many works were copied from it and how many were generated."""
+  capsys.readouterr()
+  CreateSheet().ingest_main(str(input_file), str(output_file), attachments_given, True, audio_visual, cache_file=str(cache_file), delta=delta)
+  hits, misses = re.search(r"(\d+) works copied from the work cache, (\d+) works generated", capsys.readouterr().out).groups()
+  return int(hits), int(misses)
+
+def test_unchanged_second_run_is_copied_from_cache(tmp_path, capsys):
+  for mode, (attachments_given, audio_visual) in MODES.items():
+    input_file = os.path.join(FIXTURES, f'{mode}_input.csv')
+    expected = read_bytes(os.path.join(FIXTURES, f'{mode}_expected.csv'))
+    cache_file = tmp_path / f'{mode}.sqlite'
+    hits, misses = cached_run(input_file, tmp_path / 'first.csv', cache_file, capsys, attachments_given, audio_visual)
+    assert hits == 0 and misses > 0
+    assert read_bytes(tmp_path / 'first.csv') == expected
+    hits, misses = cached_run(input_file, tmp_path / 'second.csv', cache_file, capsys, attachments_given, audio_visual)
+    assert misses == 0 and hits > 0
+    assert read_bytes(tmp_path / 'second.csv') == expected
+
+def test_changed_work_is_generated_again(tmp_path, capsys):
+  original = read_bytes(os.path.join(FIXTURES, 'attachments_input.csv'))
+  input_file = tmp_path / 'in.csv'
+  input_file.write_bytes(original)
+  cache_file = tmp_path / 'cache.sqlite'
+  _, works = cached_run(input_file, tmp_path / 'first.csv', cache_file, capsys, attachments_given=True)
+
+  # one page of a book changes, which changes that book's hash, every other work is unchanged
+  changed = original.replace(b'synthetic_00000000_0002,Attachment,open,,synthetic_00000000,', b'synthetic_00000000_0002,Attachment,restricted,,synthetic_00000000,')
+  assert changed != original
+  input_file.write_bytes(changed)
+  hits, misses = cached_run(input_file, tmp_path / 'second.csv', cache_file, capsys, attachments_given=True)
+  assert (hits, misses) == (works - 1, 1)
+  CreateSheet().ingest_main(str(input_file), str(tmp_path / 'uncached.csv'), True, False, False)
+  assert read_bytes(tmp_path / 'second.csv') == read_bytes(tmp_path / 'uncached.csv')
+
+def test_changed_options_or_columns_miss_the_cache(tmp_path, capsys):
+  input_file = os.path.join(FIXTURES, 'audio_visual_input.csv')
+  cache_file = tmp_path / 'cache.sqlite'
+  _, works = cached_run(input_file, tmp_path / 'plain.csv', cache_file, capsys)
+  # the same rows with --audio_visual generate other output rows, so none of the cached works can be used
+  assert cached_run(input_file, tmp_path / 'av.csv', cache_file, capsys, audio_visual=True) == (0, works)
+  assert read_bytes(tmp_path / 'av.csv') == read_bytes(os.path.join(FIXTURES, 'audio_visual_expected.csv'))
+  # an extra column changes every work's hash too
+  rows = read_bytes(input_file).split(b'\r\n')
+  renamed = tmp_path / 'renamed.csv'
+  renamed.write_bytes(b'\r\n'.join([rows[0] + b',notes'] + rows[1:]))
+  assert cached_run(renamed, tmp_path / 'renamed_out.csv', cache_file, capsys, audio_visual=True) == (0, works)
+
+def test_least_recently_used_works_are_evicted(tmp_path):
+  cache_file = str(tmp_path / 'cache.sqlite')
+  first, second, third = (WorkCache.add_row(b'salt', [name]) for name in ('first', 'second', 'third'))
+  cache = WorkCache(cache_file, max_entries=2)
+  cache.put(first, [[['first']]])
+  cache.put(second, [[['second']]])
+  cache.close()
+
+  # first is used again in the next run, so second is the least recently used once third is added
+  cache = WorkCache(cache_file, max_entries=2)
+  assert cache.get(first) == [[['first']]]
+  cache.put(third, [[['third']]])
+  cache.close()
+
+  cache = WorkCache(cache_file, max_entries=2)
+  assert cache.get(second) is None
+  assert cache.get(first) == [[['first']]]
+  assert cache.get(third) == [[['third']]]
+  cache.close()
+
+def test_delta_only_writes_changed_and_new_works(tmp_path, capsys):
+  header = b"source_identifier,model,visibility,remote_files,parents,file_identifier,title,sequence,abstract\r\n"
+  input_file = tmp_path / 'in.csv'
+  input_file.write_bytes(header + b"work_1,Image,open,,,work_1.jpg,First,,\r\nwork_2,Image,open,,,work_2.jpg,Second,,\r\n")
+  cache_file = tmp_path / 'cache.sqlite'
+  cached_run(input_file, tmp_path / 'first.csv', cache_file, capsys)
+
+  input_file.write_bytes(header + b"work_1,Image,open,,,work_1.jpg,First,,\r\nwork_2,Image,open,,,work_2.jpg,Second changed,,\r\nwork_3,Pdf,open,,,work_3.pdf,Third,,\r\n")
+  assert cached_run(input_file, tmp_path / 'delta.csv', cache_file, capsys, delta=True) == (1, 2)
+  rows = (tmp_path / 'delta.csv').read_text().splitlines()
+  assert [row.split(',')[0] for row in rows[1:]] == ['work_2', 'work_2_attachment', 'work_2_fileset', 'work_3', 'work_3_attachment', 'work_3_fileset']
+  # nothing changed since the last run, so the next delta is just the header
+  assert cached_run(input_file, tmp_path / 'empty_delta.csv', cache_file, capsys, delta=True) == (3, 0)
+  assert (tmp_path / 'empty_delta.csv').read_text().splitlines() == [rows[0]]